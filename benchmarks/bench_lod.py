@@ -0,0 +1,105 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# 几何简化的效果：同一批洞分别不简化和按输出分辨率简化后用 numpy 渲染器渲染，报告顶点数、耗时和像素差异，
+# 差异超过限制时以非零状态退出
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(repo_dir, "src", "python"))
+
+import synthetic_course
+import plot_courses
+import raster_renderer
+import hole_metrics
+import hole_reader
+import utils
+
+
+def render_course(data, resources, tolerance, scale):
+    metrics = hole_metrics.HoleMetrics(plot_courses.course_key(data["clubId"], data["courseId"]))
+    start_time = time.perf_counter()
+    collected = plot_courses.collect_course_features(data["holes"], resources, metrics, tolerance)
+    geometry_time = time.perf_counter() - start_time
+    images, vertices = [], [0, 0]
+    start_time = time.perf_counter()
+    for result in collected:
+        if result is None:
+            images.append(None)
+            continue
+        hole_boundary, features, markers, _, hole_vertices = result
+        items = [(geometry, plot_courses.get_item_by_type(item_type.value, resources)) for geometry, item_type in features]
+        images.append(raster_renderer.rasterize_hole(hole_boundary, items, markers, resources, scale).to_uint8())
+        vertices[0] += hole_vertices[0]
+        vertices[1] += hole_vertices[1]
+    return images, vertices, geometry_time, time.perf_counter() - start_time
+
+
+def compare_images(reference, image, pixel_threshold):
+    if reference.shape != image.shape:
+        return None
+    difference = np.abs(reference.astype(np.int16) - image.astype(np.int16)).max(axis=-1)
+    return {
+        "mean": float(difference.mean()),
+        "max": int(difference.max()),
+        "changed_fraction": float((difference > pixel_threshold).mean()),
+    }
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(description="Compare renders with and without resolution-aware simplification")
+    synthetic_course.add_course_arguments(parser)
+    parser.add_argument("--input", help="Use this JSONL file instead of generating synthetic courses")
+    parser.add_argument("--resources-dir", default=os.path.join(repo_dir, "resources"))
+    parser.add_argument("--scale", type=float, default=1.0, help="Output scale relative to utils.meters_per_pixel")
+    parser.add_argument("--pixel-threshold", type=int, default=32,
+                        help="A pixel counts as changed when a channel differs by more than this")
+    parser.add_argument("--max-changed-fraction", type=float, default=0.002,
+                        help="Fail when a hole has a larger fraction of changed pixels")
+    parser.add_argument("--report", help="Write the JSON report to this file")
+    return parser
+
+
+if __name__ == "__main__":
+    args = create_parser().parse_args()
+    if args.input:
+        courses = list(hole_reader.iter_courses(args.input))
+    else:
+        courses = list(synthetic_course.iter_courses(args.courses, args.seed,
+                                                     **synthetic_course.params_from_args(args)))
+    resources = plot_courses.Resources(args.resources_dir)
+    resources.preload_images()
+    totals = {"holes": 0, "vertices": 0, "simplified_vertices": 0, "geometry_s": [0.0, 0.0], "draw_s": [0.0, 0.0]}
+    holes = []
+    for data in courses:
+        reference, _, reference_geometry, reference_draw = render_course(data, resources, 0, args.scale)
+        images, vertices, geometry_time, draw_time = render_course(
+            data, resources, utils.simplify_tolerance(args.scale), args.scale)
+        totals["vertices"] += vertices[0]
+        totals["simplified_vertices"] += vertices[1]
+        totals["geometry_s"][0] += reference_geometry
+        totals["geometry_s"][1] += geometry_time
+        totals["draw_s"][0] += reference_draw
+        totals["draw_s"][1] += draw_time
+        for club_id, course_id, hole_number, _ in hole_reader.iter_course_holes(data):
+            if reference[hole_number - 1] is None:
+                continue
+            totals["holes"] += 1
+            difference = compare_images(reference[hole_number - 1], images[hole_number - 1], args.pixel_threshold)
+            holes.append({"hole": hole_reader.format_hole_key(club_id, course_id, hole_number), "difference": difference})
+    failed = [hole["hole"] for hole in holes
+              if hole["difference"] is None or hole["difference"]["changed_fraction"] > args.max_changed_fraction]
+    worst = max((hole["difference"]["changed_fraction"] for hole in holes if hole["difference"]), default=0.0)
+    print(f"{totals['holes']} holes, {totals['vertices']} -> {totals['simplified_vertices']} vertices "
+          f"(tolerance {utils.simplify_pixels} px at {args.scale}x)")
+    print(f"geometry {totals['geometry_s'][0]:.3f}s -> {totals['geometry_s'][1]:.3f}s, "
+          f"draw {totals['draw_s'][0]:.3f}s -> {totals['draw_s'][1]:.3f}s")
+    print(f"worst changed fraction {worst:.5f} (limit {args.max_changed_fraction}), {len(failed)} holes over the limit")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as file:
+            json.dump({"settings": utils.render_settings(), "scale": args.scale, "totals": totals, "holes": holes},
+                      file, indent=2)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,222 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import shapely
+from shapely.geometry import LineString, Point
+
+# 分阶段计时：直接计时 plot_courses 的各个阶段（collect_course_features 的解析、平滑、简化、裁剪，render_rgba 的
+# 构建与绘制，output_writer 的编码与写出），输出可在不同提交之间对比的 JSON 报告。
+# --stages legacy 按原来逐洞的方式计时解析、平滑和裁剪，作为批量裁剪之前的基线
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(repo_dir, "src", "python"))
+
+import synthetic_course
+import plot_courses
+import hole_metrics
+import hole_reader
+import output_writer
+import utils
+from utils import logger
+
+# decode 为 JSON 解码，其余阶段与 hole_metrics 的计时事件相同
+stages = ["decode"] + hole_metrics.stage_names
+
+
+class StageSamples:
+    def __init__(self):
+        self.samples = {stage: [] for stage in stages}
+
+    # stages 为 HoleMetrics.stages：阶段名 -> 秒
+    def add(self, stages):
+        for stage, elapsed in stages.items():
+            self.samples[stage].append(elapsed)
+
+    def summary(self):
+        result = {}
+        for stage, samples in self.samples.items():
+            if not samples:
+                continue
+            ordered = sorted(samples)
+            result[stage] = {
+                "count": len(samples),
+                "total_s": round(sum(samples), 4),
+                "mean_ms": round(statistics.mean(samples) * 1000, 3),
+                "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+                "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+                "max_ms": round(ordered[-1] * 1000, 3),
+            }
+        return result
+
+
+# 与 plot_courses 相同，每个球场的要素一次处理完：decode 到 clip 每个球场一个样本，之后的阶段每个洞一个样本
+def run(input_lines, resources, renderer, output_folder_path):
+    samples = StageSamples()
+    totals = {"courses": 0, "holes": 0, "vertices": 0, "pixels": 0}
+    output_format = output_writer.OutputFormat()
+    for line in input_lines:
+        start_time = time.perf_counter()
+        data = json.loads(line)
+        samples.add({"decode": time.perf_counter() - start_time})
+        totals["courses"] += 1
+        course_metrics = hole_metrics.HoleMetrics(plot_courses.course_key(data["clubId"], data["courseId"]))
+        collected = plot_courses.collect_course_features(data["holes"], resources, course_metrics)
+        samples.add(course_metrics.stages)
+        for (club_id, course_id, hole_number, _), result in zip(hole_reader.iter_course_holes(data), collected):
+            if result is None:
+                continue
+            hole_boundary, features, markers, _, vertices = result
+            hole_key = hole_reader.format_hole_key(club_id, course_id, hole_number)
+            metrics = hole_metrics.HoleMetrics(hole_key)
+            rgba, artists = plot_courses.render_rgba(hole_boundary, features, markers, resources, renderer, metrics)
+            output_writer.write_images([(os.path.join(output_folder_path, f"{hole_key}.png"), rgba)], output_format,
+                                       metrics, artists)
+            samples.add(metrics.stages)
+            totals["holes"] += 1
+            totals["vertices"] += vertices[0]
+            totals["pixels"] += rgba.shape[0] * rgba.shape[1]
+    return samples.summary(), totals
+
+
+# 与原来的 utils.intersection_of_polygons 相同，只在 legacy 模式中使用
+def legacy_intersection(polygon1, polygon2):
+    try:
+        if not polygon1 or not polygon2 or not polygon1.is_valid or not polygon2.is_valid:
+            return None
+        return polygon1.intersection(polygon2)
+    except Exception as e:
+        logger.warning(f"计算多边形相交时出错: {e}")
+        return None
+
+
+# 原来的逐洞处理：每个洞单独平滑自己的要素，多边形逐个与边界相交，线和标记逐点判断是否在边界内。
+# 只计时到 clip 为止，之后的阶段与 pipeline 相同
+def run_legacy(input_lines, resources):
+    samples = StageSamples()
+    totals = {"courses": 0, "holes": 0, "vertices": 0, "pixels": 0}
+    for line in input_lines:
+        start_time = time.perf_counter()
+        data = json.loads(line)
+        samples.add({"decode": time.perf_counter() - start_time})
+        totals["courses"] += 1
+        for club_id, course_id, hole_number, hole in hole_reader.iter_course_holes(data):
+            metrics = hole_metrics.HoleMetrics(hole_reader.format_hole_key(club_id, course_id, hole_number))
+            boundary_coords = None
+            items = []
+            with metrics.stage("parse"):
+                for gpsItem in hole.get("gpsItems", []):
+                    item = plot_courses.get_item_by_type(gpsItem["itemType"], resources)
+                    if item is None:
+                        continue
+                    coords = hole_reader.shape_coords(gpsItem["shape"])
+                    if item == resources.holeBoundary:
+                        if boundary_coords is None:
+                            boundary_coords = coords
+                    elif len(coords) > 0:
+                        items.append((item, coords))
+            polygons = []
+            with metrics.stage("smooth"):
+                hole_boundary = utils.get_smooth_polygon(boundary_coords) if boundary_coords is not None else None
+                for item, coords in items:
+                    if not isinstance(item, (plot_courses.Marker, plot_courses.Line)) and len(coords) > 2:
+                        polygons.append(utils.get_smooth_polygon(coords))
+            clipped = []
+            with metrics.stage("clip"):
+                if hole_boundary is not None:
+                    for polygon in polygons:
+                        intersection = legacy_intersection(polygon, hole_boundary)
+                        if intersection and not intersection.is_empty:
+                            clipped.append(intersection)
+                    for item, coords in items:
+                        if isinstance(item, (plot_courses.Marker, plot_courses.Line)):
+                            coords = [coord for coord in coords if hole_boundary.contains(Point(coord))]
+                            if isinstance(item, plot_courses.Line) and len(coords) > 1:
+                                clipped.append(LineString(coords))
+            samples.add(metrics.stages)
+            if hole_boundary is not None:
+                totals["holes"] += 1
+                totals["vertices"] += int(shapely.get_num_coordinates(clipped).sum()) if clipped else 0
+    return samples.summary(), totals
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=repo_dir, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline):
+    print(f"{'stage':<14} {'baseline s':>12} {'current s':>12} {'ratio':>8}")
+    for stage in stages:
+        current = report["stages"].get(stage)
+        previous = baseline.get("stages", {}).get(stage)
+        if not current or not previous:
+            continue
+        ratio = current["total_s"] / previous["total_s"] if previous["total_s"] else float("inf")
+        print(f"{stage:<14} {previous['total_s']:>12.3f} {current['total_s']:>12.3f} {ratio:>8.2f}")
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(description="Time each rendering stage on synthetic or given courses")
+    synthetic_course.add_course_arguments(parser)
+    parser.add_argument("--input", help="Benchmark this JSONL file instead of generating synthetic courses")
+    parser.add_argument("--resources-dir", default=os.path.join(repo_dir, "resources"))
+    parser.add_argument("--renderer", choices=plot_courses.renderers, default="numpy")
+    parser.add_argument("--stages", choices=["pipeline", "legacy"], default="pipeline",
+                        help="legacy times the old per-hole smooth and clip path (up to clip only) as a baseline")
+    parser.add_argument("--report", help="Write the JSON report to this file")
+    parser.add_argument("--baseline", help="Report from an earlier commit to compare against")
+    parser.add_argument("--keep-images", help="Write the rendered PNGs to this directory instead of a temporary one")
+    return parser
+
+
+if __name__ == "__main__":
+    args = create_parser().parse_args()
+    params = synthetic_course.params_from_args(args)
+    if args.input:
+        with open(args.input, "r", encoding="utf-8") as file:
+            input_lines = [line for line in file if line.strip()]
+    else:
+        input_lines = [json.dumps(course) for course in synthetic_course.iter_courses(args.courses, args.seed, **params)]
+    resources = plot_courses.Resources(args.resources_dir)
+    resources.preload_images()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_folder_path = args.keep_images or temp_dir
+        os.makedirs(output_folder_path, exist_ok=True)
+        start_time = time.perf_counter()
+        if args.stages == "legacy":
+            stage_summary, totals = run_legacy(input_lines, resources)
+        else:
+            stage_summary, totals = run(input_lines, resources, args.renderer, output_folder_path)
+        wall_time = time.perf_counter() - start_time
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "input": args.input or {"seed": args.seed, "courses": args.courses, **params},
+        "stages_mode": args.stages,
+        "renderer": args.renderer,
+        "settings": utils.render_settings(),
+        "totals": totals,
+        "wall_time_s": round(wall_time, 4),
+        "stages": stage_summary,
+    }
+    for stage in stages:
+        if stage in stage_summary:
+            summary = stage_summary[stage]
+            print(f"{stage:<14} total {summary['total_s']:8.3f}s  mean {summary['mean_ms']:9.3f}ms  "
+                  f"p95 {summary['p95_ms']:9.3f}ms  max {summary['max_ms']:9.3f}ms")
+    print(f"{totals['holes']} holes, {totals['vertices']} vertices, {totals['pixels']} pixels in {wall_time:.3f}s")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            compare(report, json.load(file))
@@ -0,0 +1,93 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# 冷启动基准：从启动进程到输出第一行 "Generated image:" 的时间，与 Electron 看到第一张图的时间一致
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+python_dir = os.path.join(repo_dir, "src", "python")
+sys.path.append(python_dir)
+
+import hole_reader
+
+# 只在真正渲染时才导入的重量级模块；import plot_courses 就加载了它们说明冷启动又变慢了
+lazy_modules = ["matplotlib", "scipy"]
+
+def create_parser():
+    parser = argparse.ArgumentParser(description="Measure time to the first rendered hole")
+    parser.add_argument("--root-data-dir", required=True, help="Root data directory")
+    parser.add_argument("--renderer", default="numpy", help="Renderer passed to plot_courses")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of cold starts per command")
+    parser.add_argument("--binary", default=os.path.join(python_dir, "dist", "plot_courses"),
+                        help="PyInstaller binary to measure as well, skipped when missing")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    return parser
+
+
+def first_hole_key(root_data_dir):
+    input_path = os.path.join(root_data_dir, "input_data", "golf_course_layout_samples.jsonl")
+    for club_id, course_id, hole_number, _ in hole_reader.iter_holes(input_path):
+        return hole_reader.format_hole_key(club_id, course_id, hole_number)
+    raise ValueError(f"No holes found in {input_path}")
+
+
+# 在新的解释器里 import plot_courses，返回已经被加载的 lazy_modules
+def eagerly_imported_modules():
+    code = ("import json, sys; sys.path.insert(0, sys.argv[1]); import plot_courses; "
+            "print(json.dumps(sorted({name.split('.')[0] for name in sys.modules})))")
+    output = subprocess.run([sys.executable, "-c", code, python_dir], capture_output=True, text=True,
+                            check=True).stdout
+    loaded = set(json.loads(output.splitlines()[-1]))
+    return [name for name in lazy_modules if name in loaded]
+
+
+def time_to_first_image(command):
+    start_time = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        for line in process.stdout:
+            if line.startswith("Generated image:"):
+                return time.perf_counter() - start_time
+        return None
+    finally:
+        process.kill()
+        process.wait()
+
+
+def measure(name, command, repeat):
+    samples = []
+    for _ in range(repeat):
+        elapsed = time_to_first_image(command)
+        if elapsed is None:
+            print(f"{name}: no image was generated, command: {' '.join(command)}")
+            return None
+        samples.append(elapsed)
+    result = {
+        "command": command,
+        "samples": [round(sample, 3) for sample in samples],
+        "min": round(min(samples), 3),
+        "median": round(statistics.median(samples), 3),
+    }
+    print(f"{name}: min {result['min']:.3f}s, median {result['median']:.3f}s over {repeat} runs")
+    return result
+
+
+if __name__ == "__main__":
+    args = create_parser().parse_args()
+    eager = eagerly_imported_modules()
+    if eager:
+        sys.exit(f"import plot_courses loads {', '.join(eager)} at import time, they must be imported lazily")
+    hole_key = first_hole_key(args.root_data_dir)
+    options = ["--root-data-dir", args.root_data_dir, "--renderer", args.renderer, "--priority-holes", hole_key]
+    commands = {"source": [sys.executable, os.path.join(python_dir, "plot_courses.py")] + options}
+    if os.path.exists(args.binary):
+        commands["binary"] = [args.binary] + options
+    report = {"hole": hole_key, "renderer": args.renderer, "results": {}}
+    for name, command in commands.items():
+        report["results"][name] = measure(name, command, args.repeat)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
@@ -0,0 +1,189 @@
+import argparse
+import json
+import math
+import os
+import random
+import uuid
+
+# 生成可复现的合成球场数据（clubId/courseId/holes/gpsItems），用于基准测试，不依赖真实客户数据
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+lat_to_meter_ratio = 111000
+tree_types = ["LeafyTree", "ShrubTree", "PalmTree", "PineTree"]
+
+default_params = {
+    "holes": 18,
+    "hole_length": 400.0,  # 米
+    "hole_width": 120.0,
+    "orientation": None,  # 度，None 表示每个洞随机
+    "vertices": 64,
+    "bunkers": 4,
+    "water_bodies": 1,
+    "line_length": 500.0,
+    "line_vertices": 50,
+    "tree_density": 20.0,  # 每公顷（按球洞外接矩形计算）
+    "center_latitude": 40.0,
+    "center_longitude": 116.0,
+}
+
+
+class HoleFrame:
+    # 以球洞中心为原点、沿球道方向为 x 轴的局部米制坐标，转换为经纬度
+    def __init__(self, center_longitude, center_latitude, orientation):
+        self.center_longitude = center_longitude
+        self.center_latitude = center_latitude
+        self.cos_angle = math.cos(math.radians(orientation))
+        self.sin_angle = math.sin(math.radians(orientation))
+        self.meters_per_longitude = lat_to_meter_ratio * math.cos(math.radians(center_latitude))
+
+    def to_point(self, x, y):
+        east = x * self.cos_angle - y * self.sin_angle
+        north = x * self.sin_angle + y * self.cos_angle
+        return {
+            "longitude": round(self.center_longitude + east / self.meters_per_longitude, 8),
+            "latitude": round(self.center_latitude + north / lat_to_meter_ratio, 8),
+        }
+
+
+def ring(rng, frame, cx, cy, rx, ry, vertices, jitter=0.15):
+    shape = []
+    for i in range(vertices):
+        angle = 2 * math.pi * i / vertices
+        scale = 1 + jitter * (rng.random() - 0.5)
+        shape.append(frame.to_point(cx + rx * math.cos(angle) * scale, cy + ry * math.sin(angle) * scale))
+    return shape
+
+
+def polyline(rng, frame, x0, y0, length, vertices, heading=0.0):
+    shape = []
+    step = length / max(vertices - 1, 1)
+    x, y = x0, y0
+    for _ in range(vertices):
+        shape.append(frame.to_point(x, y))
+        heading += rng.uniform(-0.15, 0.15)
+        x += step * math.cos(heading)
+        y += step * math.sin(heading)
+    return shape
+
+
+def generate_hole(rng, center_longitude, center_latitude, params):
+    orientation = params["orientation"]
+    if orientation is None:
+        orientation = rng.uniform(0, 360)
+    frame = HoleFrame(center_longitude, center_latitude, orientation)
+    half_length = params["hole_length"] / 2
+    half_width = params["hole_width"] / 2
+    vertices = params["vertices"]
+    # 多边形的顶点数随尺寸缩小，最少 12 个
+    small_vertices = max(12, vertices // 4)
+    gps_items = [
+        {"itemType": "HoleBoundary", "shape": ring(rng, frame, 0, 0, half_length, half_width, vertices, 0.05)},
+        {"itemType": "TeeboxTrace",
+         "shape": ring(rng, frame, -half_length * 0.85, 0, half_width * 0.15, half_width * 0.1, small_vertices)},
+        {"itemType": "FairwayTrace",
+         "shape": ring(rng, frame, 0, 0, half_length * 0.7, half_width * 0.45, vertices)},
+        {"itemType": "GreenTrace",
+         "shape": ring(rng, frame, half_length * 0.8, 0, half_width * 0.3, half_width * 0.3, small_vertices)},
+    ]
+    for _ in range(params["bunkers"]):
+        x = rng.uniform(-0.5, 0.9) * half_length
+        y = rng.choice([-1, 1]) * rng.uniform(0.35, 0.6) * half_width
+        size = rng.uniform(0.05, 0.12) * half_width
+        gps_items.append({"itemType": "BunkerTrace",
+                          "shape": ring(rng, frame, x, y, size * 1.6, size, small_vertices, 0.3)})
+    for _ in range(params["water_bodies"]):
+        x = rng.uniform(-0.6, 0.6) * half_length
+        y = rng.uniform(-0.7, 0.7) * half_width
+        size = rng.uniform(0.15, 0.35) * half_width
+        gps_items.append({"itemType": "WaterTrace",
+                          "shape": ring(rng, frame, x, y, size * 2, size, vertices // 2, 0.3)})
+        gps_items.append({"itemType": "WaterPath",
+                          "shape": ring(rng, frame, x, y, size * 2.2, size * 1.1, vertices // 2, 0.1)})
+    if params["line_length"] > 0:
+        # 球车道从边界外开始，穿过球洞，覆盖裁剪逻辑
+        gps_items.append({"itemType": rng.choice(["CartpathPath", "CartpathTrace"]),
+                          "shape": polyline(rng, frame, -half_length * 1.2, half_width * 0.7,
+                                            params["line_length"], params["line_vertices"])})
+    hectares = params["hole_length"] * params["hole_width"] / 10000
+    tree_count = round(hectares * params["tree_density"])
+    trees = {}
+    for _ in range(tree_count):
+        # 树撒在稍大于边界的矩形里，部分会被裁掉
+        point = frame.to_point(rng.uniform(-1.05, 1.05) * half_length, rng.uniform(-1.05, 1.05) * half_width)
+        trees.setdefault(rng.choice(tree_types), []).append(point)
+    for tree_type in tree_types:
+        if tree_type in trees:
+            gps_items.append({"itemType": tree_type, "shape": trees[tree_type]})
+    return {"gpsItems": gps_items}
+
+
+def generate_course(rng, params):
+    club_id = str(uuid.UUID(int=rng.getrandbits(128), version=1))
+    course_id = str(uuid.UUID(int=rng.getrandbits(128), version=1))
+    # 各洞沿经度方向排开，互不重叠
+    spacing = max(params["hole_length"], params["hole_width"]) * 1.5
+    meters_per_longitude = lat_to_meter_ratio * math.cos(math.radians(params["center_latitude"]))
+    holes = [
+        generate_hole(rng, params["center_longitude"] + i * spacing / meters_per_longitude,
+                      params["center_latitude"], params)
+        for i in range(params["holes"])
+    ]
+    return {"clubId": club_id, "courseId": course_id, "holes": holes}
+
+
+def iter_courses(courses, seed=0, **params):
+    params = {**default_params, **params}
+    rng = random.Random(seed)
+    for _ in range(courses):
+        yield generate_course(rng, params)
+
+
+def write_courses(output_file_path, courses, seed=0, **params):
+    with open(output_file_path, "w", encoding="utf-8") as file:
+        for course in iter_courses(courses, seed, **params):
+            file.write(json.dumps(course) + "\n")
+
+
+def add_course_arguments(parser):
+    parser.add_argument("--courses", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--holes", type=int, default=default_params["holes"], help="Holes per course")
+    parser.add_argument("--hole-length", type=float, default=default_params["hole_length"], help="Meters")
+    parser.add_argument("--hole-width", type=float, default=default_params["hole_width"], help="Meters")
+    parser.add_argument("--orientation", type=float, help="Degrees counterclockwise from east, random per hole if omitted")
+    parser.add_argument("--vertices", type=int, default=default_params["vertices"],
+                        help="Vertices of the boundary and fairway polygons")
+    parser.add_argument("--bunkers", type=int, default=default_params["bunkers"], help="Bunkers per hole")
+    parser.add_argument("--water-bodies", type=int, default=default_params["water_bodies"], help="Water bodies per hole")
+    parser.add_argument("--line-length", type=float, default=default_params["line_length"],
+                        help="Cart path length in meters, 0 for none")
+    parser.add_argument("--line-vertices", type=int, default=default_params["line_vertices"])
+    parser.add_argument("--tree-density", type=float, default=default_params["tree_density"], help="Trees per hectare")
+    return parser
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(description="Generate deterministic synthetic golf course JSONL")
+    parser.add_argument("--output", help="JSONL file to write")
+    parser.add_argument("--root-data-dir",
+                        help="Create a root data directory (input_data, output_data, resources) instead of --output")
+    return add_course_arguments(parser)
+
+
+def params_from_args(args):
+    return {key: getattr(args, key) for key in default_params if hasattr(args, key)}
+
+
+if __name__ == "__main__":
+    args = create_parser().parse_args()
+    if not args.output and not args.root_data_dir:
+        raise SystemExit("Either --output or --root-data-dir is required")
+    output_file_path = args.output
+    if args.root_data_dir:
+        os.makedirs(os.path.join(args.root_data_dir, "input_data"), exist_ok=True)
+        os.makedirs(os.path.join(args.root_data_dir, "output_data"), exist_ok=True)
+        resources_link = os.path.join(args.root_data_dir, "resources")
+        if not os.path.exists(resources_link):
+            os.symlink(os.path.join(repo_dir, "resources"), resources_link)
+        output_file_path = os.path.join(args.root_data_dir, "input_data", "golf_course_layout_samples.jsonl")
+    write_courses(output_file_path, args.courses, args.seed, **params_from_args(args))
+    print(f"Wrote {args.courses} course(s) to {output_file_path}")
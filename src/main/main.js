@@ -1,6 +1,7 @@
 const { app, BrowserWindow, ipcMain, dialog } = require("electron");
 const path = require("path");
 const { spawn } = require("child_process");
+const readline = require("readline");
 // const isDev = require("electron-is-dev");
 const fs = require("fs");
 
@@ -102,93 +103,225 @@ ipcMain.handle("open-folder-dialog", async () => {
   return result.canceled ? null : result.filePaths[0];
 });
 
-ipcMain.handle("change-skin", async (event, root_data_dir) => {
-  try {
-    let pythonExecutablePath = "";
-    let param;
-    let basePath;
-
-    if (app.isPackaged) {
-      basePath = process.resourcesPath;
-      pythonExecutablePath = path.join(basePath, "python", "plot_courses");
-      param = ["--root-data-dir", root_data_dir];
-
-      // 确保文件有执行权限
-      if (process.platform === "darwin" || process.platform === "linux") {
-        try {
-          fs.chmodSync(pythonExecutablePath, "755");
-        } catch (error) {
-          console.error("Failed to set executable permissions:", error);
-        }
+// 常驻的 Python 渲染进程：只冷启动一次，之后通过 stdin/stdout 上的 JSON-RPC 发送任务
+let renderServer = null;
+// 正在启动或已启动的常驻进程；并发的 IPC 调用共用它，否则每个调用都会在 await 期间各自 spawn 一个 --server
+let renderServerPromise = null;
+let nextRequestId = 1;
+const pendingRequests = new Map();
+const renderJobs = new Map();
+let currentJobId = null;
+
+async function getRenderServerCommand() {
+  if (app.isPackaged) {
+    const pythonExecutablePath = path.join(
+      process.resourcesPath,
+      "python",
+      "plot_courses"
+    );
+    // 确保文件有执行权限
+    if (process.platform === "darwin" || process.platform === "linux") {
+      try {
+        fs.chmodSync(pythonExecutablePath, "755");
+      } catch (error) {
+        console.error("Failed to set executable permissions:", error);
       }
+    }
+    return { command: pythonExecutablePath, args: ["--server"] };
+  }
+  const scriptPath = path.join(__dirname, "../python/plot_courses.py");
+  return { command: await getPythonPath(), args: [scriptPath, "--server"] };
+}
+
+function ensureRenderServer() {
+  renderServerPromise ??= startRenderServer().catch((error) => {
+    renderServerPromise = null;
+    throw error;
+  });
+  return renderServerPromise;
+}
+
+async function startRenderServer() {
+  const { command, args } = await getRenderServerCommand();
+  const child = spawn(command, args);
+  currentPythonProcess = child;
+  renderServer = child;
+
+  readline.createInterface({ input: child.stdout }).on("line", (line) => {
+    let message;
+    try {
+      message = JSON.parse(line);
+    } catch (e) {
+      console.log("Python output:", line);
+      return;
+    }
+    handleServerMessage(message);
+  });
+
+  child.stderr.on("data", (data) => {
+    console.error("Python error details:", {
+      error: data.toString(),
+      pythonPath: command,
+      params: args,
+    });
+  });
+
+  child.on("close", (code) => {
+    console.log("Python render server exited with code:", code);
+    renderServer = null;
+    renderServerPromise = null;
+    currentPythonProcess = null;
+    currentJobId = null;
+    const error = new Error(`Render server exited with code ${code}`);
+    pendingRequests.forEach(({ reject }) => reject(error));
+    pendingRequests.clear();
+    renderJobs.forEach(({ reject, waiters }) => {
+      reject(error);
+      waiters.forEach((waiter) => waiter());
+    });
+    renderJobs.clear();
+  });
+
+  return child;
+}
+
+// onResult 在读到响应的那一行时同步调用：同一块输出里紧跟着的通知也能找到它登记的状态
+function sendRequest(method, params = {}, onResult = null) {
+  return ensureRenderServer().then(
+    (child) =>
+      new Promise((resolve, reject) => {
+        const id = nextRequestId++;
+        pendingRequests.set(id, { resolve, reject, onResult });
+        child.stdin.write(
+          JSON.stringify({ jsonrpc: "2.0", id, method, params }) + "\n"
+        );
+      })
+  );
+}
+
+function handleServerMessage(message) {
+  if (message.id !== undefined && message.id !== null) {
+    const request = pendingRequests.get(message.id);
+    if (!request) return;
+    pendingRequests.delete(message.id);
+    if (message.error) {
+      request.reject(new Error(message.error.message));
     } else {
-      basePath = path.join(__dirname, "../python/plot_courses.py");
-      param = [basePath, "--root-data-dir", root_data_dir];
-      pythonExecutablePath = await getPythonPath();
+      if (request.onResult) request.onResult(message.result);
+      request.resolve(message.result);
     }
+    return;
+  }
+
+  const params = message.params || {};
+  const job = renderJobs.get(params.job_id);
+  switch (message.method) {
+    case "hole_preview":
+      // 低分辨率预览先显示，完整分辨率的图渲染完后替换同一个洞
+      mainWindow.webContents.send("update-preview", params.path, params.hole);
+      break;
+    case "hole_rendered":
+      mainWindow.webContents.session.clearCache();
+      mainWindow.webContents.send("update-preview", params.path, params.hole);
+      if (job) job.results.push({ success: true, output_path: params.path });
+      break;
+    case "hole_failed":
+      if (job) job.results.push({ success: false, error: `${params.hole}: ${params.error}` });
+      break;
+    case "job_finished":
+      if (!job) break;
+      renderJobs.delete(params.job_id);
+      if (currentJobId === params.job_id) currentJobId = null;
+      job.waiters.forEach((waiter) => waiter());
+      if (params.state === "finished") {
+        job.resolve(JSON.stringify(job.results));
+      } else if (params.state === "cancelled") {
+        job.reject(new Error("Process aborted"));
+      } else {
+        job.reject(new Error(params.error || "Process failed"));
+      }
+      break;
+    default:
+      break;
+  }
+}
 
-    currentPythonProcess = spawn(pythonExecutablePath, param);
-
-    return new Promise((resolve, reject) => {
-      let result = "";
-      let error = "";
-
-      currentPythonProcess.stdout.on("data", (data) => {
-        const output = data.toString();
-        result += output;
-        console.log("Python output:", output);
-
-        // 处理所有生成的图片
-        if (output.includes("Generated image:")) {
-          try {
-            const imagePath = output.split("Generated image:")[1].trim();
-            mainWindow.webContents.session.clearCache();
-            mainWindow.webContents.send("update-preview", imagePath);
-          } catch (e) {
-            console.error("Error parsing image path:", e);
-          }
-        }
-      });
-
-      currentPythonProcess.stderr.on("data", (data) => {
-        error += data.toString();
-        console.error("Python error details:", {
-          error: data.toString(),
-          pythonPath: pythonExecutablePath,
-          params: param,
-        });
-      });
-
-      currentPythonProcess.on("close", (code) => {
-        currentPythonProcess = null; // 清除进程引用
-        console.log("Python process exited with code:", code);
-        if (code !== 0) {
-          reject(error || "Process failed");
-        } else {
-          try {
-            resolve(result);
-          } catch (e) {
-            reject(`Failed to parse result: ${result}`);
-          }
-        }
-      });
+ipcMain.handle("change-skin", async (event, root_data_dir) => {
+  try {
+    const jobFinished = new Promise((resolve, reject) => {
+      // readline 同步发出一块输出里的所有行，job_started/job_finished 可能紧跟在响应之后，
+      // 在 .then 里登记会错过它们，所以在处理响应行时就登记任务
+      // 预览需要显式请求：界面先显示低分辨率预览，完整分辨率的图渲染完后替换
+      sendRequest("render", { root_data_dir, preview: true }, ({ job_id }) => {
+        currentJobId = job_id;
+        // waiters 在任务结束（job_finished 或进程退出）时调用
+        renderJobs.set(job_id, { resolve, reject, results: [], waiters: [] });
+      }).catch(reject);
     });
+    return await jobFinished;
   } catch (error) {
     console.error("Error processing files:", error);
     throw error;
   }
 });
 
-// 修改abort处理部分
-ipcMain.handle("abort-process", () => {
-  if (currentPythonProcess) {
-    if (process.platform === "win32") {
-      spawn("taskkill", ["/pid", currentPythonProcess.pid, "/f", "/t"]);
-    } else {
-      currentPythonProcess.kill("SIGTERM");
-    }
-    currentPythonProcess = null;
-    throw new Error("Process aborted");
+// cancel 之后等待 job_finished 的时间，超过就认为常驻进程卡住了
+const abortTimeoutMs = 10000;
+
+function killRenderServer() {
+  if (!renderServer) return;
+  if (process.platform === "win32") {
+    spawn("taskkill", ["/pid", renderServer.pid, "/f", "/t"]);
+  } else {
+    renderServer.kill("SIGKILL");
+  }
+}
+
+// 取消当前任务，但保留常驻进程以及其中已加载的资源。cancel 后 abortTimeoutMs 内没有收到 job_finished 时
+// 强制结束常驻进程，下一个任务会重新启动它。
+// 返回 true 表示当前任务已中止（change-skin 以 "Process aborted" 失败），没有正在运行的任务时返回 false
+ipcMain.handle("abort-process", async () => {
+  const jobId = currentJobId;
+  const job = jobId && renderJobs.get(jobId);
+  if (!renderServer || !job) return false;
+  const finished = new Promise((resolve) => job.waiters.push(resolve));
+  let timer;
+  const timedOut = new Promise((resolve) => {
+    timer = setTimeout(() => resolve(true), abortTimeoutMs);
+  });
+  const cancelled = sendRequest("cancel", { job_id: jobId }).then(
+    () => finished.then(() => false),
+    () => false
+  );
+  const hung = await Promise.race([cancelled, timedOut]);
+  clearTimeout(timer);
+  if (hung) {
+    console.error(`Render server did not finish job ${jobId} after cancel, killing it`);
+    renderJobs.delete(jobId);
+    if (currentJobId === jobId) currentJobId = null;
+    job.reject(new Error("Process aborted"));
+    killRenderServer();
+  }
+  return true;
+});
+
+// 例如用户选中了另一个球场：把这些球场（clubId_courseId）或洞（clubId_courseId_holeNumber）提到当前任务的最前面
+ipcMain.handle("prioritize-holes", async (event, { courses, holes } = {}) => {
+  if (!renderServer || !currentJobId) return false;
+  await sendRequest("prioritize", { job_id: currentJobId, courses, holes });
+  return true;
+});
+
+// 只取消这些球场或洞，当前任务继续渲染其余的洞
+ipcMain.handle("cancel-holes", async (event, { courses, holes } = {}) => {
+  if (!renderServer || !currentJobId) return false;
+  await sendRequest("cancel", { job_id: currentJobId, courses, holes });
+  return true;
+});
+
+app.on("will-quit", () => {
+  if (renderServer) {
+    renderServer.stdin.end();
+    renderServer.kill("SIGTERM");
   }
-  return false;
 });
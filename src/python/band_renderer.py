@@ -0,0 +1,99 @@
+import math
+import os
+
+import raster_renderer
+import output_writer
+from utils import logger
+
+# 超过像素预算的洞：off 不做限制（默认，输出与所选渲染器一致）；bands 按若干整行分条渲染，边画边写进 PNG，
+# 峰值内存只和每条的大小有关；cap 降低分辨率直到不超过预算。
+# bands 用 numpy 渲染器分条绘制，只能与 numpy 渲染器一起使用，且只支持 png 输出，其他格式按 cap 处理
+oversize_policies = ["off", "bands", "cap"]
+default_max_megapixels = 32
+default_band_megapixels = 4
+
+
+class PixelBudget:
+    def __init__(self, max_pixels=default_max_megapixels * 1000000, policy="bands",
+                 band_pixels=default_band_megapixels * 1000000):
+        if policy not in ("bands", "cap"):
+            raise ValueError(f"Unknown oversize policy: {policy}")
+        if max_pixels <= 0 or band_pixels <= 0:
+            raise ValueError(f"Pixel budgets must be positive: {max_pixels}, {band_pixels}")
+        self.max_pixels = max_pixels
+        self.policy = policy
+        self.band_pixels = band_pixels
+
+    # 参与增量渲染的哈希；每条的大小不影响输出
+    def settings(self):
+        return {"max_pixels": self.max_pixels, "oversize_policy": self.policy}
+
+    # width/height 为标准分辨率下的像素尺寸，scales 为各输出尺寸的倍数。
+    # 返回 (不超过预算的各尺寸倍数, 需要分条渲染的尺寸下标)
+    def plan(self, width, height, scales, output_format):
+        planned, banded = [], set()
+        for index, scale in enumerate(scales):
+            pixels = round(width * scale) * round(height * scale)
+            if pixels <= self.max_pixels:
+                planned.append(scale)
+            elif self.policy == "bands" and output_format.format == "png":
+                planned.append(scale)
+                banded.add(index)
+            else:
+                planned.append(self.capped_scale(width, height))
+        return planned, banded
+
+    # 画布尺寸按四舍五入取整，每边留出一个像素的余量：(width * s + 1) * (height * s + 1) <= max_pixels
+    def capped_scale(self, width, height):
+        a, b, c = width * height, width + height, 1 - self.max_pixels
+        return max((math.sqrt(b * b - 4 * a * c) - b) / (2 * a), 0.0)
+
+
+# 返回 PixelBudget，policy 为 off 时返回 None
+def pixel_budget(max_megapixels, policy, renderer):
+    if policy not in oversize_policies:
+        raise ValueError(f"Unknown oversize policy: {policy}")
+    if policy == "off":
+        return None
+    # 分条渲染的图与 matplotlib 渲染的图观感不同，不能悄悄换掉渲染器
+    if policy == "bands" and renderer != "numpy":
+        raise ValueError(f"The bands oversize policy renders with the NumPy compositor, use the numpy renderer "
+                         f"or the cap policy instead of {renderer}")
+    return PixelBudget(round(max_megapixels * 1000000), policy)
+
+
+class BandedImage:
+    # 不分配整张画布，写出时用 numpy 渲染器逐条渲染并直接编码。shape 与整张 RGBA 相同，供计时事件记录尺寸
+    def __init__(self, hole_boundary, items, markers, resources, scale=1,
+                 band_pixels=default_band_megapixels * 1000000):
+        self.hole_boundary = hole_boundary
+        self.items = items
+        self.markers = markers
+        self.resources = resources
+        self.scale = scale
+        width, height = raster_renderer.canvas_size(hole_boundary, scale)
+        self.shape = (max(height, 1), max(width, 1), 4)
+        self.band_rows = max(band_pixels // self.shape[1], 1)
+        self.layers = len(items) + len(markers) + 1
+
+    def bands(self):
+        height = self.shape[0]
+        for top in range(0, height, self.band_rows):
+            yield top, min(self.band_rows, height - top)
+
+    # 返回写出的字节数
+    def write(self, output_file_path, output_format, metrics):
+        height, width = self.shape[:2]
+        logger.info(f"Rendering {width}x{height} pixels in bands of {self.band_rows} rows: {output_file_path}")
+        os.makedirs(os.path.dirname(output_file_path) or ".", exist_ok=True)
+        with open(output_file_path, "wb") as file:
+            stream = output_writer.PngStream(file, width, height, output_format.compress_level)
+            for rows in self.bands():
+                with metrics.stage("draw"):
+                    canvas = raster_renderer.rasterize_hole(self.hole_boundary, self.items, self.markers,
+                                                            self.resources, self.scale, rows)
+                with metrics.stage("encode"):
+                    stream.write(canvas.to_uint8())
+            with metrics.stage("encode"):
+                stream.close()
+            return file.tell()
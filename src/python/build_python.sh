@@ -11,15 +11,10 @@ poetry install --no-root
 # 验证安装
 echo "Verifying installations..."
 poetry run python -c "
-import geopandas
 import matplotlib
-import pandas
 import numpy
 import scipy
 import shapely
-import fiona
-import pyproj
-import rtree
 print('All required packages are installed successfully!')
 "
 
@@ -29,31 +24,42 @@ cd src/python
 poetry lock
 
 # 使用 poetry 环境中的 pyinstaller
+# 渲染代码不依赖 geopandas/pandas/fiona/pyproj/rtree（空间索引用 shapely.STRtree），不打包进去以减小体积、加快冷启动
 poetry run pyinstaller --onefile \
-    --hidden-import geopandas \
     --hidden-import matplotlib \
-    --hidden-import pandas \
     --hidden-import numpy \
     --hidden-import scipy \
     --hidden-import shapely \
-    --hidden-import fiona \
-    --hidden-import pyproj \
-    --hidden-import rtree \
     --hidden-import pkg_resources.py2_warn \
-    --hidden-import pandas._libs.tslibs.base \
-    --hidden-import pandas._libs.tslibs.np_datetime \
-    --hidden-import pandas._libs.tslibs.timedeltas \
     --add-data "hole_item.py:." \
     --add-data "utils.py:." \
     --add-data "color_manager.py:." \
+    --add-data "raster_renderer.py:." \
+    --add-data "hole_reader.py:." \
+    --add-data "render_cache.py:." \
+    --add-data "render_server.py:." \
+    --add-data "feature_store.py:." \
+    --add-data "hole_metrics.py:." \
+    --add-data "tile_renderer.py:." \
+    --add-data "tile_cache.py:." \
+    --add-data "output_variants.py:." \
+    --add-data "output_writer.py:." \
+    --add-data "texture_cache.py:." \
+    --add-data "course_geometry.py:." \
+    --add-data "hole_store.py:." \
+    --add-data "band_renderer.py:." \
+    --add-data "render_scheduler.py:." \
+    --add-data "svg_renderer.py:." \
+    --add-data "render_supervisor.py:." \
     --add-data "../../resources:resources" \
+    --exclude-module geopandas \
+    --exclude-module pandas \
+    --exclude-module fiona \
+    --exclude-module pyproj \
+    --exclude-module rtree \
     --exclude-module matplotlib.tests \
-    --exclude-module pandas.tests \
     --exclude-module scipy.tests \
     --exclude-module shapely.tests \
-    --exclude-module fiona.tests \
-    --exclude-module pyproj.tests \
-    --exclude-module rtree.tests \
     --clean \
     --noupx \
     --optimize=2 \
@@ -0,0 +1,85 @@
+import numpy as np
+import shapely
+from shapely.geometry import LineString
+
+from utils import logger
+
+
+def geometry_array(geometries):
+    array = np.empty(len(geometries), dtype=object)
+    array[:] = geometries
+    return array
+
+
+# 保持拓扑的简化（多边形不会自相交），tolerance 为 0 时不简化。返回简化后的几何和简化前后的顶点数
+def simplify(geometries, tolerance):
+    geometries = geometry_array(geometries)
+    before = shapely.get_num_coordinates(geometries)
+    if tolerance > 0:
+        geometries = shapely.simplify(geometries, tolerance, preserve_topology=True)
+    return geometries, before, shapely.get_num_coordinates(geometries)
+
+
+class CourseGeometry:
+    # 整个球场的要素一次性分配给各洞并裁剪：球洞边界建一棵 STRtree，多边形、线、标记点各做一次批量查询和批量相交。
+    # 结果为 (要素下标, 洞下标, 几何) 三个数组，按洞、要素的顺序排列
+    def __init__(self, boundaries):
+        # boundaries: 每个洞的球洞边界，没有边界的洞为 None
+        self.hole_indices = np.array([index for index, boundary in enumerate(boundaries) if boundary is not None],
+                                     dtype=np.int64)
+        self.boundaries = geometry_array([boundaries[index] for index in self.hole_indices])
+        shapely.prepare(self.boundaries)
+        # 无效的边界或要素多边形不参与裁剪，对应的要素在这个洞里直接丢弃
+        self.valid_boundaries = shapely.is_valid(self.boundaries)
+        self.tree = shapely.STRtree(self.boundaries)
+
+    def _query(self, geometries, predicate):
+        if len(geometries) == 0 or len(self.boundaries) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return self.tree.query(geometries, predicate=predicate)
+
+    def _sorted(self, feature_indices, tree_indices, geometries):
+        hole_indices = self.hole_indices[tree_indices]
+        order = np.lexsort((feature_indices, hole_indices))
+        return feature_indices[order], hole_indices[order], geometries[order]
+
+    def clip_polygons(self, polygons):
+        polygons = geometry_array(polygons)
+        feature_indices, tree_indices = self._query(polygons, "intersects")
+        keep = self.valid_boundaries[tree_indices] & shapely.is_valid(polygons[feature_indices])
+        feature_indices, tree_indices = feature_indices[keep], tree_indices[keep]
+        clipped = _intersection(polygons[feature_indices], self.boundaries[tree_indices])
+        keep = ~shapely.is_empty(clipped) & ~shapely.is_missing(clipped)
+        return self._sorted(feature_indices[keep], tree_indices[keep], clipped[keep])
+
+    # 裁剪结果拆成单条 LineString，相交只剩点或为空的丢弃
+    def clip_lines(self, lines):
+        lines = geometry_array(lines)
+        feature_indices, tree_indices = self._query(lines, "intersects")
+        clipped = _intersection(lines[feature_indices], self.boundaries[tree_indices])
+        parts, part_indices = shapely.get_parts(clipped, return_index=True)
+        keep = (shapely.get_type_id(parts) == shapely.GeometryType.LINESTRING) & ~shapely.is_empty(parts)
+        part_indices = part_indices[keep]
+        return self._sorted(feature_indices[part_indices], tree_indices[part_indices], parts[keep])
+
+    # coords: N x 2 的点坐标；返回落在各洞边界内的点，几何数组为点的下标
+    def assign_points(self, coords):
+        points = shapely.points(np.asarray(coords, dtype=np.float64).reshape(-1, 2))
+        point_indices, tree_indices = self._query(points, "within")
+        return self._sorted(point_indices, tree_indices, point_indices)
+
+
+def _intersection(geometries, boundaries):
+    try:
+        return shapely.intersection(geometries, boundaries)
+    except Exception as e:
+        # 批量相交失败时逐个计算，只丢弃出错的那一对
+        logger.warning(f"批量裁剪出错，改为逐个裁剪: {e}")
+        results = np.empty(len(geometries), dtype=object)
+        for index, (geometry, boundary) in enumerate(zip(geometries, boundaries)):
+            try:
+                results[index] = geometry.intersection(boundary)
+            except Exception as e:
+                logger.warning(f"计算相交时出错: {e}")
+                results[index] = LineString()
+        return results
@@ -0,0 +1,40 @@
+import numpy as np
+import shapely
+
+from hole_item import ItemType
+
+# 每个洞的要素按列存储：几何数组 + 要素类型编码，颜色、线宽、zorder 都由类型决定
+item_types = list(ItemType)
+_item_codes = {item_type: code for code, item_type in enumerate(item_types)}
+
+
+class FeatureStore:
+    def __init__(self):
+        self._geometries = []
+        self._item_codes = []
+        self.geometries = np.empty(0, dtype=object)
+        self.item_codes = np.empty(0, dtype=np.int8)
+
+    def add(self, geometry, item_type: ItemType):
+        self._geometries.append(geometry)
+        self._item_codes.append(_item_codes[item_type])
+
+    # 收集完成后转换成数组
+    def freeze(self):
+        self.geometries = np.empty(len(self._geometries), dtype=object)
+        self.geometries[:] = self._geometries
+        self.item_codes = np.array(self._item_codes, dtype=np.int8)
+        self._geometries = []
+        self._item_codes = []
+        return self
+
+    def __len__(self):
+        return len(self.geometries)
+
+    def __iter__(self):
+        for geometry, code in zip(self.geometries, self.item_codes):
+            yield geometry, item_types[code]
+
+    @property
+    def total_bounds(self):
+        return shapely.total_bounds(self.geometries)
@@ -0,0 +1,168 @@
+import cProfile
+import heapq
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+from utils import logger
+import render_supervisor
+
+try:
+    import resource
+except ImportError:
+    # Windows 没有 resource 模块，不统计 RSS
+    resource = None
+
+stage_names = ["parse", "smooth", "simplify", "clip", "build_artists", "draw", "downsample", "encode", "write"]
+# 运行结束时汇总列出的最慢洞数量
+slowest_count = 10
+
+
+# ru_maxrss 是整个进程生命周期内的峰值，不能说明单个洞用了多少内存
+def process_peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位是 KB，macOS 是字节
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# 洞渲染结束时当前进程的常驻内存
+def current_rss_mb():
+    rss_mb = render_supervisor.process_rss_mb(os.getpid())
+    return None if rss_mb is None else round(rss_mb, 1)
+
+
+# kind 为 "hole" 时计时一个洞；为 "course" 时计时整个球场一次完成的解析、平滑、简化和裁剪，hole_key 为球场的 key
+class HoleMetrics:
+    def __init__(self, hole_key, profile_threshold=None, profile_dir=None, kind="hole"):
+        self.hole_key = hole_key
+        self.kind = kind
+        self.stages = {}
+        self.info = {}
+        self.profile_threshold = profile_threshold
+        self.profile_dir = profile_dir
+        self._profiler = None
+        if profile_threshold is not None:
+            # 每个洞都采样，只有超过阈值的才写出 .prof 文件
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._start_time = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start_time
+
+    # 这个洞要素简化前后的顶点数
+    def record_vertices(self, before, after):
+        self.info["vertices"], self.info["simplified_vertices"] = before, after
+
+    # width/height 为主输出的像素尺寸，多尺寸输出时 bytes_written 为所有文件的总字节数
+    def record_output(self, width, height, bytes_written, artists):
+        self.info["width"], self.info["height"] = width, height
+        self.info["bytes_written"] = bytes_written
+        self.info["artists"] = artists
+
+    def stop_profile(self):
+        if self._profiler is not None:
+            self._profiler.disable()
+
+    def finish(self, output_file_path=None, error=None):
+        wall_time = time.perf_counter() - self._start_time
+        event = {
+            "event": self.kind,
+            self.kind: self.hole_key,
+            "wall_time": round(wall_time, 4),
+            "stages": {name: round(self.stages[name], 4) for name in stage_names if name in self.stages},
+            "rss_mb": current_rss_mb(),
+            "process_peak_rss_mb": process_peak_rss_mb(),
+            **self.info,
+            "output": output_file_path,
+            "error": error,
+        }
+        if self._profiler is not None:
+            self._profiler.disable()
+            if wall_time >= self.profile_threshold:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                profile_path = os.path.join(self.profile_dir, f"{self.hole_key}.prof")
+                self._profiler.dump_stats(profile_path)
+                event["profile"] = profile_path
+            self._profiler = None
+        return event
+
+
+class RunMetrics:
+    # 汇总每个洞和每个球场的事件；metrics_file 为 JSONL，每个事件一行，最后一行是 summary
+    def __init__(self, metrics_file=None):
+        self._file = open(metrics_file, "a", encoding="utf-8") if metrics_file else None
+        self._start_time = time.perf_counter()
+        self._wall_times = []
+        self._course_times = []
+        self._stage_totals = {}
+        self._vertices = [0, 0]
+        # 多进程时各工作进程分别统计，取最大值
+        self._peak_rss_mb = process_peak_rss_mb()
+        self.holes = 0
+        self.courses = 0
+        self.failed = 0
+
+    def _write(self, event):
+        line = json.dumps(event, ensure_ascii=False)
+        logger.info(line)
+        if self._file:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def record(self, event):
+        if event is None:
+            return
+        if event["event"] == "course":
+            self.courses += 1
+            self._course_times.append((event["wall_time"], event["course"]))
+        else:
+            self.holes += 1
+            if event.get("error"):
+                self.failed += 1
+            self._wall_times.append((event["wall_time"], event["hole"]))
+        if event.get("process_peak_rss_mb") is not None:
+            self._peak_rss_mb = max(self._peak_rss_mb or 0, event["process_peak_rss_mb"])
+        for name, elapsed in event["stages"].items():
+            self._stage_totals[name] = self._stage_totals.get(name, 0.0) + elapsed
+        if "vertices" in event:
+            self._vertices[0] += event["vertices"]
+            self._vertices[1] += event["simplified_vertices"]
+        self._write(event)
+
+    def summary(self):
+        return {
+            "event": "summary",
+            "holes": self.holes,
+            "courses": self.courses,
+            "failed": self.failed,
+            "elapsed": round(time.perf_counter() - self._start_time, 3),
+            "stage_totals": {name: round(total, 3) for name, total in self._stage_totals.items()},
+            "vertices": self._vertices[0],
+            "simplified_vertices": self._vertices[1],
+            "process_peak_rss_mb": self._peak_rss_mb,
+            "slowest": [
+                {"hole": hole_key, "wall_time": wall_time}
+                for wall_time, hole_key in heapq.nlargest(slowest_count, self._wall_times)
+            ],
+            "slowest_courses": [
+                {"course": course_key, "wall_time": wall_time}
+                for wall_time, course_key in heapq.nlargest(slowest_count, self._course_times)
+            ],
+        }
+
+    def close(self):
+        if self.holes:
+            self._write(self.summary())
+        if self._file:
+            self._file.close()
+            self._file = None
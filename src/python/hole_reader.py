@@ -0,0 +1,213 @@
+import json
+import re
+
+import numpy as np
+
+from utils import logger
+
+# 默认优先渲染的五个洞，依次放到最前面。
+# 75ae94b0-86ac-11e4-8c28-020000005b00_248966d0-86b3-11e4-8f92-020000005b00_9.png 特小球场，有水域，横向, 257 × 139
+# 76afd810-86ac-11e4-8c28-020000005b00_062b3e10-86b4-11e4-8f92-020000005b00_7.png 小球场，有水域，横向, 505 × 134
+# 77d87990-86ac-11e4-8c28-020000005b00_3533d770-86b5-11e4-8f92-020000005b00_3.png 小球场，有水线，横向, 558 × 225
+# b1c08a80-86ac-11e4-8c28-020000005b00_7e81e060-86de-11e4-8f92-020000005b00_14.png 大球场，有球车线，横向, 1677 × 969
+# 77d87990-86ac-11e4-8c28-020000005b00_3533d770-86b5-11e4-8f92-020000005b00_9.png 大球场，有水线水域，竖向, 439 × 727
+default_priority_holes = [
+    ("75ae94b0-86ac-11e4-8c28-020000005b00", "248966d0-86b3-11e4-8f92-020000005b00", 9),
+    ("76afd810-86ac-11e4-8c28-020000005b00", "062b3e10-86b4-11e4-8f92-020000005b00", 7),
+    ("77d87990-86ac-11e4-8c28-020000005b00", "3533d770-86b5-11e4-8f92-020000005b00", 3),
+    ("b1c08a80-86ac-11e4-8c28-020000005b00", "7e81e060-86de-11e4-8f92-020000005b00", 14),
+    ("77d87990-86ac-11e4-8c28-020000005b00", "3533d770-86b5-11e4-8f92-020000005b00", 9),
+]
+
+
+def format_hole_key(club_id, course_id, hole_number):
+    return f"{club_id}_{course_id}_{hole_number}"
+
+
+def parse_hole_key(text):
+    # 支持 clubId_courseId_holeNumber(.png) 或 clubId,courseId,holeNumber
+    text = text.strip()
+    if text.endswith(".png"):
+        text = text[:-len(".png")]
+    parts = text.split(",") if "," in text else text.rsplit("_", 2)
+    if len(parts) != 3:
+        raise ValueError(f"Invalid hole key: {text}")
+    club_id, course_id, hole_number = (part.strip() for part in parts)
+    return club_id, course_id, int(hole_number)
+
+
+def load_priority_holes(priority_file=None, priority_keys=None):
+    keys = []
+    if priority_file:
+        with open(priority_file, "r", encoding="utf-8") as file:
+            for line in file:
+                line = line.split("#", 1)[0].strip()
+                if line:
+                    keys.append(parse_hole_key(line))
+    for text in priority_keys or []:
+        keys.append(parse_hole_key(text))
+    # 去重但保持顺序
+    return list(dict.fromkeys(keys))
+
+
+# gpsItem 的 shape：JSONL 中为 [{"longitude", "latitude"}]，hole_store 中为 N x 2 的 float64 数组
+def shape_array(shape):
+    if isinstance(shape, np.ndarray):
+        return shape
+    return np.array([(point["longitude"], point["latitude"]) for point in shape], dtype=np.float64).reshape(-1, 2)
+
+
+def shape_coords(shape):
+    if isinstance(shape, np.ndarray):
+        return list(map(tuple, shape.tolist()))
+    return [(point["longitude"], point["latitude"]) for point in shape]
+
+
+# with_course 为 True 时每个洞额外带上所在球场的整条记录，供按球场批量处理
+def iter_course_holes(data, with_course=False):
+    club_id = data["clubId"]
+    course_id = data["courseId"]
+    for hole_number, hole in enumerate(data["holes"], start=1):
+        if with_course:
+            yield club_id, course_id, hole_number, hole, data
+        else:
+            yield club_id, course_id, hole_number, hole
+
+
+def iter_courses(input_jsonl_file_path):
+    with open(input_jsonl_file_path, "r", newline="", encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            yield json.loads(line)
+
+
+def iter_holes(input_jsonl_file_path, with_course=False):
+    for data in iter_courses(input_jsonl_file_path):
+        yield from iter_course_holes(data, with_course)
+
+
+def find_course(input_jsonl_file_path, club_id, course_id):
+    # 先按原始字节过滤，只解析包含该 courseId 的行
+    needle = course_id.encode("utf-8")
+    with open(input_jsonl_file_path, "rb") as file:
+        for line in file:
+            if needle not in line:
+                continue
+            data = json.loads(line)
+            if data["clubId"] == club_id and data["courseId"] == course_id:
+                return data
+    return None
+
+
+def _read_course_at(file, offset):
+    file.seek(offset)
+    return json.loads(file.readline())
+
+
+_club_id_pattern = re.compile(rb'"clubId"\s*:\s*"([^"\\]*)"')
+_course_id_pattern = re.compile(rb'"courseId"\s*:\s*"([^"\\]*)"')
+_gps_items_key = b'"gpsItems"'
+
+
+# 不解析整行：按原始字节找出 clubId、courseId，每个洞恰好有一个 gpsItems 键，数它就是洞数。
+# 找不到时（如 id 中有转义字符）才解析这一行。洞缺少 gpsItems 或字符串里出现这个字面量时数出的洞数不对，
+# CourseIndex.course 真正解析时会校正
+def _scan_course_line(line):
+    club_id = _club_id_pattern.search(line)
+    course_id = _course_id_pattern.search(line)
+    if club_id is None or course_id is None:
+        data = json.loads(line)
+        return data["clubId"], data["courseId"], len(data["holes"])
+    return club_id.group(1).decode("utf-8"), course_id.group(1).decode("utf-8"), line.count(_gps_items_key)
+
+
+# 各球场所在行的偏移，按下标随机读取单个球场；接口与 hole_store.HoleStore 的 courses、hole_counts、course 相同
+class CourseIndex:
+    def __init__(self, input_jsonl_file_path):
+        self.input_jsonl_file_path = input_jsonl_file_path
+        self.courses = []
+        self._hole_counts = []
+        self._offsets = []
+        with open(input_jsonl_file_path, "rb") as file:
+            offset = 0
+            for line in file:
+                if line.strip():
+                    club_id, course_id, hole_count = _scan_course_line(line)
+                    self.courses.append((club_id, course_id))
+                    self._hole_counts.append(hole_count)
+                    self._offsets.append(offset)
+                offset += len(line)
+
+    def __len__(self):
+        return len(self.courses)
+
+    def hole_counts(self):
+        return list(self._hole_counts)
+
+    # 解析出的洞数与扫描得到的不同时记录警告并以解析结果为准，调用方随后可从 hole_counts 取到校正后的值
+    def course(self, course_index):
+        with open(self.input_jsonl_file_path, "rb") as file:
+            data = _read_course_at(file, self._offsets[course_index])
+        hole_count = len(data["holes"])
+        if hole_count != self._hole_counts[course_index]:
+            logger.warning(f"Course {data['clubId']}_{data['courseId']} has {hole_count} holes, the index scan "
+                           f"counted {self._hole_counts[course_index]}")
+            self._hole_counts[course_index] = hole_count
+        return data
+
+
+def _iter_priority_holes(input_jsonl_file_path, priority_holes):
+    # 第一遍只扫描原始字节，记录包含优先球场的行偏移；按优先顺序尽早输出已定位的洞
+    course_ids = {course_id.encode("utf-8") for _, course_id, _ in priority_holes}
+    offsets = {}
+    next_index = 0
+    with open(input_jsonl_file_path, "rb") as file, open(input_jsonl_file_path, "rb") as reader:
+        offset = 0
+        for line in file:
+            if any(course_id in line for course_id in course_ids):
+                data = json.loads(line)
+                current_key = (data["clubId"], data["courseId"])
+                offsets.setdefault(current_key, offset)
+                while next_index < len(priority_holes):
+                    club_id, course_id, hole_number = priority_holes[next_index]
+                    if (club_id, course_id) not in offsets:
+                        break
+                    if (club_id, course_id) != current_key:
+                        data = _read_course_at(reader, offsets[(club_id, course_id)])
+                    hole = _find_hole(data, hole_number)
+                    if hole is not None:
+                        yield club_id, course_id, hole_number, hole, data
+                    next_index += 1
+            offset += len(line)
+        for club_id, course_id, hole_number in priority_holes[next_index:]:
+            if (club_id, course_id) not in offsets:
+                logger.warning(f"Priority hole not found: clubId: {club_id}, courseId: {course_id}, "
+                               f"holeNumber: {hole_number}")
+                continue
+            data = _read_course_at(reader, offsets[(club_id, course_id)])
+            hole = _find_hole(data, hole_number)
+            if hole is not None:
+                yield club_id, course_id, hole_number, hole, data
+
+
+def _find_hole(data, hole_number):
+    holes = data["holes"]
+    if not 1 <= hole_number <= len(holes):
+        logger.warning(f"Priority hole not found: clubId: {data['clubId']}, courseId: {data['courseId']}, "
+                       f"holeNumber: {hole_number}")
+        return None
+    return holes[hole_number - 1]
+
+
+def iter_holes_with_priority(input_jsonl_file_path, priority_holes=None, with_course=False):
+    if not priority_holes:
+        yield from iter_holes(input_jsonl_file_path, with_course)
+        return
+    emitted = set()
+    for club_id, course_id, hole_number, hole, data in _iter_priority_holes(input_jsonl_file_path, priority_holes):
+        emitted.add((club_id, course_id, hole_number))
+        yield (club_id, course_id, hole_number, hole, data) if with_course else (club_id, course_id, hole_number, hole)
+    for entry in iter_holes(input_jsonl_file_path, with_course):
+        if entry[:3] not in emitted:
+            yield entry
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+import hole_reader
+from utils import logger
+
+# 输入 JSONL 的二进制列存：所有坐标在一个 N x 2 的 float64 数组里，要素、洞、球场各有一个偏移数组，全部可以直接 mmap。
+# 重复运行时跳过 JSON 解析；按 (clubId, courseId) 随机读取，只加载需要的球场。只保存 clubId、courseId 和各洞的
+# gpsItems（itemType、shape），读出的 shape 为坐标数组的视图
+store_dir_name = ".hole_store"
+index_file_name = "index.json"
+# 存储格式有变化时递增，旧的存储会被重建
+store_version = 1
+array_names = ["coords", "item_offsets", "item_types", "hole_offsets", "course_offsets"]
+
+
+def source_stamp(input_jsonl_file_path):
+    stat = os.stat(input_jsonl_file_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def source_digest(input_jsonl_file_path):
+    digest = hashlib.sha256()
+    with open(input_jsonl_file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_store(input_jsonl_file_path, store_dir):
+    stamp = source_stamp(input_jsonl_file_path)
+    digest = hashlib.sha256()
+    coords = []
+    item_offsets, item_types, hole_offsets, course_offsets = [0], [], [0], [0]
+    type_codes = {}
+    courses = []
+    point_count = 0
+    # 与 hole_reader.iter_courses 相同的逐行解析，同时计算源文件的哈希
+    with open(input_jsonl_file_path, "rb") as file:
+        for line in file:
+            digest.update(line)
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            courses.append([data["clubId"], data["courseId"]])
+            for hole in data["holes"]:
+                for gpsItem in hole["gpsItems"]:
+                    shape = hole_reader.shape_array(gpsItem["shape"])
+                    coords.append(shape)
+                    point_count += len(shape)
+                    item_offsets.append(point_count)
+                    item_types.append(type_codes.setdefault(gpsItem["itemType"], len(type_codes)))
+                hole_offsets.append(len(item_types))
+            course_offsets.append(len(hole_offsets) - 1)
+    arrays = {
+        "coords": np.concatenate(coords) if coords else np.empty((0, 2), dtype=np.float64),
+        "item_offsets": np.array(item_offsets, dtype=np.int64),
+        "item_types": np.array(item_types, dtype=np.int32),
+        "hole_offsets": np.array(hole_offsets, dtype=np.int64),
+        "course_offsets": np.array(course_offsets, dtype=np.int64),
+    }
+    index = {
+        "version": store_version,
+        "source": dict(stamp, sha256=digest.hexdigest()),
+        "item_types": list(type_codes),
+        "courses": courses,
+    }
+    # 先写到临时目录再换上去，中途被杀掉不会留下不完整的存储
+    tmp_dir = f"{store_dir}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), array)
+    _write_index(tmp_dir, index)
+    shutil.rmtree(store_dir, ignore_errors=True)
+    os.replace(tmp_dir, store_dir)
+    logger.info(f"Built hole store {store_dir}: {len(courses)} courses, {len(hole_offsets) - 1} holes, "
+                f"{point_count} points")
+
+
+def _read_index(store_dir):
+    index_path = os.path.join(store_dir, index_file_name)
+    if not os.path.exists(index_path):
+        return None
+    try:
+        with open(index_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable hole store index {index_path}: {e}")
+        return None
+
+
+def _write_index(store_dir, index):
+    index_path = os.path.join(store_dir, index_file_name)
+    tmp_path = f"{index_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(index, file)
+    os.replace(tmp_path, index_path)
+
+
+def _is_current(index, input_jsonl_file_path, store_dir):
+    if index is None or index.get("version") != store_version:
+        return False
+    stamp = source_stamp(input_jsonl_file_path)
+    source = index["source"]
+    if stamp["size"] == source["size"] and stamp["mtime_ns"] == source["mtime_ns"]:
+        return True
+    if stamp["size"] != source["size"] or source_digest(input_jsonl_file_path) != source["sha256"]:
+        return False
+    # 只是修改时间变了、内容没变（例如重新拷贝），记下新的修改时间，不重建
+    index["source"].update(stamp)
+    _write_index(store_dir, index)
+    return True
+
+
+# 打开输入文件对应的存储，不存在、格式过期或源文件内容变了时先重建
+def open_store(input_jsonl_file_path, store_dir):
+    index = _read_index(store_dir)
+    if _is_current(index, input_jsonl_file_path, store_dir):
+        try:
+            return HoleStore(store_dir, index)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Rebuilding unreadable hole store {store_dir}: {e}")
+    build_store(input_jsonl_file_path, store_dir)
+    return HoleStore(store_dir)
+
+
+class HoleStore:
+    def __init__(self, store_dir, index=None):
+        self.store_dir = store_dir
+        self.index = index if index is not None else _read_index(store_dir)
+        if self.index is None:
+            raise ValueError(f"Missing hole store index in {store_dir}")
+        self.item_types = self.index["item_types"]
+        self.courses = [tuple(course) for course in self.index["courses"]]
+        self._course_indices = {}
+        for course_index, key in enumerate(self.courses):
+            self._course_indices.setdefault(key, course_index)
+        # np.asarray 去掉 memmap 子类，切片作为普通数组传给工作进程
+        self._arrays = {name: np.asarray(np.load(os.path.join(store_dir, f"{name}.npy"), mmap_mode="r"))
+                        for name in array_names}
+        if len(self._arrays["course_offsets"]) != len(self.courses) + 1:
+            raise ValueError(f"Hole store {store_dir} does not match its index")
+
+    def __len__(self):
+        return len(self.courses)
+
+    def hole_counts(self):
+        return np.diff(self._arrays["course_offsets"]).tolist()
+
+    # 与 JSONL 中一行相同结构的球场记录
+    def course(self, course_index):
+        coords = self._arrays["coords"]
+        first_hole, last_hole = self._arrays["course_offsets"][course_index:course_index + 2].tolist()
+        hole_offsets = self._arrays["hole_offsets"][first_hole:last_hole + 1].tolist()
+        first_item, last_item = hole_offsets[0], hole_offsets[-1]
+        item_offsets = self._arrays["item_offsets"][first_item:last_item + 1].tolist()
+        item_types = self._arrays["item_types"][first_item:last_item].tolist()
+        holes = []
+        for start, end in zip(hole_offsets[:-1], hole_offsets[1:]):
+            holes.append({"gpsItems": [
+                {"itemType": self.item_types[item_types[index - first_item]],
+                 "shape": coords[item_offsets[index - first_item]:item_offsets[index - first_item + 1]]}
+                for index in range(start, end)
+            ]})
+        club_id, course_id = self.courses[course_index]
+        return {"clubId": club_id, "courseId": course_id, "holes": holes}
+
+    def find_course(self, club_id, course_id):
+        course_index = self._course_indices.get((club_id, course_id))
+        return self.course(course_index) if course_index is not None else None
+
+    def iter_courses(self):
+        for course_index in range(len(self.courses)):
+            yield self.course(course_index)
+
+    # 与 hole_reader.iter_holes_with_priority 相同的顺序，优先的洞直接按索引读取
+    def iter_holes_with_priority(self, priority_holes=None, with_course=False):
+        emitted = set()
+        for club_id, course_id, hole_number in priority_holes or []:
+            data = self.find_course(club_id, course_id)
+            if data is None or not 1 <= hole_number <= len(data["holes"]):
+                logger.warning(f"Priority hole not found: clubId: {club_id}, courseId: {course_id}, "
+                               f"holeNumber: {hole_number}")
+                continue
+            emitted.add((club_id, course_id, hole_number))
+            hole = data["holes"][hole_number - 1]
+            if with_course:
+                yield club_id, course_id, hole_number, hole, data
+            else:
+                yield club_id, course_id, hole_number, hole
+        for data in self.iter_courses():
+            for entry in hole_reader.iter_course_holes(data, with_course):
+                if entry[:3] not in emitted:
+                    yield entry
@@ -0,0 +1,73 @@
+import os
+import re
+
+import hole_reader
+
+# 一次渲染输出多个尺寸：NAME=2x 为标准分辨率（utils.meters_per_pixel）的倍数，NAME=256px 为最长边的像素数
+variant_pattern = re.compile(r"^([A-Za-z0-9_.@-]+)=(\d+(?:\.\d*)?)(x|px)$")
+# 相对输出目录的路径模板，可用字段：name、hole_key、club_id、course_id、hole_number
+default_path_template = "{name}/{hole_key}.png"
+
+
+class OutputVariant:
+    def __init__(self, name, scale=None, max_pixels=None):
+        self.name = name
+        self.scale = scale
+        self.max_pixels = max_pixels
+
+    def spec(self):
+        return f"{self.name}={self.scale}x" if self.scale is not None else f"{self.name}={self.max_pixels}px"
+
+    # 相对于标准分辨率的倍数，width/height 为标准分辨率下的输出尺寸（raster_renderer.canvas_size）
+    def scale_for(self, width, height):
+        if self.scale is not None:
+            return self.scale
+        return self.max_pixels / max(width, height, 1)
+
+
+def parse_variant(spec):
+    match = variant_pattern.match(spec)
+    if not match or float(match.group(2)) <= 0:
+        raise ValueError(f"Invalid output variant: {spec}, expected NAME=SCALEx or NAME=PIXELSpx")
+    name, value, unit = match.groups()
+    if unit == "x":
+        return OutputVariant(name, scale=float(value))
+    return OutputVariant(name, max_pixels=int(float(value)))
+
+
+class OutputVariants:
+    # 第一个尺寸是主输出：通过 "Generated image:" 通知前端，也用于增量渲染的记录
+    def __init__(self, specs, path_template=default_path_template):
+        self.variants = [parse_variant(spec) for spec in specs]
+        if not self.variants:
+            raise ValueError("At least one output variant is required")
+        names = [variant.name for variant in self.variants]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate output variant names: {names}")
+        self.path_template = path_template
+        try:
+            paths = {self._relative_path(variant, "club", "course", 1) for variant in self.variants}
+        except (KeyError, IndexError) as e:
+            raise ValueError(f"Unknown field {e} in output path template: {path_template}")
+        if len(paths) != len(self.variants):
+            raise ValueError(f"Output path template must include {{name}} to tell variants apart: {path_template}")
+
+    def __iter__(self):
+        return iter(self.variants)
+
+    def _relative_path(self, variant, club_id, course_id, hole_number):
+        return self.path_template.format(name=variant.name, club_id=club_id, course_id=course_id,
+                                         hole_number=hole_number,
+                                         hole_key=hole_reader.format_hole_key(club_id, course_id, hole_number))
+
+    def paths(self, output_folder_path, club_id, course_id, hole_number):
+        return [os.path.join(output_folder_path, self._relative_path(variant, club_id, course_id, hole_number))
+                for variant in self.variants]
+
+    # 几何简化按最精细的固定倍数计算容差；按像素数给出的尺寸一般是缩略图，按标准分辨率计算
+    def detail_scale(self):
+        return max(variant.scale if variant.scale is not None else 1.0 for variant in self.variants)
+
+    # 参与增量渲染的哈希
+    def settings(self):
+        return {"variants": [variant.spec() for variant in self.variants], "path_template": self.path_template}
@@ -0,0 +1,161 @@
+import io
+import os
+import queue
+import struct
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+import raster_renderer
+
+# png: 无损；png8: 量化到 256 色调色板（保留透明度），体积约为 png 的三分之一；webp: quality 为 100 时无损；
+# svg: 矢量输出，由 svg_renderer 生成，不经过 RGBA
+output_formats = ["png", "png8", "webp", "svg"]
+extensions = {"webp": ".webp", "svg": ".svg"}
+default_compress_level = 6
+default_quality = 90
+default_writer_threads = 2
+
+
+class OutputFormat:
+    def __init__(self, format="png", compress_level=default_compress_level, quality=default_quality):
+        if format not in output_formats:
+            raise ValueError(f"Unknown output format: {format}")
+        if not 0 <= compress_level <= 9:
+            raise ValueError(f"PNG compress level must be between 0 and 9: {compress_level}")
+        if not 1 <= quality <= 100:
+            raise ValueError(f"WebP quality must be between 1 and 100: {quality}")
+        self.format = format
+        self.compress_level = compress_level
+        self.quality = quality
+        self.extension = extensions.get(format, ".png")
+
+    def path(self, output_file_path):
+        return os.path.splitext(output_file_path)[0] + self.extension
+
+    # 参与增量渲染的哈希
+    def settings(self):
+        return {"format": self.format, "compress_level": self.compress_level, "quality": self.quality}
+
+    # rgba 为 uint8 的非预乘 RGBA，或 raster_renderer 画布的预乘 float32 RGBA
+    def encode(self, rgba):
+        if self.format == "svg":
+            raise ValueError("SVG output is written by svg_renderer, not encoded from RGBA")
+        if rgba.dtype != np.uint8:
+            rgba = raster_renderer.to_uint8(rgba)
+        image = Image.fromarray(np.ascontiguousarray(rgba), "RGBA")
+        buffer = io.BytesIO()
+        if self.format == "webp":
+            image.save(buffer, format="WEBP", quality=self.quality, lossless=self.quality == 100, method=4)
+        elif self.format == "png8":
+            image.quantize(256, method=Image.Quantize.FASTOCTREE).save(
+                buffer, format="PNG", compress_level=self.compress_level)
+        else:
+            image.save(buffer, format="PNG", compress_level=self.compress_level)
+        return buffer.getvalue()
+
+
+class PngStream:
+    # 逐条写出 RGBA PNG：每条的行用 Sub 过滤后送进同一个 zlib 流，内存中只有当前这一条
+    def __init__(self, file, width, height, compress_level=default_compress_level):
+        self.file = file
+        self.width = width
+        self.rows_left = height
+        self._compressor = zlib.compressobj(compress_level)
+        file.write(b"\x89PNG\r\n\x1a\n")
+        # 8 位 RGBA，不隔行
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+
+    def _chunk(self, chunk_type, data):
+        self.file.write(struct.pack(">I", len(data)))
+        self.file.write(chunk_type)
+        self.file.write(data)
+        self.file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type))))
+
+    # rgba: uint8 的非预乘 RGBA，(行数, width, 4)
+    def write(self, rgba):
+        rows = rgba.shape[0]
+        if rgba.shape[1:] != (self.width, 4) or rows > self.rows_left:
+            raise ValueError(f"Band of shape {rgba.shape} does not fit a {self.width} pixel wide PNG "
+                             f"with {self.rows_left} rows left")
+        filtered = np.empty((rows, self.width * 4 + 1), dtype=np.uint8)
+        # 过滤类型 1 (Sub)：每个字节减去左边像素的同一通道，uint8 按 256 取模
+        filtered[:, 0] = 1
+        pixels = filtered[:, 1:].reshape(rows, self.width, 4)
+        pixels[:, 0] = rgba[:, 0]
+        np.subtract(rgba[:, 1:], rgba[:, :-1], out=pixels[:, 1:])
+        data = self._compressor.compress(filtered.tobytes())
+        if data:
+            self._chunk(b"IDAT", data)
+        self.rows_left -= rows
+
+    def close(self):
+        if self.rows_left:
+            raise ValueError(f"PNG stream closed with {self.rows_left} rows missing")
+        self._chunk(b"IDAT", self._compressor.flush())
+        self._chunk(b"IEND", b"")
+
+
+# images: [(输出路径, RGBA)]，第一个是主输出；RGBA 也可以是 band_renderer.BandedImage（写出时才逐条渲染）
+# 或 svg_renderer.SvgImage。
+# 返回主输出的路径
+def write_images(images, output_format, metrics, artists):
+    bytes_written = 0
+    for output_file_path, rgba in images:
+        if not isinstance(rgba, np.ndarray):
+            bytes_written += rgba.write(output_file_path, output_format, metrics)
+            continue
+        with metrics.stage("encode"):
+            data = output_format.encode(rgba)
+        with metrics.stage("write"):
+            os.makedirs(os.path.dirname(output_file_path) or ".", exist_ok=True)
+            with open(output_file_path, "wb") as file:
+                file.write(data)
+        bytes_written += len(data)
+    height, width = images[0][1].shape[:2]
+    metrics.record_output(width, height, bytes_written, artists)
+    return images[0][0]
+
+
+class OutputWriter:
+    # 后台线程编码并写出，渲染线程继续画下一个洞。排队的洞数有上限，满了之后 submit 会阻塞，内存不随洞数增长。
+    # 完成回调不在写线程里执行，而是由渲染线程调用 drain 时依次执行
+    def __init__(self, output_format, threads=default_writer_threads):
+        self.output_format = output_format
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="output_writer")
+        self._slots = threading.BoundedSemaphore(threads * 2)
+        self._finished = queue.SimpleQueue()
+        self._pending = 0
+
+    def submit(self, images, metrics, artists, on_written):
+        self._slots.acquire()
+        self._pending += 1
+        future = self._executor.submit(write_images, images, self.output_format, metrics, artists)
+        future.add_done_callback(lambda done: self._done(done, on_written))
+
+    def _done(self, future, on_written):
+        self._slots.release()
+        self._finished.put((future, on_written))
+
+    # 执行已完成的回调；wait 为 True 时等待所有排队的洞写完
+    def drain(self, wait=False):
+        while self._pending:
+            try:
+                future, on_written = self._finished.get(block=wait)
+            except queue.Empty:
+                return
+            self._pending -= 1
+            error = future.exception()
+            if error is None:
+                on_written(future.result(), None)
+            else:
+                on_written(None, f"{type(error).__name__}: {error}")
+
+    def close(self):
+        try:
+            self.drain(wait=True)
+        finally:
+            self._executor.shutdown(wait=True)
@@ -1,13 +1,13 @@
 import argparse
+import functools
+import logging
+import math
 import os
-import json
-import geopandas as gpd
-import matplotlib.pyplot as plt
-from matplotlib.patches import PathPatch
-from matplotlib.path import Path
-from matplotlib.offsetbox import OffsetImage, AnnotationBbox
-from shapely.geometry import Point, LineString, Polygon as ShapelyPolygon
+import multiprocessing
+from collections import OrderedDict
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from shapely.geometry import LineString, Polygon as ShapelyPolygon
 import sys
 
 # 添加当前目录到 Python 路径
@@ -24,6 +24,31 @@ sys.path.append(module_dir)
 from hole_item import Item, ItemType, Polygon, Line, Marker
 from utils import logger
 import utils
+import raster_renderer
+import hole_reader
+import render_cache
+import render_server
+import hole_metrics
+import tile_renderer
+import tile_cache
+import texture_cache
+import output_variants
+import output_writer
+import course_geometry
+import hole_store
+import band_renderer
+import render_scheduler
+import render_supervisor
+import svg_renderer
+from feature_store import FeatureStore
+
+# pyplot、scipy 等较重的模块只在真正用到时才导入，缩短 Electron 启动后出第一张图的时间
+
+renderers = ["matplotlib", "matplotlib-batched", "numpy"]
+# 预览：标准分辨率的 1/4，numpy 渲染器，低压缩级别的 png，放在输出目录的 previews 下
+preview_variant = "preview=0.25x"
+preview_path_template = "previews/{hole_key}.png"
+preview_compress_level = 1
 
 
 class Resources:
@@ -93,16 +118,91 @@ class Resources:
             'pineTree': self.pineTree
         }
 
+    def preload_images(self):
+        for item in vars(self).values():
+            image_path = getattr(item, "texture", None) or getattr(item, "img_icon", None)
+            if image_path is None:
+                continue
+            try:
+                self.get_image(image_path)
+            except Exception as e:
+                logger.warning(f"Error preloading image: {e}, item.type: {item.type}")
+
     @classmethod
     def get_image(cls, image_path):
         if image_path not in cls._image_cache:
-            cls._image_cache[image_path] = plt.imread(image_path)
+            from matplotlib.image import imread
+            cls._image_cache[image_path] = imread(image_path)
         return cls._image_cache[image_path]
 
 
 def create_parser():
     parser = argparse.ArgumentParser(description="Hole skin changer")
     parser.add_argument("--root-data-dir", help="Root data directory")
+    parser.add_argument("--renderer", choices=renderers, default="matplotlib",
+                        help="Rendering engine: matplotlib artists, matplotlib with artists batched per feature type, "
+                             "or the NumPy raster compositor")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes used to render holes in parallel")
+    parser.add_argument("--priority-file", help="File listing holes to render first, one clubId_courseId_holeNumber per line")
+    parser.add_argument("--priority-holes", nargs="*", metavar="HOLE_KEY",
+                        help="Holes to render first, as clubId_courseId_holeNumber")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Skip holes whose input, resources and settings are unchanged since the last run")
+    parser.add_argument("--preview", action="store_true",
+                        help="Write a quick low-resolution preview of every hole under output_data/previews "
+                             "before the full-resolution images")
+    parser.add_argument("--server", action="store_true",
+                        help="Keep running and accept JSON-RPC render requests on stdin, one per line")
+    parser.add_argument("--metrics-file", help="Append one JSON timing event per hole and a run summary to this file")
+    parser.add_argument("--profile-threshold", type=float, metavar="SECONDS",
+                        help="Profile every hole and keep a cProfile dump for holes slower than this")
+    parser.add_argument("--tiles", action="store_true",
+                        help="Render each course as Web Mercator z/x/y tiles under output_data/tiles instead of one PNG per hole")
+    parser.add_argument("--min-zoom", type=int, help="Lowest tile zoom level, defaults to 3 levels below --max-zoom")
+    parser.add_argument("--max-zoom", type=int,
+                        help="Highest tile zoom level, defaults to the level matching the per-hole PNG resolution")
+    parser.add_argument("--tile-cache-mb", type=int, default=tile_cache.default_max_bytes // (1024 * 1024),
+                        help="Evict least recently used tiles when the tile cache grows beyond this size")
+    parser.add_argument("--variants", nargs="+", metavar="NAME=SIZE",
+                        help="Render each hole once and write several sizes, e.g. full=1x retina=2x thumb=256px")
+    parser.add_argument("--variant-path", default=output_variants.default_path_template,
+                        help="Output path of each size relative to output_data, with {name}, {hole_key}, {club_id}, "
+                             "{course_id} and {hole_number} fields")
+    parser.add_argument("--output-format", choices=output_writer.output_formats, default="png",
+                        help="png, palette-quantized png8, webp, or svg (vector output, independent of --renderer)")
+    parser.add_argument("--compress-level", type=int, default=output_writer.default_compress_level,
+                        help="PNG zlib compression level, 0 (fastest) to 9 (smallest)")
+    parser.add_argument("--quality", type=int, default=output_writer.default_quality,
+                        help="WebP quality, 100 for lossless")
+    parser.add_argument("--writer-threads", type=int, default=output_writer.default_writer_threads,
+                        help="Background threads that encode and write images while the next hole renders")
+    parser.add_argument("--texture-cache-mb", type=int, default=texture_cache.default_max_bytes // (1024 * 1024),
+                        help="Memory budget for textures resampled to canvas scale, least recently used evicted first")
+    parser.add_argument("--texture-disk-cache", action="store_true",
+                        help="Also keep resampled textures as .npy files under resources/.texture_cache, "
+                             "bounded by --texture-cache-mb with the oldest files removed first")
+    parser.add_argument("--max-megapixels", type=float, default=band_renderer.default_max_megapixels,
+                        help="Pixel budget per output image; larger holes follow --oversize-policy")
+    parser.add_argument("--oversize-policy", choices=band_renderer.oversize_policies, default="off",
+                        help="off: no pixel budget; bands: render in horizontal bands streamed into the PNG encoder "
+                             "(requires --renderer numpy); cap: lower the resolution to fit the budget")
+    parser.add_argument("--input-store", action="store_true",
+                        help="Read the input from a binary columnar copy under output_data/.hole_store, "
+                             "rebuilt when the JSONL file changes")
+    parser.add_argument("--supervised", action="store_true",
+                        help="Render each hole in a worker process that is killed and restarted when the hole runs "
+                             "over --hole-timeout or --max-rss-mb; holes that keep failing are quarantined")
+    parser.add_argument("--hole-timeout", type=float, default=render_supervisor.default_hole_timeout,
+                        metavar="SECONDS", help="Wall-clock budget per hole in supervised mode")
+    parser.add_argument("--max-rss-mb", type=float, default=render_supervisor.default_max_rss_mb,
+                        help="Resident memory budget per worker process in supervised mode")
+    parser.add_argument("--retries", type=int, default=render_supervisor.default_retries,
+                        help="Times a hole that broke a budget is retried at the end of the run before it is "
+                             "quarantined")
+    parser.add_argument("--retry-quarantined", action="store_true",
+                        help="Render holes listed in output_data/.render_quarantine.json again instead of skipping them")
+    parser.add_argument("--verbose", action="store_true", help="Log per-hole details such as render time")
     return parser
 
 
@@ -140,226 +240,983 @@ def get_item_by_type(item_type: ItemType, resources: Resources):
         return None
 
 
-def plot_marker(ax, marker: Marker, marker_pixels, coords, boundary):
-    if coords is None or len(coords) == 0:
-        return
-    logger.info(f"Plotting marker: {marker.type} with style: {marker.style}, marker_pixels: {marker_pixels}")
-    x, y = [], []
-    for coord in coords:
-        coord_obj = Point(coord)
-        if boundary.contains(coord_obj):
-            x.append(coord[0])
-            y.append(coord[1])
-    try:
-        icon = Resources.get_image(marker.img_icon)
-        for i in range(len(x)):
-            zoom = marker_pixels / utils.marker_icon_pixels
-            imagebox = OffsetImage(icon, zoom=zoom)
-            ab = AnnotationBbox(
-                imagebox,
-                (x[i], y[i]),
-                frameon=False,
-                pad=0,
-                box_alignment=(0.5, 0.5),
-                bboxprops=dict(alpha=1)
-            )
-            ax.add_artist(ab)
-            ab.zorder = marker.zorder
-    except Exception as e:
-        logger.warning(f"Error plotting image: {e}, marker.type: {marker.type}")
+def plot_markers(ax, markers, marker_pixels, grid, dpi):
+    # 同一 zorder 的所有标记盖到一个图层上，只添加一个图像 artist
+    stamps_by_zorder = {}
+    for marker, coords in markers:
+        if coords is None or len(coords) == 0:
+            continue
+        logger.info(f"Plotting marker: {marker.type} with style: {marker.style}, marker_pixels: {marker_pixels}")
+        try:
+            sprite = raster_renderer.marker_sprite(Resources, marker, marker_pixels, dpi)
+            stamps_by_zorder.setdefault(marker.zorder, []).extend(raster_renderer.sprite_stamps(grid, sprite, coords))
+        except Exception as e:
+            logger.warning(f"Error plotting image: {e}, marker.type: {marker.type}")
+    for zorder, stamps in stamps_by_zorder.items():
+        layer, extent = raster_renderer.marker_layer(grid, stamps)
+        if layer is None:
+            continue
+        # imshow 会改变坐标轴的 aspect，画完后恢复
+        aspect = ax.get_aspect()
+        ax.imshow(layer, extent=extent, zorder=zorder, interpolation="antialiased")
+        ax.set_aspect(aspect)
+
+
+# Agg 的画布尺寸为 int(英寸 * dpi)，英寸数按浮点误差向上微调，保证正好得到 pixels 个像素
+def figure_inches(pixels, dpi):
+    inches = pixels / dpi
+    while int(inches * dpi) < pixels:
+        inches = np.nextafter(inches, np.inf)
+    return inches
 
 
-def plot_polygon(ax, geo_series: gpd.GeoSeries, item: Item, alpha=1.0):
-    texture_img = Resources.get_image(item.texture)
-    bounds = geo_series.total_bounds
+# grid: 坐标轴在输出图中的像素网格，纹理按它缩放到屏幕像素大小后平铺成一张图，只添加一个图像 artist
+def plot_polygon(ax, polygon: ShapelyPolygon, item: Item, grid, alpha=1.0):
+    from matplotlib.patches import PathPatch
+    from matplotlib.path import Path
+    bounds = polygon.bounds
     width = bounds[2] - bounds[0]
     height = bounds[3] - bounds[1]
     # 创建平铺纹理
-    # 设置纹理基础大小（在经纬度坐标系中）
-    base_size = min(width, height) * 0.1  # 纹理基础大小为区域最小边长的10%
+    # 设置纹理基础大小（在经纬度坐标系中）：区域最小边长的10%，与 raster_renderer.draw_polygon 一致
+    base_size, tile_height, tile_width = raster_renderer.texture_tile_size(polygon, grid)
     # 计算需要多少个纹理来覆盖整个区域
-    nx = int(np.ceil(width / base_size))
-    ny = int(np.ceil(height / base_size))
+    nx = math.ceil(width / base_size)
+    ny = math.ceil(height / base_size)
     # 创建裁剪路径
-    polygon = geo_series.iloc[0]
     coords = polygon.exterior.coords
     path = Path(coords)
     patch = PathPatch(path, facecolor='none', edgecolor='none')
     ax.add_patch(patch)
-    # 为每个网格创建纹理
-    for i in range(nx):
-        for j in range(ny):
-            x = bounds[0] + i * base_size
-            y = bounds[1] + j * base_size
-            ax.imshow(texture_img,
-                extent=[x, x + base_size, y, y + base_size],
-                alpha=0.7,
-                zorder=item.zorder,
-                aspect='auto',
-                interpolation='bilinear',
-                clip_path=patch)
-    # 绘制多边形边界
-    geo_series.plot(
-        ax=ax,
-        facecolor='none',
-        zorder=item.zorder,
-        linewidth=0,
-    )
-
-def plot_course(club_id, course_id, hole_number, hole, output_folder_path, resources):
-    debug_info = f"clubId: {club_id}, courseId: {course_id}, holeNumber: {hole_number}"
-    hole_boundary = None
-    geometries = []
-    attributes = []
-    markers = []
-    # record the hole boundary first
-    for gpsItem in hole["gpsItems"]:
-        item_type = gpsItem["itemType"]
-        item = get_item_by_type(item_type, resources)
-        if item == resources.holeBoundary:
-            coords = [
-                (point["longitude"], point["latitude"]) for point in gpsItem["shape"]
-            ]
-            hole_boundary = utils.get_smooth_polygon(coords)
-            if hole_boundary:
-                geometries.append(hole_boundary)
-                attributes.append(
-                    {"itemType": resources.holeBoundary.type}
-                )
-            break
-    # record the rest of the items, other than hole boundary
-    for gpsItem in hole["gpsItems"]:
-        item_type = gpsItem["itemType"]
-        item = get_item_by_type(item_type, resources)
-        if item == resources.holeBoundary:
-            continue
-        coords = [(point["longitude"], point["latitude"]) for point in gpsItem["shape"]]
-        if len(coords) == 0:
-            continue
-        if isinstance(item, Marker):
-            markers.append((item, coords))
-        elif isinstance(item, Line):
-            coords = [coord for coord in coords if utils.inside_polygon(coord, hole_boundary)]
-            if len(coords) > 1:
-                geometries.append(LineString(coords))
-                attributes.append(
-                    {
-                        "itemType": item.type,
-                        "color": item.color,
-                        "lineWidth": item.line_width,
-                    }
-                )
+    # 缓存里的纹理已是目标像素大小，平铺成 ny x nx 块；图像第一行在上方，和逐块 imshow 的排列相同
+    tiled = np.tile(texture_cache.get_tile(item.texture, tile_height, tile_width), (ny, nx, 1))
+    ax.imshow(tiled,
+              extent=[bounds[0], bounds[0] + nx * base_size, bounds[1], bounds[1] + ny * base_size],
+              alpha=0.7,
+              zorder=item.zorder,
+              aspect='auto',
+              interpolation='bilinear',
+              clip_path=patch)
+
+
+# 批量绘制时，像素窗口（各边外扩一个像素）相交的同类多边形分到不同图层，重叠处仍像逐个 imshow 一样按顺序叠加
+def polygon_layers(polygons, grid):
+    windows = []
+    for polygon in polygons:
+        window = grid.window(polygon.exterior.coords, pad=1)
+        if window is not None:
+            windows.append((polygon, window))
+    layers = []
+    for polygon, window in windows:
+        # 放在所有与它相交的、先画的多边形之上
+        depth = 0
+        for index, layer in enumerate(layers):
+            if any(window[0] < other[2] and other[0] < window[2] and window[1] < other[3] and other[1] < window[3]
+                   for _, other in layer):
+                depth = index + 1
+        if depth == len(layers):
+            layers.append([])
+        layers[depth].append((polygon, window))
+    return layers
+
+
+# 同一 item 的一批多边形：每个多边形按自己的平铺大小和起点铺纹理（与 plot_polygon 相同），
+# 写进同一张覆盖它们的图像，用所有外环组成的复合路径裁剪，每个图层只添加一个图像 artist
+def plot_polygons(ax, polygons, item: Item, grid):
+    from matplotlib.path import Path
+    for layer in polygon_layers(polygons, grid):
+        x0 = min(window[0] for _, window in layer)
+        y0 = min(window[1] for _, window in layer)
+        x1 = max(window[2] for _, window in layer)
+        y1 = max(window[3] for _, window in layer)
+        rgba = np.zeros((y1 - y0, x1 - x0, 4), dtype=np.float32)
+        for polygon, window in layer:
+            base_size, tile_height, tile_width = raster_renderer.texture_tile_size(polygon, grid)
+            tile = texture_cache.get_tile(item.texture, tile_height, tile_width)
+            origin_x, origin_y = grid.to_pixels([polygon.bounds[:2]])[0]
+            rgba[window[1] - y0:window[3] - y0, window[0] - x0:window[2] - x0] = raster_renderer.tiled_texture(
+                tile, window, origin_x, origin_y, base_size * grid.x_scale / tile_width,
+                base_size * grid.y_scale / tile_height)
+        west, north = grid.to_coords(x0, y0)
+        east, south = grid.to_coords(x1, y1)
+        aspect = ax.get_aspect()
+        image = ax.imshow(rgba, extent=[west, east, south, north], alpha=raster_renderer.texture_alpha,
+                          zorder=item.zorder, interpolation="nearest")
+        ax.set_aspect(aspect)
+        image.set_clip_path(Path.make_compound_path(*[Path(np.asarray(polygon.exterior.coords))
+                                                      for polygon, _ in layer]), ax.transData)
+
+
+# 同一 item 的一批线合成一个 LineCollection，线端和拐角与 ax.plot 的默认值相同
+def plot_lines(ax, lines, item: Item):
+    from matplotlib.collections import LineCollection
+    ax.add_collection(LineCollection([np.asarray(line.coords) for line in lines], colors=item.color,
+                                     linewidths=item.line_width, zorder=item.zorder, capstyle="projecting",
+                                     joinstyle="round"), autolim=False)
+
+
+# 按 raster_renderer.hole_layers 的绘制顺序，把相邻的同一 item 的要素合成一批
+def plot_features_batched(ax, hole_boundary, features, resources, grid):
+    items = [(geometry, get_item_by_type(item_type.value, resources)) for geometry, item_type in features]
+    batches = []
+    for kind, geometry, item in raster_renderer.hole_layers(hole_boundary, items, [], resources):
+        if batches and batches[-1][0] == kind and batches[-1][1] is item:
+            batches[-1][2].append(geometry)
         else:
-            if item_type is None:
-                logger.warning(
-                    f"item_type not identified, item_type: {item_type}, {debug_info}"
-                )
-            if len(coords) > 2:
-                item_polygon = utils.get_smooth_polygon(coords)
-                item_intersection = utils.intersection_of_polygons(item_polygon, hole_boundary)
-                if item_intersection and (not item_intersection.is_empty):
-                    geometries.append(item_intersection)
-                    attributes.append(
-                        {"itemType": item.type}
-                    )
+            batches.append((kind, item, [geometry]))
+    for kind, item, geometries in batches:
+        if kind == "polygon":
+            plot_polygons(ax, geometries, item, grid)
+        else:
+            plot_lines(ax, geometries, item)
+
+
+def plot_course(club_id, course_id, hole_number, hole, output_folder_path, resources, renderer="matplotlib",
+                outputs=None, output_format=None):
+    output_file_path, error, _ = try_render_course(club_id, course_id, hole_number, hole, output_folder_path,
+                                                   resources, renderer, outputs=outputs, output_format=output_format)
+    report_result(hole_reader.format_hole_key(club_id, course_id, hole_number), output_file_path, error)
+
+
+def announce_image(output_file_path):
+    # main.js 通过这一行刷新预览
+    print(f"Generated image: {output_file_path}", flush=True)
+
+
+def report_result(hole_key, output_file_path, error=None, preview=False):
+    if error:
+        logger.error(f"Exception: {error}, hole: {hole_key}{' (preview)' if preview else ''}")
+    if output_file_path and preview:
+        print(f"Generated preview: {output_file_path}", flush=True)
+    elif output_file_path:
+        announce_image(output_file_path)
+
+
+# 返回 (输出路径, 错误, 计时事件)
+def try_render_course(club_id, course_id, hole_number, hole, output_folder_path, resources, renderer="matplotlib",
+                      profile_threshold=None, profile_dir=None, outputs=None, output_format=None, budget=None):
+    metrics = hole_metrics.HoleMetrics(hole_reader.format_hole_key(club_id, course_id, hole_number),
+                                       profile_threshold, profile_dir)
     try:
-        # check data integrity
-        gdf = gpd.GeoDataFrame(attributes, geometry=geometries)
-        if "itemType" not in gdf.columns or hole_boundary is None:
-            logger.info(
-                f"itemType not in gdf.columns, or hole_boundary is None. {debug_info}"
-            )
+        output_file_path = render_course(club_id, course_id, hole_number, hole, output_folder_path, resources,
+                                         renderer, metrics, outputs, output_format, budget)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        return None, error, metrics.finish(error=error)
+    return output_file_path, None, metrics.finish(output_file_path)
+
+
+# 在当前线程渲染，编码和写出交给 writer 的后台线程；写完或出错后调用 on_rendered(路径, 错误, 计时事件)
+def submit_render_course(club_id, course_id, hole_number, hole, output_folder_path, resources, renderer, writer,
+                         on_rendered, profile_threshold=None, profile_dir=None, outputs=None, budget=None):
+    metrics = hole_metrics.HoleMetrics(hole_reader.format_hole_key(club_id, course_id, hole_number),
+                                       profile_threshold, profile_dir)
+    try:
+        rendered = render_hole_images(club_id, course_id, hole_number, hole, output_folder_path, resources,
+                                      renderer, metrics, outputs, writer.output_format, budget)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        on_rendered(None, error, metrics.finish(error=error))
+        return
+    if rendered is None:
+        on_rendered(None, None, metrics.finish())
+        return
+    images, artists = rendered
+    if any(not isinstance(rgba, np.ndarray) for _, rgba in images):
+        # 分条渲染和 SVG 写出时要用纹理缓存，不能放到写线程里，在当前线程写出
+        try:
+            output_file_path = output_writer.write_images(images, writer.output_format, metrics, artists)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            on_rendered(None, error, metrics.finish(error=error))
             return
-        # initialize the plot
-        fig_width, fig_height, adjusted_dpi, aspect_ratio, marker_pixels = utils.calculate_pixel_resolution(
-            *hole_boundary.bounds)
-        _, ax = plt.subplots(figsize=(fig_width, fig_height), facecolor="none")
-        ax.set_facecolor("none")  # 设置坐标轴区域透明
-        ax.spines["top"].set_visible(False)  # 隐藏上边框
-        ax.spines["right"].set_visible(False)  # 隐藏右边框
-        ax.spines["bottom"].set_visible(False)  # 隐藏下边框
-        ax.spines["left"].set_visible(False)  # 隐藏左边框
-        ax.set_aspect("equal")
-        ax.set_xticks([])
-        ax.set_yticks([])
-        ax.set_xlim(hole_boundary.bounds[0], hole_boundary.bounds[2])
-        ax.set_ylim(hole_boundary.bounds[1], hole_boundary.bounds[3])
-        ax.set_aspect(aspect_ratio)
-        plt.subplots_adjust(left=0, right=1, top=1, bottom=0)
-        logger.info(f"Figure size (inches): width={fig_width}, height={fig_height}")
-        logger.info(
-            f"Final pixels: width={fig_width * adjusted_dpi}, height={fig_height * adjusted_dpi}"
-        )
+        on_rendered(output_file_path, None, metrics.finish(output_file_path))
+        return
+    # 写线程里的编码不计入这个洞的 cProfile
+    metrics.stop_profile()
+    writer.submit(images, metrics, artists,
+                  lambda output_file_path, error: on_rendered(output_file_path, error,
+                                                              metrics.finish(output_file_path, error)))
 
-        # plot hole boundary
-        hole_boundary_trace = gpd.GeoSeries([hole_boundary])
-        plot_polygon(ax, hole_boundary_trace, resources.holeBoundary)
-        # plot items inside hole boundary
-        for _, row in gdf.iterrows():
-            item = get_item_by_type(row["itemType"].value, resources)
-            if isinstance(row.geometry, LineString):
-                x, y = row.geometry.xy
-                ax.plot(x, y, color=row["color"], linewidth=row["lineWidth"], zorder=item.zorder)
-            elif isinstance(row.geometry, ShapelyPolygon):
-                polygon_trace = gpd.GeoSeries([row.geometry])
-                plot_polygon(ax, polygon_trace, item)
-        for marker, coords in markers:
-            plot_marker(ax, marker, marker_pixels, coords, hole_boundary)
-
-        plt.savefig(
-            f"{output_folder_path}/{club_id}_{course_id}_{hole_number}.png",
-            dpi=adjusted_dpi,
-            format="png",
-            bbox_inches="tight",
-            pad_inches=0,
-            transparent=True,
-        )
-        print(f"Generated image: {output_folder_path}/{club_id}_{course_id}_{hole_number}.png", flush=True)
+
+# 解析、平滑、简化并按球洞边界裁剪一个洞的要素，返回 (球洞边界, FeatureStore, 标记)，没有球洞边界时返回 None。
+# 洞已经由 prepare_course_holes 按球场处理过时直接取结果，那部分耗时记在球场的计时事件里
+def collect_features(hole, resources, metrics, tolerance=None):
+    if "geometry" in hole:
+        metrics.record_vertices(*hole["vertices"])
+        return hole["geometry"]
+    collected = collect_course_features([hole], resources, metrics, tolerance)[0]
+    if collected is None:
+        return None
+    metrics.record_vertices(*collected[4])
+    return collected[:3]
+
+
+# 一次处理整个球场的要素：解析、平滑、按 tolerance 简化后，用球洞边界的 STRtree 批量分配给各洞并批量裁剪。
+# 与某个洞边界相交的要素都画进这个洞，不论它列在哪个洞的 gpsItems 里；几个洞重复列出的同一要素只平滑一次。
+# 返回每个洞的 (球洞边界, FeatureStore, 标记, 相关 gpsItems, 简化前后的顶点数)，没有球洞边界的洞为 None。
+# 相关 gpsItems 为本洞的加上从其他洞分配进来的，用于增量渲染的哈希；tolerance 为 None 时按标准分辨率
+def collect_course_features(holes, resources, metrics, tolerance=None):
+    if tolerance is None:
+        tolerance = utils.simplify_tolerance()
+    # the first hole boundary of each hole is recorded separately from the rest of the items
+    boundary_coords = []
+    # (itemType, 坐标) -> [item, coords, gpsItem, 列出它的洞]
+    items = {}
+    with metrics.stage("parse"):
+        for hole_index, hole in enumerate(holes):
+            hole_boundary_coords = None
+            for gpsItem in hole["gpsItems"]:
+                item = get_item_by_type(gpsItem["itemType"], resources)
+                if item is None:
+                    continue
+                coords = hole_reader.shape_coords(gpsItem["shape"])
+                if item == resources.holeBoundary:
+                    if hole_boundary_coords is None:
+                        hole_boundary_coords = coords
+                elif len(coords) > 0:
+                    items.setdefault((gpsItem["itemType"], tuple(coords)), [item, coords, gpsItem, set()])[3].add(
+                        hole_index)
+            boundary_coords.append(hole_boundary_coords)
+    items = list(items.values())
+    polygon_items, polygons = [], []
+    line_items, line_strings = [], []
+    marker_items, marker_coords = [], []
+    with metrics.stage("smooth"):
+        boundaries = [utils.get_smooth_polygon(coords) if coords is not None else None for coords in boundary_coords]
+        for index, (item, coords, _, _) in enumerate(items):
+            if isinstance(item, Marker):
+                marker_items.append(index)
+                marker_coords.append(np.asarray(coords, dtype=np.float64).reshape(-1, 2))
+            elif isinstance(item, Line):
+                if len(coords) > 1:
+                    line_items.append(index)
+                    line_strings.append(LineString(coords))
+            elif len(coords) > 2:
+                polygon = utils.get_smooth_polygon(coords)
+                if polygon is not None:
+                    polygon_items.append(index)
+                    polygons.append(polygon)
+    # 球洞边界不简化，保持输出图片的范围不变
+    with metrics.stage("simplify"):
+        polygons, polygon_before, polygon_after = course_geometry.simplify(polygons, tolerance)
+        line_strings, line_before, line_after = course_geometry.simplify(line_strings, tolerance)
+    item_vertices = dict(zip(polygon_items + line_items,
+                             zip(np.concatenate([polygon_before, line_before]).tolist(),
+                                 np.concatenate([polygon_after, line_after]).tolist())))
+    stores = [None] * len(holes)
+    markers = [[] for _ in holes]
+    assigned = [set() for _ in holes]
+    with metrics.stage("clip"):
+        engine = course_geometry.CourseGeometry(boundaries)
+        for hole_index, hole_boundary in enumerate(boundaries):
+            if hole_boundary is not None:
+                stores[hole_index] = FeatureStore()
+                stores[hole_index].add(hole_boundary, resources.holeBoundary.type)
+        # 每个洞内先多边形后线，各自保持要素顺序
+        for item_indices, (indices, hole_indices, geometries) in (
+                (polygon_items, engine.clip_polygons(polygons)), (line_items, engine.clip_lines(line_strings))):
+            for index, hole_index, geometry in zip(indices, hole_indices, geometries):
+                item_index = item_indices[index]
+                stores[hole_index].add(geometry, items[item_index][0].type)
+                assigned[hole_index].add(item_index)
+        if marker_coords:
+            points = np.concatenate(marker_coords)
+            owners = np.repeat(np.arange(len(marker_coords)), [len(coords) for coords in marker_coords])
+            point_indices, hole_indices, _ = engine.assign_points(points)
+            # 按洞、点的顺序排好，同一个洞里同一个标记要素的点分到一组
+            groups = {}
+            for point_index, hole_index in zip(point_indices, hole_indices):
+                groups.setdefault((hole_index, owners[point_index]), []).append(point_index)
+            for (hole_index, owner), group in groups.items():
+                item_index = marker_items[owner]
+                markers[hole_index].append((items[item_index][0], points[group]))
+                assigned[hole_index].add(item_index)
+    results = []
+    for hole_index, hole in enumerate(holes):
+        if stores[hole_index] is None:
+            results.append(None)
+            continue
+        stores[hole_index].freeze()
+        foreign = [items[index][2] for index in sorted(assigned[hole_index]) if hole_index not in items[index][3]]
+        vertices = [len(boundaries[hole_index].exterior.coords)] * 2
+        for index in assigned[hole_index]:
+            before, after = item_vertices.get(index, (0, 0))
+            vertices[0] += before
+            vertices[1] += after
+        results.append((boundaries[hole_index], stores[hole_index], markers[hole_index], hole["gpsItems"] + foreign,
+                        vertices))
+    return results
+
+
+# 最近处理过的几个球场保留结果：优先洞之后按正常顺序再遇到同一球场时不用重新处理。
+# scheduler 在更多球场之间来回调整优先级时，被挤出的球场再用到时会整个重新处理，这时记一条日志
+course_cache_size = 4
+
+
+class PreparedCourses:
+    # 按球场处理好的洞（prepare_course_holes 的结果）的 LRU 缓存；on_event 接收每次处理一个球场的计时事件
+    def __init__(self, resources, tolerance=None, on_event=None, profile_threshold=None, profile_dir=None,
+                 size=course_cache_size):
+        self.resources = resources
+        self.tolerance = tolerance
+        self.on_event = on_event
+        self.profile = (profile_threshold, profile_dir)
+        self.size = size
+        self._courses = OrderedDict()
+        self._evicted = set()
+
+    # load() 返回球场的整条记录，只在缓存中没有这个球场时调用
+    def holes(self, key, load):
+        if key not in self._courses:
+            data = load()
+            if key in self._evicted:
+                logger.info(f"Preparing course {course_key(data['clubId'], data['courseId'])} again, it was evicted "
+                            f"from the cache of {self.size} courses")
+            self._courses[key] = prepare_course_holes(data, self.resources, self.tolerance, self.on_event,
+                                                      *self.profile)
+            while len(self._courses) > self.size:
+                self._evicted.add(self._courses.popitem(last=False)[0])
+        self._courses.move_to_end(key)
+        return self._courses[key]
+
+
+# hole_list 中每个洞带着所在球场的记录；遇到一个球场的第一个洞时处理整个球场，之后的洞直接取结果
+def iter_course_geometry(hole_list, prepared_courses):
+    for club_id, course_id, hole_number, hole, data in hole_list:
+        holes = prepared_courses.holes((club_id, course_id), lambda: data)
+        yield club_id, course_id, hole_number, holes[hole_number - 1]
+
+
+# 整个球场的解析、平滑、简化和裁剪一次完成，耗时作为一个 "course" 事件交给 on_event，不分摊到各洞；
+# 超过 profile_threshold 的球场同样写出 cProfile 文件
+def prepare_course_holes(data, resources, tolerance=None, on_event=None, profile_threshold=None, profile_dir=None):
+    metrics = hole_metrics.HoleMetrics(course_key(data["clubId"], data["courseId"]), profile_threshold, profile_dir,
+                                       kind="course")
+    metrics.info["holes"] = len(data["holes"])
+    try:
+        collected = collect_course_features(data["holes"], resources, metrics, tolerance)
     except Exception as e:
-        logger.error(f"Exception: {e}, {debug_info}")
+        # 整个球场处理失败时各洞退回逐洞处理，出错的洞单独报告
+        error = f"{type(e).__name__}: {e}"
+        logger.error(f"Exception: {error}, course: {metrics.hole_key}")
+        event = metrics.finish(error=error)
+        if on_event is not None:
+            on_event(event)
+        return data["holes"]
+    event = metrics.finish()
+    if on_event is not None:
+        on_event(event)
+    prepared = []
+    for hole, result in zip(data["holes"], collected):
+        if result is None:
+            prepared.append({"gpsItems": hole["gpsItems"], "geometry": None})
+        else:
+            hole_boundary, features, markers, gps_items, vertices = result
+            prepared.append({"gpsItems": gps_items, "geometry": (hole_boundary, features, markers),
+                             "vertices": vertices})
+    return prepared
+
+
+# 简化容差按最精细的输出尺寸计算
+def output_tolerance(outputs):
+    return utils.simplify_tolerance(outputs.detail_scale() if outputs is not None else 1)
+
+
+# outputs 为 OutputVariants 时一次渲染输出多个尺寸，返回主输出的路径
+def render_course(club_id, course_id, hole_number, hole, output_folder_path, resources, renderer="matplotlib",
+                  metrics=None, outputs=None, output_format=None, budget=None):
+    if metrics is None:
+        metrics = hole_metrics.HoleMetrics(hole_reader.format_hole_key(club_id, course_id, hole_number))
+    if output_format is None:
+        output_format = output_writer.OutputFormat()
+    rendered = render_hole_images(club_id, course_id, hole_number, hole, output_folder_path, resources, renderer,
+                                  metrics, outputs, output_format, budget)
+    if rendered is None:
+        return
+    images, artists = rendered
+    return output_writer.write_images(images, output_format, metrics, artists)
+
+
+# 返回 (要写出的 [(输出路径, RGBA)], artist 数量)，没有球洞边界时返回 None。budget 为 PixelBudget 时，
+# 超过像素预算的尺寸降低分辨率，或换成写出时才用 numpy 渲染器逐条渲染的 BandedImage；svg 格式时为 SvgImage
+def render_hole_images(club_id, course_id, hole_number, hole, output_folder_path, resources, renderer, metrics,
+                       outputs, output_format, budget=None):
+    debug_info = f"clubId: {club_id}, courseId: {course_id}, holeNumber: {hole_number}"
+    collected = collect_features(hole, resources, metrics, output_tolerance(outputs))
+    # check data integrity
+    if collected is None:
+        logger.info(f"hole_boundary is None. {debug_info}")
+        return
+    hole_boundary, features, markers = collected
+    output_file_paths = hole_output_paths(output_folder_path, club_id, course_id, hole_number, outputs,
+                                          output_format)
+    # 所有渲染器的输出都是 canvas_size 的尺寸，NAME=Npx 按它换算出的倍数正好让实际输出的最长边为 N
+    width, height = raster_renderer.canvas_size(hole_boundary)
+    scales = [variant.scale_for(width, height) for variant in outputs] if outputs is not None else [1]
+    if output_format.format == "svg":
+        # 矢量输出不受像素预算限制，各尺寸共用同一份文档
+        with metrics.stage("build_artists"):
+            items = [(geometry, get_item_by_type(item_type.value, resources)) for geometry, item_type in features]
+            document = svg_renderer.SvgDocument(hole_boundary, items, markers, resources, max(scales))
+        images = [(output_file_path, svg_renderer.SvgImage(document, hole_boundary, scale))
+                  for output_file_path, scale in zip(output_file_paths, scales)]
+        return images, len(document.layers)
+    banded = set()
+    if budget is not None:
+        planned, banded = budget.plan(width, height, scales, output_format)
+        if banded or planned != scales:
+            logger.warning(f"Hole of {width}x{height} pixels exceeds the {budget.max_pixels} pixel budget, "
+                           f"{'rendering in bands' if banded else 'reducing resolution'}. {debug_info}")
+        scales = planned
+    images = [None] * len(scales)
+    artists = 0
+    if banded:
+        with metrics.stage("build_artists"):
+            items = [(geometry, get_item_by_type(item_type.value, resources)) for geometry, item_type in features]
+        for index in banded:
+            image = band_renderer.BandedImage(hole_boundary, items, markers, resources, scales[index],
+                                              budget.band_pixels)
+            images[index] = (output_file_paths[index], image)
+            artists = image.layers
+    rest = [index for index in range(len(scales)) if index not in banded]
+    if outputs is None and rest:
+        rgba, artists = render_rgba(hole_boundary, features, markers, resources, renderer, metrics, scales[0])
+        images[0] = (output_file_paths[0], rgba)
+    elif rest:
+        rendered, artists = render_variants(hole_boundary, features, markers, resources, renderer, metrics,
+                                            [scales[index] for index in rest],
+                                            [output_file_paths[index] for index in rest])
+        for index, image in zip(rest, rendered):
+            images[index] = image
+    return images, artists
+
+
+def hole_output_paths(output_folder_path, club_id, course_id, hole_number, outputs, output_format):
+    if outputs is not None:
+        output_file_paths = outputs.paths(output_folder_path, club_id, course_id, hole_number)
+    else:
+        output_file_paths = [f"{output_folder_path}/{hole_reader.format_hole_key(club_id, course_id, hole_number)}.png"]
+    return [output_format.path(output_file_path) for output_file_path in output_file_paths]
+
+
+# 返回 RGBA 和 artist 数量：numpy 渲染器为预乘 float32，matplotlib 为 uint8
+def render_rgba(hole_boundary, features, markers, resources, renderer, metrics, scale=1):
+    if renderer == "numpy":
+        with metrics.stage("build_artists"):
+            items = [(geometry, get_item_by_type(item_type.value, resources)) for geometry, item_type in features]
+        with metrics.stage("draw"):
+            canvas = raster_renderer.rasterize_hole(hole_boundary, items, markers, resources, scale)
+        return canvas.rgba, canvas.layers
+    return render_matplotlib(hole_boundary, features, markers, resources, metrics, scale,
+                             batched=renderer == "matplotlib-batched")
+
+
+# 按所需的最大尺寸只渲染一次，较小的尺寸从降采样金字塔得到；scales 为各尺寸相对标准分辨率的倍数
+def render_variants(hole_boundary, features, markers, resources, renderer, metrics, scales, output_file_paths):
+    scale = max(scales)
+    rgba, artists = render_rgba(hole_boundary, features, markers, resources, renderer, metrics, scale)
+    pyramid = None
+    images = []
+    for variant_scale, output_file_path in zip(scales, output_file_paths):
+        size = tuple(max(round(pixels * variant_scale / scale), 1) for pixels in rgba.shape[:2])
+        if size == rgba.shape[:2]:
+            images.append((output_file_path, rgba))
+            continue
+        with metrics.stage("downsample"):
+            if pyramid is None:
+                pyramid = raster_renderer.DownsamplePyramid(raster_renderer.to_premultiplied(rgba))
+            images.append((output_file_path, pyramid.resize(*size)))
+    return images, artists
+
+
+# 返回 uint8 的非预乘 RGBA 和 artist 数量
+def render_matplotlib(hole_boundary, features, markers, resources, metrics, scale=1, batched=False):
+    import matplotlib.pyplot as plt
+    try:
+        with metrics.stage("build_artists"):
+            ax, adjusted_dpi = plot_hole(hole_boundary, features, markers, resources, scale, batched)
+        # 坐标轴已经铺满整张图，画一遍后直接取 Agg 画布，编码和写出交给 output_writer
+        with metrics.stage("draw"):
+            figure = ax.figure
+            figure.set_dpi(adjusted_dpi)
+            figure.canvas.draw()
+            rgba = np.array(figure.canvas.buffer_rgba())
+        artists = len(ax.images) + len(ax.lines) + len(ax.patches) + len(ax.collections)
+        return rgba, artists
     finally:
         plt.close("all")
 
 
+def plot_hole(hole_boundary, features, markers, resources, scale=1, batched=False):
+    import matplotlib.pyplot as plt
+    # initialize the plot
+    _, _, adjusted_dpi, _, marker_pixels = utils.calculate_pixel_resolution(*hole_boundary.bounds)
+    # 提高 dpi 得到更大的图，线宽和标记随之缩放
+    adjusted_dpi = adjusted_dpi * scale
+    # 图的像素尺寸与 numpy 渲染器的画布相同，坐标轴铺满整张图，球洞范围正好映射到这个像素网格
+    width, height = raster_renderer.canvas_size(hole_boundary, scale)
+    _, ax = plt.subplots(figsize=(figure_inches(width, adjusted_dpi), figure_inches(height, adjusted_dpi)),
+                         facecolor="none")
+    ax.set_facecolor("none")  # 设置坐标轴区域透明
+    ax.spines["top"].set_visible(False)  # 隐藏上边框
+    ax.spines["right"].set_visible(False)  # 隐藏右边框
+    ax.spines["bottom"].set_visible(False)  # 隐藏下边框
+    ax.spines["left"].set_visible(False)  # 隐藏左边框
+    ax.set_xticks([])
+    ax.set_yticks([])
+    ax.set_xlim(hole_boundary.bounds[0], hole_boundary.bounds[2])
+    ax.set_ylim(hole_boundary.bounds[1], hole_boundary.bounds[3])
+    ax.set_position([0, 0, 1, 1])
+    # 图的宽高比已经按经纬度等比例算好，不再让 aspect 收缩坐标轴
+    ax.set_aspect("auto")
+    grid = raster_renderer.PixelGrid(hole_boundary.bounds, width, height)
+    logger.info(f"Final pixels: width={width}, height={height}")
+
+    if batched:
+        plot_features_batched(ax, hole_boundary, features, resources, grid)
+    else:
+        # plot hole boundary
+        plot_polygon(ax, hole_boundary, resources.holeBoundary, grid)
+        # plot items inside hole boundary
+        for geometry, item_type in features:
+            item = get_item_by_type(item_type.value, resources)
+            if isinstance(geometry, LineString):
+                x, y = geometry.xy
+                ax.plot(x, y, color=item.color, linewidth=item.line_width, zorder=item.zorder)
+            elif isinstance(geometry, ShapelyPolygon):
+                plot_polygon(ax, geometry, item, grid)
+    plot_markers(ax, markers, marker_pixels, grid, adjusted_dpi)
+    return ax, adjusted_dpi
+
+
     
-def plot_courses(input_jsonl_file_path, resources_dir, output_folder_path):
+def plot_courses(input_jsonl_file_path, resources_dir, output_folder_path, renderer="matplotlib", workers=1,
+                 priority_holes=None, incremental=False, on_result=report_result, cancel_event=None,
+                 metrics_file=None, profile_threshold=None, outputs=None, output_format=None,
+                 writer_threads=output_writer.default_writer_threads, input_store=False, budget=None,
+                 scheduler=None, preview=False, limits=None, retry_quarantined=False):
+    if output_format is None:
+        output_format = output_writer.OutputFormat()
     resources = Resources(resources_dir)
-    with open(input_jsonl_file_path, "r", newline="", encoding="utf-8") as file:
-        hole_list = []
-        hole_dict = {}
-        for line in file:
-            data = json.loads(line)
-            club_id = data["clubId"]
-            course_id = data["courseId"]
-            holes = data["holes"]
-            hole_count = len(holes)
-            for hole_number in range(1, hole_count + 1):
-                hole = holes[hole_number - 1]
-                hole_list.append((club_id, course_id, hole_number, hole))
-                hole_dict[(club_id, course_id, hole_number)] = hole
-        """
-        把下面五个洞依次放到hole_list数组的最前面。
-        75ae94b0-86ac-11e4-8c28-020000005b00_248966d0-86b3-11e4-8f92-020000005b00_9.png 特小球场，有水域，横向, 257 × 139
-        76afd810-86ac-11e4-8c28-020000005b00_062b3e10-86b4-11e4-8f92-020000005b00_7.png 小球场，有水域，横向, 505 × 134
-        77d87990-86ac-11e4-8c28-020000005b00_3533d770-86b5-11e4-8f92-020000005b00_3.png 小球场，有水线，横向, 558 × 225
-        b1c08a80-86ac-11e4-8c28-020000005b00_7e81e060-86de-11e4-8f92-020000005b00_14.png 大球场，有球车线，横向, 1677 × 969
-        77d87990-86ac-11e4-8c28-020000005b00_3533d770-86b5-11e4-8f92-020000005b00_9.png 大球场，有水线水域，竖向, 439 × 727
-        """        
-        hole_list.insert(0, ("77d87990-86ac-11e4-8c28-020000005b00", "3533d770-86b5-11e4-8f92-020000005b00", 9, hole_dict[("77d87990-86ac-11e4-8c28-020000005b00", "3533d770-86b5-11e4-8f92-020000005b00", 9)]))
-        hole_list.insert(0, ("b1c08a80-86ac-11e4-8c28-020000005b00", "7e81e060-86de-11e4-8f92-020000005b00", 14, hole_dict[("b1c08a80-86ac-11e4-8c28-020000005b00", "7e81e060-86de-11e4-8f92-020000005b00", 14)]))
-        hole_list.insert(0, ("77d87990-86ac-11e4-8c28-020000005b00", "3533d770-86b5-11e4-8f92-020000005b00", 3, hole_dict[("77d87990-86ac-11e4-8c28-020000005b00", "3533d770-86b5-11e4-8f92-020000005b00", 3)]))
-        hole_list.insert(0, ("76afd810-86ac-11e4-8c28-020000005b00", "062b3e10-86b4-11e4-8f92-020000005b00", 7, hole_dict[("76afd810-86ac-11e4-8c28-020000005b00", "062b3e10-86b4-11e4-8f92-020000005b00", 7)]))
-        hole_list.insert(0, ("75ae94b0-86ac-11e4-8c28-020000005b00", "248966d0-86b3-11e4-8f92-020000005b00", 9, hole_dict[("75ae94b0-86ac-11e4-8c28-020000005b00", "248966d0-86b3-11e4-8f92-020000005b00", 9)]))    
+    if priority_holes is None:
+        priority_holes = hole_reader.default_priority_holes
+    cache = None
+    changed = None
+    if incremental:
+        cache = render_cache.RenderCache(output_folder_path, on_result)
+        changed = changed_hole_filter(cache, resources, output_folder_path, renderer, outputs, output_format, budget)
+    if preview and scheduler is None:
+        scheduler = render_scheduler.RenderScheduler()
+    quarantine = None
+    skipped = set()
+    if limits is not None:
+        quarantine = render_supervisor.Quarantine(output_folder_path)
+        if not retry_quarantined:
+            skipped = quarantined_holes(quarantine)
+    # 超过阈值的洞和球场把 cProfile 结果写到这里
+    profile_dir = os.path.join(os.path.dirname(os.path.abspath(metrics_file)) if metrics_file else output_folder_path,
+                               "profiles")
+
+    # 洞在渲染时才从 hole_list 取出，那时 run_metrics 已经创建
+    def on_course_event(event):
+        run_metrics.record(event)
+
+    prepared_courses = PreparedCourses(resources, output_tolerance(outputs), on_course_event, profile_threshold,
+                                       profile_dir)
+    if scheduler is not None:
+        if skipped:
+            scheduler.cancel(holes=skipped)
+        courses = open_course_index(input_jsonl_file_path, output_folder_path, input_store)
+        hole_list = iter_scheduled_holes(scheduler, courses, priority_holes, preview, resources, renderer,
+                                         output_folder_path, prepared_courses, on_result, changed)
+    else:
+        if input_store:
+            hole_list = open_input_store(input_jsonl_file_path, output_folder_path).iter_holes_with_priority(
+                priority_holes, with_course=True)
+        else:
+            # 逐行解析、边读边渲染，内存不随输入文件大小增长
+            hole_list = hole_reader.iter_holes_with_priority(input_jsonl_file_path, priority_holes,
+                                                             with_course=True)
+        if skipped:
+            hole_list = (entry for entry in hole_list if tuple(entry[:3]) not in skipped)
+        hole_list = iter_course_geometry(hole_list, prepared_courses)
+        if changed is not None:
+            hole_list = (entry for entry in hole_list if changed(*entry))
+    if cancel_event is not None:
+        hole_list = iter_until_cancelled(hole_list, cancel_event)
+
+    run_metrics = hole_metrics.RunMetrics(metrics_file)
+
+    def on_rendered(club_id, course_id, hole_number, output_file_path, error=None, event=None):
+        hole_key = hole_reader.format_hole_key(club_id, course_id, hole_number)
+        run_metrics.record(event)
+        on_result(hole_key, output_file_path, error)
+        if cache:
+            cache.done(hole_key, output_file_path)
+
+    try:
+        if limits is not None:
+            plot_holes_supervised(hole_list, resources_dir, output_folder_path, renderer, workers, on_rendered,
+                                  limits, quarantine, profile_threshold, profile_dir, outputs, output_format, budget)
+        elif workers > 1:
+            plot_holes_in_pool(hole_list, resources_dir, output_folder_path, renderer, workers, on_rendered,
+                               profile_threshold, profile_dir, outputs, output_format, budget)
+        else:
+            # 编码和写盘在后台线程进行，与下一个洞的渲染重叠
+            writer = output_writer.OutputWriter(output_format, writer_threads)
+            try:
+                for club_id, course_id, hole_number, hole in hole_list:
+                    submit_render_course(club_id, course_id, hole_number, hole, output_folder_path, resources,
+                                         renderer, writer,
+                                         functools.partial(on_rendered, club_id, course_id, hole_number),
+                                         profile_threshold, profile_dir, outputs, budget)
+                    writer.drain()
+            finally:
+                writer.close()
+    finally:
+        run_metrics.close()
+        if cache:
+            cache.save()
+            logger.info(f"Incremental render: skipped {cache.skipped} unchanged holes, "
+                        f"reused {cache.reused} identical renders")
+        logger.info(f"Texture cache: {texture_cache.stats()}")
+
+
+# 隔离清单中的洞，记录原因后本次跳过
+def quarantined_holes(quarantine):
+    holes = set()
+    for key, entry in quarantine.holes.items():
+        logger.warning(f"Skipping quarantined hole {key}: {entry['reason']}")
+        holes.add((entry["clubId"], entry["courseId"], entry["holeNumber"]))
+    return holes
+
+
+def iter_until_cancelled(hole_list, cancel_event):
+    for hole in hole_list:
+        if cancel_event.is_set():
+            return
+        yield hole
+
+
+def resource_files_for_hole(hole, resources):
+    resources_dir = resources.holeBoundary.resources_dir
+    resource_files = {resources.holeBoundary.texture, os.path.join(resources_dir, "colors.xml")}
+    item_types = {item_type.value for item_type in ItemType}
+    for gpsItem in hole["gpsItems"]:
+        if gpsItem["itemType"] not in item_types:
+            continue
+        item = get_item_by_type(gpsItem["itemType"], resources)
+        if isinstance(item, Polygon):
+            resource_files.add(item.texture)
+        elif isinstance(item, Marker):
+            resource_files.add(item.img_icon)
+    return resource_files
+
+
+# 返回 changed(clubId, courseId, holeNumber, hole)：True 表示这个洞需要重新渲染，未变化或可复用的洞由 cache 处理
+def changed_hole_filter(cache, resources, output_folder_path, renderer, outputs, output_format, budget=None):
+    settings = dict(utils.render_settings(), renderer=renderer, **output_format.settings())
+    if outputs is not None:
+        settings.update(outputs.settings())
+    if budget is not None:
+        settings.update(budget.settings())
+
+    def changed(club_id, course_id, hole_number, hole):
+        key = hole_reader.format_hole_key(club_id, course_id, hole_number)
+        digest = render_cache.hole_digest(hole, resource_files_for_hole(hole, resources), settings)
+        output_file_paths = hole_output_paths(output_folder_path, club_id, course_id, hole_number, outputs,
+                                              output_format)
+        return cache.plan(key, digest, output_file_paths)
+
+    return changed
+
+
+# 调度模式下按下标随机读取球场：二进制列存或 JSONL 的行偏移索引
+def open_course_index(input_jsonl_file_path, output_folder_path, input_store=False):
+    if input_store:
+        return open_input_store(input_jsonl_file_path, output_folder_path)
+    return hole_reader.CourseIndex(input_jsonl_file_path)
+
+
+# 按 scheduler 的顺序取出任务。预览在当前线程用任务的渲染器以低分辨率渲染，以 on_result(..., preview=True) 报告；
+# 完整分辨率的洞产出给后面的串行或进程池渲染。changed 为增量渲染的过滤，每个洞第一次取出时判断
+def iter_scheduled_holes(scheduler, courses, priority_holes, preview, resources, renderer, output_folder_path,
+                         prepared_courses, on_result, changed=None):
+    course_indices = {}
+    for course_index, key in enumerate(courses.courses):
+        course_indices.setdefault(key, course_index)
+    hole_counts = courses.hole_counts()
+    for club_id, course_id, hole_number in priority_holes:
+        course_index = course_indices.get((club_id, course_id))
+        if course_index is None or not 1 <= hole_number <= hole_counts[course_index]:
+            logger.warning(f"Priority hole not found: clubId: {club_id}, courseId: {course_id}, "
+                           f"holeNumber: {hole_number}")
+            continue
+        scheduler.add(club_id, course_id, hole_number, course_index, preview)
+    for course_index, (club_id, course_id) in enumerate(courses.courses):
+        for hole_number in range(1, hole_counts[course_index] + 1):
+            scheduler.add(club_id, course_id, hole_number, course_index, preview)
+
+    preview_outputs = output_variants.OutputVariants([preview_variant], preview_path_template)
+    preview_format = output_writer.OutputFormat("png", preview_compress_level)
+    checked = set()
+    while True:
+        task = scheduler.pop()
+        if task is None:
+            return
+        holes = prepared_courses.holes(task.course_index, lambda: courses.course(task.course_index))
+        if len(holes) != hole_counts[task.course_index]:
+            # 索引按字节扫描数出的洞数有误：补上多出来的洞，跳过不存在的洞
+            club_id, course_id = courses.courses[task.course_index]
+            for hole_number in range(hole_counts[task.course_index] + 1, len(holes) + 1):
+                scheduler.add(club_id, course_id, hole_number, task.course_index, preview)
+            hole_counts[task.course_index] = len(holes)
+        if task.hole_number > len(holes):
+            logger.warning(f"Hole not found: clubId: {task.hole[0]}, courseId: {task.hole[1]}, "
+                           f"holeNumber: {task.hole_number}")
+            continue
+        hole = holes[task.hole_number - 1]
+        if changed is not None and task.hole not in checked:
+            checked.add(task.hole)
+            if not changed(*task.hole, hole):
+                scheduler.cancel(holes=[task.hole])
+                continue
+        if task.preview:
+            # 预览与完整图用同一个渲染器，只是分辨率低，替换时不会变样
+            output_file_path, error, _ = try_render_course(*task.hole, hole, output_folder_path, resources, renderer,
+                                                           outputs=preview_outputs, output_format=preview_format)
+            on_result(hole_reader.format_hole_key(*task.hole), output_file_path, error, preview=True)
+            continue
+        yield (*task.hole, hole)
+
+
+# 每个工作进程只加载一次资源（纹理、图标），之后的洞都复用
+_worker_resources = None
+_worker_renderer = None
+_worker_profile = (None, None)
+_worker_outputs = (None, None, None)
+
+
+def _init_worker(resources_dir, renderer, profile_threshold, profile_dir, outputs, output_format, budget,
+                 texture_settings):
+    global _worker_resources, _worker_renderer, _worker_profile, _worker_outputs
+    import matplotlib
+    matplotlib.use("Agg")
+    texture_cache.configure(*texture_settings)
+    _worker_resources = Resources(resources_dir)
+    _worker_resources.preload_images()
+    _worker_renderer = renderer
+    _worker_profile = (profile_threshold, profile_dir)
+    _worker_outputs = (outputs, output_format, budget)
+
+
+def _render_course_in_worker(club_id, course_id, hole_number, hole, output_folder_path):
+    return try_render_course(club_id, course_id, hole_number, hole, output_folder_path,
+                             _worker_resources, _worker_renderer, *_worker_profile, *_worker_outputs)
+
+
+def plot_holes_in_pool(hole_list, resources_dir, output_folder_path, renderer, workers, on_rendered,
+                       profile_threshold=None, profile_dir=None, outputs=None, output_format=None, budget=None):
+    # 限制同时在队列中的洞数量，避免把所有洞一次性序列化进进程池
+    max_pending = workers * 2
+    pending = {}
+
+    def report(done):
+        for future in done:
+            club_id, course_id, hole_number = pending.pop(future)
+            try:
+                output_file_path, error, event = future.result()
+            except Exception as e:
+                output_file_path, error, event = None, f"{type(e).__name__}: {e}", None
+            # 只由主进程输出，保证 main.js 每次读到的都是完整的一行
+            on_rendered(club_id, course_id, hole_number, output_file_path, error, event)
+
+    # 与 render_supervisor 相同：常驻服务读 stdin 的线程持有锁时 fork，子进程关闭 stdin 会卡住，统一用 spawn
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker,
+                             initargs=(resources_dir, renderer, profile_threshold, profile_dir, outputs,
+                                       output_format, budget, texture_cache.settings())) as executor:
+        for club_id, course_id, hole_number, hole in hole_list:
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                report(done)
+            future = executor.submit(_render_course_in_worker, club_id, course_id, hole_number, hole,
+                                     output_folder_path)
+            pending[future] = (club_id, course_id, hole_number)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            report(done)
+
+
+# 与 plot_holes_in_pool 相同的工作进程初始化和渲染，但每个洞受时间和内存预算监督，见 render_supervisor
+def plot_holes_supervised(hole_list, resources_dir, output_folder_path, renderer, workers, on_rendered, limits,
+                          quarantine=None, profile_threshold=None, profile_dir=None, outputs=None, output_format=None,
+                          budget=None):
+    def tasks():
         for club_id, course_id, hole_number, hole in hole_list:
-            plot_course(club_id, course_id, hole_number, hole, output_folder_path, resources)
+            yield (hole_reader.format_hole_key(club_id, course_id, hole_number), (club_id, course_id, hole_number),
+                   (club_id, course_id, hole_number, hole, output_folder_path))
+
+    def on_done(hole, result, error):
+        if result is None:
+            on_rendered(*hole, None, error)
+        else:
+            on_rendered(*hole, *result)
+
+    supervisor = render_supervisor.RenderSupervisor(
+        workers, _init_worker, (resources_dir, renderer, profile_threshold, profile_dir, outputs, output_format,
+                                budget, texture_cache.settings()), _render_course_in_worker, limits, quarantine)
+    supervisor.run(tasks(), on_done)
+
+
+def course_key(club_id, course_id):
+    return f"{club_id}_{course_id}"
+
+
+def build_course_tiles(data, resources):
+    settings = dict(utils.render_settings(), renderer="tiles")
+    holes = []
+    prepared = prepare_course_holes(data, resources)
+    for club_id, course_id, hole_number, hole in hole_reader.iter_course_holes(dict(data, holes=prepared)):
+        hole_key = hole_reader.format_hole_key(club_id, course_id, hole_number)
+        try:
+            collected = collect_features(hole, resources, hole_metrics.HoleMetrics(hole_key))
+        except Exception as e:
+            logger.error(f"Exception: {type(e).__name__}: {e}, hole: {hole_key}")
+            continue
+        if collected is None:
+            continue
+        hole_boundary, features, markers = collected
+        items = [(geometry, get_item_by_type(item_type.value, resources)) for geometry, item_type in features]
+        digest = render_cache.hole_digest(hole, resource_files_for_hole(hole, resources), settings)
+        holes.append((hole_key, digest, hole_boundary, items, markers))
+    return tile_renderer.CourseTiles(holes, resources)
+
+
+def zoom_range(course_tiles, min_zoom=None, max_zoom=None):
+    if max_zoom is None:
+        max_zoom = course_tiles.max_zoom
+    if min_zoom is None:
+        min_zoom = max_zoom - tile_renderer.default_zoom_levels + 1
+    return range(min_zoom, max_zoom + 1)
+
+
+# 瓦片输出：每个球场一个 z/x/y 金字塔，位于 {output}/tiles/{clubId}_{courseId}/
+def plot_course_tiles(input_jsonl_file_path, resources_dir, output_folder_path, min_zoom=None, max_zoom=None,
+                      cache_bytes=tile_cache.default_max_bytes, input_store=False):
+    resources = Resources(resources_dir)
+    cache = tile_cache.TileCache(os.path.join(output_folder_path, "tiles"), cache_bytes)
+    try:
+        if input_store:
+            courses = open_input_store(input_jsonl_file_path, output_folder_path).iter_courses()
+        else:
+            courses = hole_reader.iter_courses(input_jsonl_file_path)
+        for data in courses:
+            key = course_key(data["clubId"], data["courseId"])
+            course_tiles = build_course_tiles(data, resources)
+            rendered = 0
+            for zoom in zoom_range(course_tiles, min_zoom, max_zoom):
+                for x, y in course_tiles.tiles(zoom):
+                    tile_key = f"{key}/{tile_renderer.tile_key(zoom, x, y)}"
+                    if cache.get(tile_key, course_tiles.digest(zoom, x, y)):
+                        continue
+                    tile = course_tiles.render(zoom, x, y)
+                    if tile is not None:
+                        cache.put(tile_key, course_tiles.digest(zoom, x, y), tile)
+                        rendered += 1
+            logger.info(f"Rendered {rendered} tiles for course {key}")
+            print(f"Generated tiles: {os.path.join(cache.cache_dir, key)}", flush=True)
+    finally:
+        cache.save()
+        logger.info(f"Tile cache: {cache.hits} current tiles skipped, {cache.evicted} evicted")
+
+
+# 输入的二进制列存放在输出目录下，源文件变化时自动重建
+def open_input_store(input_jsonl_file_path, output_folder_path):
+    return hole_store.open_store(input_jsonl_file_path, os.path.join(output_folder_path, hole_store.store_dir_name))
+
+
+def data_paths(root_data_dir):
+    input_path = os.path.join(root_data_dir, "input_data", "golf_course_layout_samples.jsonl")
+    output_path = os.path.join(root_data_dir, "output_data")
+    resources_dir = os.path.join(root_data_dir, "resources")
+    return input_path, output_path, resources_dir
+
+
+def configure_textures(resources_dir, texture_cache_mb, texture_disk_cache=False):
+    disk_dir = os.path.join(resources_dir, texture_cache.disk_cache_dir_name) if texture_disk_cache else None
+    texture_cache.configure(texture_cache_mb * 1024 * 1024, disk_dir)
+
+
+def run_server_job(params, on_result, cancel_event, scheduler=None):
+    renderer = params.get("renderer", "matplotlib")
+    if renderer not in renderers:
+        raise ValueError(f"Unknown renderer: {renderer}")
+    input_path, output_path, resources_dir = data_paths(params["root_data_dir"])
+    os.makedirs(output_path, exist_ok=True)
+    configure_textures(resources_dir, params.get("texture_cache_mb", texture_cache.default_max_bytes // (1024 * 1024)),
+                       params.get("texture_disk_cache", False))
+    priority_holes = None
+    if params.get("priority_holes") is not None:
+        priority_holes = hole_reader.load_priority_holes(None, params["priority_holes"])
+    outputs = None
+    if params.get("variants"):
+        outputs = output_variants.OutputVariants(params["variants"],
+                                                 params.get("variant_path", output_variants.default_path_template))
+    output_format = output_writer.OutputFormat(params.get("output_format", "png"),
+                                               params.get("compress_level", output_writer.default_compress_level),
+                                               params.get("quality", output_writer.default_quality))
+    budget = band_renderer.pixel_budget(params.get("max_megapixels", band_renderer.default_max_megapixels),
+                                        params.get("oversize_policy", "off"), renderer)
+    limits = None
+    if params.get("supervised", False):
+        limits = render_supervisor.HoleLimits(params.get("hole_timeout", render_supervisor.default_hole_timeout),
+                                              params.get("max_rss_mb", render_supervisor.default_max_rss_mb),
+                                              params.get("retries", render_supervisor.default_retries))
+    plot_courses(input_path, resources_dir, output_path, renderer, params.get("workers", 1), priority_holes,
+                 params.get("incremental", False), on_result, cancel_event, params.get("metrics_file"),
+                 params.get("profile_threshold"), outputs, output_format,
+                 params.get("writer_threads", output_writer.default_writer_threads), params.get("input_store", False),
+                 budget, scheduler, params.get("preview", False), limits, params.get("retry_quarantined", False))
 
 
 if __name__ == "__main__":
+    # PyInstaller 打包后的工作进程需要
+    multiprocessing.freeze_support()
     parser = create_parser()
     args, _ = parser.parse_known_args()
-    root_data_dir = args.root_data_dir
-    input_path = os.path.join(args.root_data_dir, "input_data", "golf_course_layout_samples.jsonl")
-    output_path = os.path.join(args.root_data_dir, "output_data")
-    resources_dir = os.path.join(args.root_data_dir, "resources")
+    if args.verbose:
+        logger.setLevel(logging.INFO)
+    if args.server:
+        # 常驻进程：资源与解码后的纹理在多次任务之间保留
+        import matplotlib
+        matplotlib.use("Agg")
+        render_server.RenderServer(run_server_job).serve_forever()
+        sys.exit(0)
+    outputs = None
+    try:
+        if args.variants:
+            outputs = output_variants.OutputVariants(args.variants, args.variant_path)
+        output_format = output_writer.OutputFormat(args.output_format, args.compress_level, args.quality)
+        budget = band_renderer.pixel_budget(args.max_megapixels, args.oversize_policy, args.renderer)
+        limits = None
+        if args.supervised:
+            limits = render_supervisor.HoleLimits(args.hole_timeout, args.max_rss_mb, args.retries)
+    except ValueError as e:
+        parser.error(str(e))
+    input_path, output_path, resources_dir = data_paths(args.root_data_dir)
     os.makedirs(output_path, exist_ok=True)
-    plot_courses(input_path, resources_dir, output_path)
+    configure_textures(resources_dir, args.texture_cache_mb, args.texture_disk_cache)
+    if args.tiles:
+        plot_course_tiles(input_path, resources_dir, output_path, args.min_zoom, args.max_zoom,
+                          args.tile_cache_mb * 1024 * 1024, args.input_store)
+        sys.exit(0)
+    priority_holes = None
+    if args.priority_file or args.priority_holes is not None:
+        priority_holes = hole_reader.load_priority_holes(args.priority_file, args.priority_holes)
+    plot_courses(input_path, resources_dir, output_path, args.renderer, args.workers, priority_holes,
+                 args.incremental, metrics_file=args.metrics_file, profile_threshold=args.profile_threshold,
+                 outputs=outputs, output_format=output_format, writer_threads=args.writer_threads,
+                 input_store=args.input_store, budget=budget, preview=args.preview, limits=limits,
+                 retry_quarantined=args.retry_quarantined)
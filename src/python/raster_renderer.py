@@ -0,0 +1,396 @@
+import numpy as np
+from shapely.geometry import LineString, Polygon as ShapelyPolygon
+
+from hole_item import Polygon, Line, Marker
+from utils import logger
+import texture_cache
+import utils
+
+# 与 plot_polygon 中 ax.imshow(alpha=0.7) 保持一致
+texture_alpha = 0.7
+points_per_inch = 72
+
+
+# 可分离的三角滤波重采样，缩小时自动抗锯齿
+def resample_image(img, out_height, out_width):
+    out_height = max(int(out_height), 1)
+    out_width = max(int(out_width), 1)
+    rows = _resample_weights(img.shape[0], out_height)
+    cols = _resample_weights(img.shape[1], out_width)
+    out = np.einsum("oi,ijc->ojc", rows, img.astype(np.float32))
+    return np.einsum("oj,ijc->ioc", cols, out)
+
+
+def _resample_weights(in_size, out_size):
+    scale = in_size / out_size
+    support = max(scale, 1.0)
+    centers = (np.arange(out_size) + 0.5) * scale - 0.5
+    taps = np.arange(in_size)
+    weights = np.clip(1.0 - np.abs(taps[None, :] - centers[:, None]) / support, 0.0, None)
+    weights /= weights.sum(axis=1, keepdims=True)
+    return weights.astype(np.float32)
+
+
+# 与 resample_image 相同的三角滤波，但只计算落在滤波范围内的抽头，用于整幅图像的缩放
+def resize_image(img, out_height, out_width):
+    out = _resample_axis(img.astype(np.float32), max(int(out_height), 1), 0)
+    return _resample_axis(out, max(int(out_width), 1), 1)
+
+
+def _resample_axis(img, out_size, axis):
+    in_size = img.shape[axis]
+    scale = in_size / out_size
+    support = max(scale, 1.0)
+    centers = (np.arange(out_size) + 0.5) * scale - 0.5
+    taps = np.floor(centers - support).astype(np.int64)[:, None] + 1 + np.arange(int(np.ceil(2 * support)) + 1)
+    weights = np.clip(1.0 - np.abs(taps - centers[:, None]) / support, 0.0, None)
+    weights[(taps < 0) | (taps >= in_size)] = 0.0
+    weights /= weights.sum(axis=1, keepdims=True)
+    taps = np.clip(taps, 0, in_size - 1)
+    weights = weights.astype(np.float32)
+    out = None
+    for k in range(taps.shape[1]):
+        if axis == 0:
+            part = img[taps[:, k]] * weights[:, k, None, None]
+        else:
+            part = img[:, taps[:, k]] * weights[None, :, k, None]
+        out = part if out is None else out + part
+    return out
+
+
+# 2x2 盒式滤波缩小一半，奇数边先复制最后一行/列
+def halve_image(img):
+    if img.shape[0] % 2:
+        img = np.concatenate([img, img[-1:]], axis=0)
+    if img.shape[1] % 2:
+        img = np.concatenate([img, img[:, -1:]], axis=1)
+    return (img[0::2, 0::2] + img[1::2, 0::2] + img[0::2, 1::2] + img[1::2, 1::2]) * 0.25
+
+
+class DownsamplePyramid:
+    # rgba 为预乘 alpha 的图像。逐级减半直到再减半就小于目标尺寸，再用三角滤波缩放到目标尺寸；
+    # 各个目标尺寸共用已经算好的层级
+    def __init__(self, rgba):
+        self.levels = [rgba]
+
+    def resize(self, height, width):
+        index = 0
+        while True:
+            level = self.levels[index]
+            if level.shape[0] < 2 * height or level.shape[1] < 2 * width:
+                break
+            if index + 1 == len(self.levels):
+                self.levels.append(halve_image(level))
+            index += 1
+        if level.shape[:2] == (height, width):
+            return level
+        return resize_image(level, height, width)
+
+
+def marker_sprite_size(icon, marker_pixels, dpi):
+    # OffsetImage 的 zoom 以 points 为单位，保存时会再乘以 dpi / 72
+    zoom = marker_pixels / utils.marker_icon_pixels * dpi / points_per_inch
+    return max(int(round(icon.shape[0] * zoom)), 1), max(int(round(icon.shape[1] * zoom)), 1)
+
+
+# 经纬度范围到像素网格的映射，y 轴向下。rows 为 (起始行, 行数) 时只覆盖整张网格中的这几行，像素坐标相对起始行
+class PixelGrid:
+    def __init__(self, bounds, width, height, rows=None):
+        self.west, self.south, self.east, self.north = bounds
+        self.width = max(int(width), 1)
+        self.height = max(int(height), 1)
+        self.x_scale = self.width / (self.east - self.west)
+        self.y_scale = self.height / (self.north - self.south)
+        self.top = 0
+        if rows is not None:
+            self.top, self.height = rows
+
+    def to_coords(self, px, py):
+        return self.west + px / self.x_scale, self.north - (py + self.top) / self.y_scale
+
+    def to_pixels(self, coords):
+        coords = np.asarray(coords, dtype=np.float64)
+        px = (coords[:, 0] - self.west) * self.x_scale
+        py = (self.north - coords[:, 1]) * self.y_scale - self.top
+        return np.column_stack([px, py])
+
+    # 覆盖这些经纬度坐标的像素窗口 (x0, y0, x1, y1)，超出网格时为 None
+    def window(self, coords, pad=0.0):
+        return self._window(self.to_pixels(coords), pad)
+
+    def _window(self, xy, pad=0.0):
+        x0 = max(int(np.floor(xy[:, 0].min() - pad)), 0)
+        x1 = min(int(np.ceil(xy[:, 0].max() + pad)), self.width)
+        y0 = max(int(np.floor(xy[:, 1].min() - pad)), 0)
+        y1 = min(int(np.ceil(xy[:, 1].max() + pad)), self.height)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        return x0, y0, x1, y1
+
+
+class RasterCanvas(PixelGrid):
+    def __init__(self, bounds, width, height, rows=None):
+        super().__init__(bounds, width, height, rows)
+        # 预乘 alpha 的 RGBA 画布
+        self.rgba = np.zeros((self.height, self.width, 4), dtype=np.float32)
+        # 绘制的图层数
+        self.layers = 0
+
+    def polygon_mask(self, coords):
+        xy = self.to_pixels(coords)
+        window = self._window(xy)
+        if window is None:
+            return None, None
+        x0, y0, x1, y1 = window
+        from matplotlib.path import Path
+        gx, gy = np.meshgrid(np.arange(x0, x1) + 0.5, np.arange(y0, y1) + 0.5)
+        inside = Path(xy).contains_points(np.column_stack([gx.ravel(), gy.ravel()]))
+        return window, inside.reshape(y1 - y0, x1 - x0)
+
+    def line_mask(self, coords, width_px):
+        xy = self.to_pixels(coords)
+        half = max(width_px / 2, 0.5)
+        window = self._window(xy, pad=half)
+        if window is None:
+            return None, None
+        x0, y0, x1, y1 = window
+        mask = np.zeros((y1 - y0, x1 - x0), dtype=bool)
+        for (ax, ay), (bx, by) in zip(xy[:-1], xy[1:]):
+            seg = self._window(np.array([[ax, ay], [bx, by]]), pad=half)
+            if seg is None:
+                continue
+            sx0, sy0, sx1, sy1 = seg
+            gx, gy = np.meshgrid(np.arange(sx0, sx1) + 0.5, np.arange(sy0, sy1) + 0.5)
+            dx, dy = bx - ax, by - ay
+            length2 = dx * dx + dy * dy
+            t = 0.0 if length2 == 0 else np.clip(((gx - ax) * dx + (gy - ay) * dy) / length2, 0.0, 1.0)
+            dist2 = (gx - ax - t * dx) ** 2 + (gy - ay - t * dy) ** 2
+            mask[sy0 - y0:sy1 - y0, sx0 - x0:sx1 - x0] |= dist2 <= half * half
+        return window, mask
+
+    def composite(self, window, rgb, alpha):
+        x0, y0, x1, y1 = window
+        dst = self.rgba[y0:y1, x0:x1]
+        a = alpha[..., None]
+        dst[..., :3] = rgb * a + dst[..., :3] * (1 - a)
+        dst[..., 3:] = a + dst[..., 3:] * (1 - a)
+
+    def to_uint8(self):
+        return to_uint8(self.rgba)
+
+
+def to_uint8(rgba):
+    return (np.clip(unpremultiply(rgba), 0.0, 1.0) * 255 + 0.5).astype(np.uint8)
+
+
+def unpremultiply(rgba):
+    alpha = rgba[..., 3:]
+    rgb = np.divide(rgba[..., :3], alpha, out=np.zeros_like(rgba[..., :3]), where=alpha > 0)
+    return np.concatenate([rgb, alpha], axis=-1)
+
+
+def premultiply(rgba):
+    return np.concatenate([rgba[..., :3] * rgba[..., 3:], rgba[..., 3:]], axis=-1)
+
+
+# uint8 的非预乘 RGBA 转为预乘 float32，画布的预乘 float32 原样返回
+def to_premultiplied(rgba):
+    if rgba.dtype != np.uint8:
+        return rgba
+    return premultiply(rgba.astype(np.float32) / 255)
+
+
+# 纹理基础大小与 plot_polygon 一致：区域最小边长的10%，返回 (基础大小, 像素高, 像素宽)
+def texture_tile_size(polygon, grid):
+    west, south, east, north = polygon.bounds
+    base_size = min(east - west, north - south) * 0.1
+    return (base_size, max(int(round(base_size * grid.y_scale)), 1),
+            max(int(round(base_size * grid.x_scale)), 1))
+
+
+# window 内各像素中心落在的纹理像素。origin 为纹理左下角在网格中的像素位置，
+# pixels_x/pixels_y 为一个纹理像素对应的网格像素数
+def tiled_texture(tile, window, origin_x, origin_y, pixels_x=1.0, pixels_y=1.0):
+    x0, y0, x1, y1 = window
+    tile_height, tile_width = tile.shape[:2]
+    cols = np.floor((np.arange(x0, x1) + 0.5 - origin_x) / pixels_x).astype(np.int64) % tile_width
+    rows = (tile_height - 1 - np.floor((origin_y - np.arange(y0, y1) - 0.5) / pixels_y).astype(np.int64)) % tile_height
+    return tile[rows[:, None], cols[None, :]]
+
+
+def draw_polygon(canvas, polygon, item: Polygon):
+    window, mask = canvas.polygon_mask(polygon.exterior.coords)
+    if window is None or not mask.any():
+        return
+    west, south, _, _ = polygon.bounds
+    _, tile_height, tile_width = texture_tile_size(polygon, canvas)
+    tile = texture_cache.get_tile(item.texture, tile_height, tile_width)
+    # 纹理从多边形左下角开始平铺
+    origin_x = (west - canvas.west) * canvas.x_scale
+    origin_y = (canvas.north - south) * canvas.y_scale - canvas.top
+    tiled = tiled_texture(tile, window, origin_x, origin_y)
+    alpha = tiled[..., 3] * texture_alpha * mask
+    canvas.composite(window, tiled[..., :3], alpha)
+
+
+# 线的颜色来自 colors.xml，写法为 #RRGGBB 或 #RRGGBBAA，直接解析，不为此导入 matplotlib；其他写法交给 matplotlib
+def color_rgba(color):
+    digits = color[1:] if color.startswith("#") else ""
+    if len(digits) in (6, 8):
+        try:
+            values = tuple(int(digits[index:index + 2], 16) / 255 for index in range(0, len(digits), 2))
+        except ValueError:
+            values = None
+        if values is not None:
+            return values if len(values) == 4 else (*values, 1.0)
+    from matplotlib.colors import to_rgba
+    return to_rgba(color)
+
+
+def color_hex(color):
+    return "#" + "".join(f"{round(value * 255):02x}" for value in color_rgba(color)[:3])
+
+
+def draw_line(canvas, line: LineString, item: Line, dpi):
+    window, mask = canvas.line_mask(line.coords, item.line_width * dpi / points_per_inch)
+    if window is None:
+        return
+    r, g, b, a = color_rgba(item.color)
+    canvas.composite(window, np.array([r, g, b], dtype=np.float32), mask.astype(np.float32) * a)
+
+
+_sprite_cache = {}
+
+
+# 每个图标按目标像素大小只重采样一次
+def marker_sprite(resources, marker: Marker, marker_pixels, dpi):
+    icon = resources.get_image(marker.img_icon)
+    size = marker_sprite_size(icon, marker_pixels, dpi)
+    cache_key = (marker.img_icon, size)
+    if cache_key not in _sprite_cache:
+        sprite = resample_image(icon, *size)
+        if sprite.shape[-1] == 3:
+            sprite = np.concatenate([sprite, np.ones(sprite.shape[:2] + (1,), dtype=sprite.dtype)], axis=-1)
+        _sprite_cache[cache_key] = sprite
+    return _sprite_cache[cache_key]
+
+
+def sprite_stamps(grid, sprite, coords):
+    xy = grid.to_pixels(coords)
+    lefts = np.round(xy[:, 0] - sprite.shape[1] / 2).astype(np.int64)
+    tops = np.round(xy[:, 1] - sprite.shape[0] / 2).astype(np.int64)
+    return [(sprite, left, top) for left, top in zip(lefts, tops)]
+
+
+# 给每个图章分配层号：与之前重叠的图章层号 +1。同一层内互不重叠，可以一次性批量混合，且保持原来的绘制顺序
+def _stamp_depths(stamps):
+    cell = max(max(sprite.shape[:2]) for sprite, _, _ in stamps)
+    grid = {}
+    depths = []
+    for index, (sprite, left, top) in enumerate(stamps):
+        height, width = sprite.shape[:2]
+        cell_x, cell_y = left // cell, top // cell
+        depth = 0
+        for gx in (cell_x - 1, cell_x, cell_x + 1):
+            for gy in (cell_y - 1, cell_y, cell_y + 1):
+                for other in grid.get((gx, gy), ()):
+                    other_sprite, other_left, other_top = stamps[other]
+                    if (left < other_left + other_sprite.shape[1] and other_left < left + width
+                            and top < other_top + other_sprite.shape[0] and other_top < top + height):
+                        depth = max(depth, depths[other] + 1)
+        depths.append(depth)
+        grid.setdefault((cell_x, cell_y), []).append(index)
+    return depths
+
+
+def _composite_stamps(rgba, sprite, lefts, tops):
+    height, width = sprite.shape[:2]
+    ys = tops[:, None, None] + np.arange(height)[None, :, None]
+    xs = lefts[:, None, None] + np.arange(width)[None, None, :]
+    ys, xs = np.broadcast_arrays(ys, xs)
+    valid = (ys >= 0) & (ys < rgba.shape[0]) & (xs >= 0) & (xs < rgba.shape[1]) & (sprite[None, ..., 3] > 0)
+    src = np.broadcast_to(sprite, ys.shape + (sprite.shape[-1],))[valid]
+    ys, xs = ys[valid], xs[valid]
+    alpha = src[:, 3:]
+    dst = rgba[ys, xs]
+    rgba[ys, xs, :3] = src[:, :3] * alpha + dst[:, :3] * (1 - alpha)
+    rgba[ys, xs, 3:] = alpha + dst[:, 3:] * (1 - alpha)
+
+
+def stamp_sprites(rgba, stamps):
+    if not stamps:
+        return
+    depths = np.array(_stamp_depths(stamps))
+    for depth in range(depths.max() + 1):
+        batches = {}
+        for index in np.flatnonzero(depths == depth):
+            sprite, left, top = stamps[index]
+            lefts, tops = batches.setdefault(id(sprite), (sprite, [], []))[1:]
+            lefts.append(left)
+            tops.append(top)
+        for sprite, lefts, tops in batches.values():
+            _composite_stamps(rgba, sprite, np.array(lefts), np.array(tops))
+
+
+# 把一组标记盖到只覆盖这些标记的 RGBA 图层上，返回图层（非预乘）和它的经纬度范围
+def marker_layer(grid, stamps):
+    x0 = max(min(left for _, left, _ in stamps), 0)
+    y0 = max(min(top for _, _, top in stamps), 0)
+    x1 = min(max(left + sprite.shape[1] for sprite, left, _ in stamps), grid.width)
+    y1 = min(max(top + sprite.shape[0] for sprite, _, top in stamps), grid.height)
+    if x1 <= x0 or y1 <= y0:
+        return None, None
+    rgba = np.zeros((y1 - y0, x1 - x0, 4), dtype=np.float32)
+    stamp_sprites(rgba, [(sprite, left - x0, top - y0) for sprite, left, top in stamps])
+    west, north = grid.to_coords(x0, y0)
+    east, south = grid.to_coords(x1, y1)
+    return unpremultiply(rgba), [west, east, south, north]
+
+
+# 输出图的像素尺寸，各渲染器共用。与原来 matplotlib 的 set_aspect("equal") 相同：经度和纬度按同一比例缩放，
+# 在按米计算的图幅中较紧的一边铺满，所以高度按经纬度范围之比而不是米数计算
+def canvas_size(hole_boundary, scale=1):
+    west, south, east, north = hole_boundary.bounds
+    fig_width, fig_height, adjusted_dpi, _, _ = utils.calculate_pixel_resolution(west, south, east, north)
+    width, height = fig_width * adjusted_dpi * scale, fig_height * adjusted_dpi * scale
+    ratio = (north - south) / (east - west)
+    if height > width * ratio:
+        height = width * ratio
+    else:
+        width = height / ratio
+    return max(round(width), 1), max(round(height), 1)
+
+
+# 按绘制顺序返回 [(类型, 几何, item)]，类型为 polygon、line 或 marker（几何为 N x 2 的坐标）。
+# 与 matplotlib 路径一致：先画球洞边界，再按 gdf 顺序画其余要素，最后画标记
+def hole_layers(hole_boundary, features, markers, resources):
+    layers = [(resources.holeBoundary.zorder, "polygon", hole_boundary, resources.holeBoundary)]
+    for geometry, item in features:
+        if isinstance(geometry, LineString):
+            layers.append((item.zorder, "line", geometry, item))
+        elif isinstance(geometry, ShapelyPolygon):
+            layers.append((item.zorder, "polygon", geometry, item))
+    for marker, coords in markers:
+        layers.append((marker.zorder, "marker", coords, marker))
+    # sorted 是稳定排序，相同 zorder 保持添加顺序，和 matplotlib 的绘制顺序一致
+    return [layer[1:] for layer in sorted(layers, key=lambda layer: layer[0])]
+
+
+# scale: 相对于标准分辨率（utils.meters_per_pixel）的倍数，线宽和标记随之缩放。
+# rows 为 (起始行, 行数) 时只画整洞画布中的这几行，用于分条渲染
+def rasterize_hole(hole_boundary, features, markers, resources, scale=1, rows=None):
+    _, _, adjusted_dpi, _, marker_pixels = utils.calculate_pixel_resolution(*hole_boundary.bounds)
+    adjusted_dpi = adjusted_dpi * scale
+    canvas = RasterCanvas(hole_boundary.bounds, *canvas_size(hole_boundary, scale), rows)
+    logger.info(f"Raster canvas (pixels): width={canvas.width}, height={canvas.height}")
+    layers = hole_layers(hole_boundary, features, markers, resources)
+    for kind, geometry, item in layers:
+        if kind == "polygon":
+            draw_polygon(canvas, geometry, item)
+        elif kind == "line":
+            draw_line(canvas, geometry, item, adjusted_dpi)
+        else:
+            sprite = marker_sprite(resources, item, marker_pixels, adjusted_dpi)
+            stamp_sprites(canvas.rgba, sprite_stamps(canvas, sprite, geometry))
+    canvas.layers = len(layers)
+    return canvas
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+import hole_reader
+from utils import logger
+
+manifest_file_name = ".render_manifest.json"
+# 渲染代码有影响输出的改动时递增，使所有缓存失效
+cache_version = 3
+# 每记录这么多个洞就写一次清单，避免中途被杀掉后丢失进度
+save_interval = 50
+
+_file_digest_cache = {}
+
+
+def file_digest(path):
+    stat = os.stat(path)
+    cache_key = (path, stat.st_mtime_ns, stat.st_size)
+    if cache_key not in _file_digest_cache:
+        with open(path, "rb") as file:
+            _file_digest_cache[cache_key] = hashlib.sha256(file.read()).hexdigest()
+    return _file_digest_cache[cache_key]
+
+
+def hole_digest(hole, resource_files, settings):
+    digest = hashlib.sha256()
+    # 按坐标的二进制值计算，洞来自 JSONL 还是 hole_store 得到的哈希相同
+    for gpsItem in hole["gpsItems"]:
+        shape = hole_reader.shape_array(gpsItem["shape"])
+        digest.update(f"{gpsItem['itemType']}:{len(shape)}:".encode("utf-8"))
+        digest.update(np.ascontiguousarray(shape, dtype=np.float64).tobytes())
+    for path in sorted(resource_files):
+        digest.update(os.path.basename(path).encode("utf-8"))
+        digest.update(file_digest(path).encode("utf-8") if os.path.exists(path) else b"missing")
+    digest.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    digest.update(str(cache_version).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class RenderCache:
+    def __init__(self, output_folder_path, on_generated=None):
+        self.output_folder_path = output_folder_path
+        self.manifest_path = os.path.join(output_folder_path, manifest_file_name)
+        self.on_generated = on_generated
+        self.holes = self._load()
+        # digest -> 已有输出的洞，用于几何完全相同的洞直接复用
+        self.renders = {}
+        for key, entry in self.holes.items():
+            self.renders.setdefault(entry["digest"], key)
+        self._pending = {}
+        self._in_flight = {}
+        self._unsaved = 0
+        self.skipped = 0
+        self.reused = 0
+
+    def _load(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as file:
+                manifest = json.load(file)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable render manifest: {e}")
+            return {}
+        if manifest.get("version") != cache_version:
+            return {}
+        return manifest.get("holes", {})
+
+    def save(self):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"version": cache_version, "holes": self.holes}, file)
+        os.replace(tmp_path, self.manifest_path)
+        self._unsaved = 0
+
+    def _output_paths(self, key):
+        return [os.path.join(self.output_folder_path, file) for file in self.holes[key]["files"]]
+
+    def _find_render(self, digest):
+        key = self.renders.get(digest)
+        if key is None or self.holes.get(key, {}).get("digest") != digest:
+            return None
+        paths = self._output_paths(key)
+        return paths if all(os.path.exists(path) for path in paths) else None
+
+    # output_file_paths: 一个洞的所有输出文件，第一个是主输出
+    def _record(self, key, digest, output_file_paths):
+        files = [os.path.relpath(path, self.output_folder_path) for path in output_file_paths]
+        self.holes[key] = {"digest": digest, "files": files}
+        self.renders[digest] = key
+        self._unsaved += 1
+        if self._unsaved >= save_interval:
+            self.save()
+
+    def _reuse(self, source_paths, key, digest, output_file_paths):
+        for source_path, output_file_path in zip(source_paths, output_file_paths):
+            if os.path.abspath(source_path) != os.path.abspath(output_file_path):
+                os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
+                shutil.copyfile(source_path, output_file_path)
+        self._record(key, digest, output_file_paths)
+        self.reused += 1
+        if self.on_generated:
+            self.on_generated(key, output_file_paths[0])
+
+    # 返回 True 表示这个洞需要重新渲染
+    def plan(self, key, digest, output_file_paths):
+        entry = self.holes.get(key)
+        if entry and entry["digest"] == digest and all(os.path.exists(path) for path in output_file_paths):
+            self.skipped += 1
+            return False
+        source_paths = self._find_render(digest)
+        if source_paths:
+            self._reuse(source_paths, key, digest, output_file_paths)
+            return False
+        # 相同内容的洞正在渲染，等它完成后直接复制
+        if digest in self._in_flight:
+            self._in_flight[digest].append((key, output_file_paths))
+            return False
+        self._in_flight[digest] = []
+        self._pending[key] = (digest, output_file_paths)
+        return True
+
+    def done(self, key, output_file_path):
+        if key not in self._pending:
+            return
+        digest, output_file_paths = self._pending.pop(key)
+        waiting = self._in_flight.pop(digest, [])
+        if output_file_path is None:
+            for waiting_key, _ in waiting:
+                logger.error(f"Skipped hole {waiting_key}: identical hole {key} failed to render")
+            return
+        self._record(key, digest, output_file_paths)
+        for waiting_key, waiting_paths in waiting:
+            self._reuse(output_file_paths, waiting_key, digest, waiting_paths)
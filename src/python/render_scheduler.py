@@ -0,0 +1,106 @@
+import heapq
+import itertools
+import threading
+
+# 一个渲染任务中各洞的优先队列。每个洞可以先出一张低分辨率预览，再出完整分辨率的图。
+# 排序为 (提升顺序, 预览/完整, 加入顺序)：prioritize 选中的洞或球场排在最前，最近一次选中的最先；
+# 同一优先级内先出完所有预览再出完整图。prioritize、cancel 可以在其他线程中随时调用，只影响还没有取出的任务
+
+
+class HoleTask:
+    def __init__(self, club_id, course_id, hole_number, course_index, preview, order):
+        self.club_id = club_id
+        self.course_id = course_id
+        self.hole_number = hole_number
+        # 球场在输入中的下标，用于随机读取
+        self.course_index = course_index
+        self.preview = preview
+        self.order = order
+
+    @property
+    def hole(self):
+        return self.club_id, self.course_id, self.hole_number
+
+    @property
+    def course(self):
+        return self.club_id, self.course_id
+
+
+class RenderScheduler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heap = []
+        self._added = set()
+        self._orders = itertools.count()
+        # (clubId, courseId) 或 (clubId, courseId, holeNumber) -> 提升顺序，越小越先
+        self._boosts = {}
+        self._boost_ranks = itertools.count(1)
+        # 取消的球场和洞；之后再加入的同一个洞也直接丢弃
+        self._cancelled = set()
+        self._cancelled_all = False
+
+    def __len__(self):
+        with self._lock:
+            return len(self._heap)
+
+    def _priority(self, task):
+        boost = min(self._boosts.get(task.hole, 0), self._boosts.get(task.course, 0))
+        return boost, 0 if task.preview else 1, task.order
+
+    def _is_cancelled(self, task):
+        return self._cancelled_all or task.hole in self._cancelled or task.course in self._cancelled
+
+    def _push(self, task):
+        # 优先级各不相同，堆中不会比较到 HoleTask
+        heapq.heappush(self._heap, (self._priority(task), task))
+
+    # 同一个洞只加入一次；返回 False 表示已经加入过或已被取消
+    def add(self, club_id, course_id, hole_number, course_index, preview=False):
+        with self._lock:
+            key = (club_id, course_id, hole_number)
+            if key in self._added:
+                return False
+            self._added.add(key)
+            order = next(self._orders)
+            task = HoleTask(club_id, course_id, hole_number, course_index, False, order)
+            if self._is_cancelled(task):
+                return False
+            if preview:
+                self._push(HoleTask(club_id, course_id, hole_number, course_index, True, order))
+            self._push(task)
+            return True
+
+    # 取出下一个任务，队列为空时返回 None
+    def pop(self):
+        with self._lock:
+            if not self._heap:
+                return None
+            return heapq.heappop(self._heap)[1]
+
+    def _rebuild(self, tasks):
+        self._heap = [(self._priority(task), task) for task in tasks]
+        heapq.heapify(self._heap)
+
+    # holes: (clubId, courseId, holeNumber) 列表，courses: (clubId, courseId) 列表；返回受影响的排队任务数
+    def prioritize(self, holes=(), courses=()):
+        with self._lock:
+            rank = -next(self._boost_ranks)
+            keys = set(holes) | set(courses)
+            for key in keys:
+                self._boosts[key] = rank
+            tasks = [task for _, task in self._heap]
+            self._rebuild(tasks)
+            return sum(1 for task in tasks if task.hole in keys or task.course in keys)
+
+    # 不带参数时取消全部；返回移除的排队任务数
+    def cancel(self, holes=None, courses=None):
+        with self._lock:
+            if holes is None and courses is None:
+                self._cancelled_all = True
+            else:
+                self._cancelled.update(holes or ())
+                self._cancelled.update(courses or ())
+            tasks = [task for _, task in self._heap]
+            kept = [task for task in tasks if not self._is_cancelled(task)]
+            self._rebuild(kept)
+            return len(tasks) - len(kept)
@@ -0,0 +1,259 @@
+import functools
+import itertools
+import json
+import queue
+import sys
+import threading
+import time
+
+import hole_reader
+import render_scheduler
+from utils import logger
+
+# 以换行分隔的 JSON-RPC 2.0 消息，通过 stdin/stdout 与 Electron 通信
+# 请求: {"jsonrpc": "2.0", "id": 1, "method": "render", "params": {"root_data_dir": "..."}}
+# 响应: {"jsonrpc": "2.0", "id": 1, "result": {"job_id": "job-1"}}
+# 通知: {"jsonrpc": "2.0", "method": "hole_rendered", "params": {"job_id": "job-1", "hole": "...", "path": "..."}}
+# 洞和球场分别写作 clubId_courseId_holeNumber、clubId_courseId，用于 cancel、prioritize 只针对部分洞
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+# 保留最近完成的任务状态，供 status 查询
+max_finished_jobs = 100
+
+
+class RenderJob:
+    def __init__(self, job_id, params):
+        self.job_id = job_id
+        self.params = params
+        self.state = "queued"
+        self.cancel_event = threading.Event()
+        # 任务内各洞的预览优先队列，排队和运行中都可以调整
+        self.scheduler = render_scheduler.RenderScheduler()
+        self.rendered = 0
+        self.previews = 0
+        self.failed = 0
+        self.current = None
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+
+    def to_dict(self):
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = round((self.finished_at or time.perf_counter()) - self.started_at, 3)
+        return {
+            "job_id": self.job_id,
+            "state": self.state,
+            "rendered": self.rendered,
+            "previews": self.previews,
+            "queued": len(self.scheduler),
+            "failed": self.failed,
+            "current": self.current,
+            "elapsed": elapsed,
+            "error": self.error,
+        }
+
+
+def parse_course_key(text):
+    parts = text.strip().rsplit("_", 1)
+    if len(parts) != 2:
+        raise ValueError(f"Invalid course key: {text}")
+    return parts[0], parts[1]
+
+
+# params 中的 holes、courses 列表，返回 (洞, 球场)；都没有时返回 (None, None)
+def parse_targets(params):
+    holes = params.get("holes")
+    courses = params.get("courses")
+    if holes is None and courses is None:
+        return None, None
+    return [hole_reader.parse_hole_key(key) for key in holes or []], [parse_course_key(key) for key in courses or []]
+
+
+class RenderServer:
+    # run_job(params, on_result, cancel_event, scheduler) 在渲染线程中执行一个任务
+    def __init__(self, run_job, input_stream=None, output_stream=None):
+        self.run_job = run_job
+        self.input_stream = input_stream or sys.stdin
+        self.output_stream = output_stream or sys.stdout
+        self._write_lock = threading.Lock()
+        self._jobs = {}
+        self._jobs_lock = threading.Lock()
+        self._job_queue = queue.Queue()
+        self._new_jobs = []
+        self._job_ids = itertools.count(1)
+        self._worker = threading.Thread(target=self._run_jobs, name="render-worker", daemon=True)
+
+    def send(self, message):
+        message["jsonrpc"] = "2.0"
+        line = json.dumps(message, ensure_ascii=False)
+        with self._write_lock:
+            self.output_stream.write(line + "\n")
+            self.output_stream.flush()
+
+    def notify(self, method, params):
+        self.send({"method": method, "params": params})
+
+    def serve_forever(self):
+        self._worker.start()
+        self.notify("ready", {})
+        for line in self.input_stream:
+            line = line.strip()
+            if not line:
+                continue
+            if not self.handle_line(line):
+                break
+        self._shutdown()
+
+    def handle_line(self, line):
+        try:
+            message = json.loads(line)
+        except ValueError as e:
+            self.send({"id": None, "error": {"code": PARSE_ERROR, "message": f"Parse error: {e}"}})
+            return True
+        if not isinstance(message, dict) or not isinstance(message.get("method"), str):
+            self.send({"id": None, "error": {"code": INVALID_REQUEST, "message": "Invalid request"}})
+            return True
+        request_id = message.get("id")
+        method = message["method"]
+        params = message.get("params") or {}
+        handler = getattr(self, f"_handle_{method}", None)
+        if handler is None:
+            self._respond_error(request_id, METHOD_NOT_FOUND, f"Method not found: {method}")
+            return True
+        try:
+            result = handler(params)
+        except ValueError as e:
+            self._respond_error(request_id, INVALID_PARAMS, str(e))
+            return True
+        except Exception as e:
+            logger.error(f"Error handling {method}: {e}")
+            self._respond_error(request_id, INTERNAL_ERROR, str(e))
+            return True
+        if request_id is not None:
+            self.send({"id": request_id, "result": result})
+        # 新任务在响应发出后才入队，保证客户端先拿到 job_id 再收到该任务的通知
+        while self._new_jobs:
+            self._job_queue.put(self._new_jobs.pop(0))
+        return method != "shutdown"
+
+    def _respond_error(self, request_id, code, message):
+        if request_id is not None:
+            self.send({"id": request_id, "error": {"code": code, "message": message}})
+
+    def _handle_render(self, params):
+        if not params.get("root_data_dir"):
+            raise ValueError("root_data_dir is required")
+        job = RenderJob(f"job-{next(self._job_ids)}", params)
+        with self._jobs_lock:
+            self._jobs[job.job_id] = job
+        self._new_jobs.append(job)
+        return {"job_id": job.job_id}
+
+    def _get_job(self, job_id):
+        with self._jobs_lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise ValueError(f"Unknown job: {job_id}")
+        return job
+
+    def _active_jobs(self):
+        with self._jobs_lock:
+            return [job for job in self._jobs.values() if job.state in ("queued", "running")]
+
+    def _target_jobs(self, params):
+        jobs = [self._get_job(params["job_id"])] if params.get("job_id") else self._active_jobs()
+        return [job for job in jobs if job.state in ("queued", "running")]
+
+    # 不带 job_id 时针对所有排队和运行中的任务。带 holes/courses 时只取消这些洞，任务继续渲染其余的洞，
+    # 否则取消整个任务；常驻进程和其中的缓存都保留
+    def _handle_cancel(self, params):
+        holes, courses = parse_targets(params)
+        cancelled = []
+        tasks = 0
+        for job in self._target_jobs(params):
+            if holes is None:
+                job.cancel_event.set()
+            tasks += job.scheduler.cancel(holes, courses)
+            cancelled.append(job.job_id)
+        return {"cancelled": cancelled, "tasks": tasks}
+
+    # 把 holes/courses 提到队列最前（先预览再完整分辨率），最近一次调用的最先；对还没开始的任务同样有效
+    def _handle_prioritize(self, params):
+        holes, courses = parse_targets(params)
+        if holes is None:
+            raise ValueError("holes or courses is required")
+        jobs = self._target_jobs(params)
+        tasks = sum(job.scheduler.prioritize(holes, courses) for job in jobs)
+        return {"jobs": [job.job_id for job in jobs], "tasks": tasks}
+
+    def _handle_status(self, params):
+        if params.get("job_id"):
+            return self._get_job(params["job_id"]).to_dict()
+        with self._jobs_lock:
+            jobs = list(self._jobs.values())
+        return {"jobs": [job.to_dict() for job in jobs]}
+
+    def _handle_shutdown(self, params):
+        return {}
+
+    def _shutdown(self):
+        for job in self._active_jobs():
+            job.cancel_event.set()
+        self._job_queue.put(None)
+        self._worker.join()
+
+    def _run_jobs(self):
+        while True:
+            job = self._job_queue.get()
+            if job is None:
+                return
+            if job.cancel_event.is_set():
+                job.state = "cancelled"
+                job.finished_at = time.perf_counter()
+                self.notify("job_finished", job.to_dict())
+                continue
+            job.state = "running"
+            job.started_at = time.perf_counter()
+            self.notify("job_started", {"job_id": job.job_id})
+            try:
+                self.run_job(job.params, functools.partial(self._on_result, job), job.cancel_event, job.scheduler)
+                job.state = "cancelled" if job.cancel_event.is_set() else "finished"
+            except Exception as e:
+                logger.error(f"Render job {job.job_id} failed: {e}")
+                job.state = "failed"
+                job.error = f"{type(e).__name__}: {e}"
+            job.finished_at = time.perf_counter()
+            job.current = None
+            self.notify("job_finished", job.to_dict())
+            self._forget_finished_jobs()
+
+    def _on_result(self, job, hole_key, output_file_path, error=None, preview=False):
+        if preview:
+            # 预览失败不计入 failed，完整分辨率的渲染会再报告一次
+            if error:
+                logger.warning(f"Preview failed: {error}, hole: {hole_key}")
+            elif output_file_path:
+                job.previews += 1
+                self.notify("hole_preview", {"job_id": job.job_id, "hole": hole_key, "path": output_file_path})
+            return
+        job.current = hole_key
+        if error:
+            job.failed += 1
+            self.notify("hole_failed", {"job_id": job.job_id, "hole": hole_key, "error": error})
+            return
+        if not output_file_path:
+            self.notify("hole_skipped", {"job_id": job.job_id, "hole": hole_key})
+            return
+        job.rendered += 1
+        self.notify("hole_rendered", {"job_id": job.job_id, "hole": hole_key, "path": output_file_path})
+
+    def _forget_finished_jobs(self):
+        with self._jobs_lock:
+            finished = [job_id for job_id, job in self._jobs.items() if job.finished_at is not None]
+            for job_id in finished[:-max_finished_jobs]:
+                del self._jobs[job_id]
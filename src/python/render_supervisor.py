@@ -0,0 +1,236 @@
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from collections import deque
+from multiprocessing.connection import wait
+
+from utils import logger
+
+# 受监督的渲染：每个工作进程一次只渲染一个洞，主进程按墙钟时间和常驻内存监控它。
+# 超出预算或意外退出的工作进程被杀掉并换一个新的，其他进程照常渲染；出问题的洞排到最后重试，
+# 重试用完后连同原因写进输出目录的隔离清单，之后的运行跳过这些洞
+quarantine_file_name = ".render_quarantine.json"
+default_hole_timeout = 120
+default_max_rss_mb = 4096
+default_retries = 1
+# 检查超时和内存的间隔（秒）
+poll_interval = 0.5
+
+
+# 其他进程当前的常驻内存；Linux 读 /proc，macOS 用 ps，Windows 不统计，只按时间监控
+def process_rss_mb(pid):
+    if sys.platform.startswith("linux"):
+        try:
+            with open(f"/proc/{pid}/statm", "r") as file:
+                return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+        except (OSError, ValueError, IndexError):
+            return None
+    if sys.platform == "darwin":
+        try:
+            output = subprocess.run(["ps", "-o", "rss=", "-p", str(pid)], capture_output=True, text=True,
+                                    timeout=5).stdout
+            return int(output.strip()) / 1024
+        except (OSError, ValueError, subprocess.SubprocessError):
+            return None
+    return None
+
+
+class HoleLimits:
+    def __init__(self, timeout=default_hole_timeout, max_rss_mb=default_max_rss_mb, retries=default_retries):
+        if timeout <= 0 or max_rss_mb <= 0:
+            raise ValueError(f"Hole limits must be positive: {timeout}, {max_rss_mb}")
+        if retries < 0:
+            raise ValueError(f"Retries must not be negative: {retries}")
+        self.timeout = timeout
+        self.max_rss_mb = max_rss_mb
+        self.retries = retries
+
+
+# 隔离清单：hole_key -> {clubId, courseId, holeNumber, reason, attempts}，每次变化都立即写盘
+class Quarantine:
+    def __init__(self, output_folder_path):
+        self.path = os.path.join(output_folder_path, quarantine_file_name)
+        self.holes = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                return json.load(file).get("holes", {})
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable quarantine list: {e}")
+            return {}
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"holes": self.holes}, file, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def add(self, key, club_id, course_id, hole_number, reason, attempts):
+        self.holes[key] = {"clubId": club_id, "courseId": course_id, "holeNumber": hole_number, "reason": reason,
+                           "attempts": attempts}
+        self.save()
+
+    def remove(self, key):
+        if self.holes.pop(key, None) is not None:
+            self.save()
+
+
+def _worker_main(conn, initializer, initargs, render):
+    initializer(*initargs)
+    # 初始化完成后才开始计时
+    conn.send(None)
+    while True:
+        args = conn.recv()
+        if args is None:
+            return
+        conn.send(render(*args))
+
+
+class _Task:
+    def __init__(self, key, args, attempts=1):
+        self.key = key
+        self.args = args
+        self.attempts = attempts
+
+
+class _Worker:
+    def __init__(self, context, initializer, initargs, render):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, initializer, initargs, render),
+                                       daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.task = None
+        self.started = None
+
+    def submit(self, task):
+        self.task = task
+        self.started = time.monotonic()
+        self.conn.send(task.args)
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class RenderSupervisor:
+    # initializer(*initargs) 在每个工作进程启动时调用一次，render(*args) 渲染一个洞并返回可序列化的结果
+    def __init__(self, workers, initializer, initargs, render, limits=None, quarantine=None):
+        self.workers = max(workers, 1)
+        self.initializer = initializer
+        self.initargs = initargs
+        self.render = render
+        self.limits = limits or HoleLimits()
+        self.quarantine = quarantine
+        # 常驻服务中有读 stdin 的线程，fork 出的子进程关闭 stdin 时会卡在它持有的锁上，统一用 spawn
+        self.context = multiprocessing.get_context("spawn")
+        self.restarted = 0
+
+    def _start(self):
+        return _Worker(self.context, self.initializer, self.initargs, self.render)
+
+    # tasks: 可迭代的 (key, (clubId, courseId, holeNumber), args)，只在有空闲进程时才取下一个。
+    # on_done(hole, result, error)：正常完成时 result 为 render 的返回值；超出预算或进程退出且重试用完时 result 为 None
+    def run(self, tasks, on_done):
+        tasks = iter(tasks)
+        retry = deque()
+        exhausted = False
+        workers = [self._start() for _ in range(self.workers)]
+        holes = {}
+
+        def next_task():
+            nonlocal exhausted
+            if not exhausted:
+                for key, hole, args in tasks:
+                    holes[key] = hole
+                    return _Task(key, args)
+                exhausted = True
+            return retry.popleft() if retry else None
+
+        def fail(worker, reason):
+            task = worker.task
+            worker.kill()
+            workers[workers.index(worker)] = self._start()
+            self.restarted += 1
+            if task is None:
+                logger.warning(f"Render worker restarted: {reason}")
+                return
+            if task.attempts <= self.limits.retries:
+                logger.warning(f"Hole {task.key} failed: {reason}, retrying after the other holes")
+                retry.append(_Task(task.key, task.args, task.attempts + 1))
+                return
+            logger.error(f"Hole {task.key} quarantined after {task.attempts} attempts: {reason}")
+            if self.quarantine is not None:
+                self.quarantine.add(task.key, *holes[task.key], reason, task.attempts)
+            on_done(holes.pop(task.key), None, reason)
+
+        try:
+            while True:
+                for worker in workers:
+                    if worker.ready and worker.task is None:
+                        task = next_task()
+                        if task is None:
+                            break
+                        worker.submit(task)
+                if exhausted and not retry and all(worker.task is None for worker in workers):
+                    return
+                wait([worker.conn for worker in workers] + [worker.process.sentinel for worker in workers],
+                     timeout=poll_interval)
+                for worker in list(workers):
+                    if worker.conn.poll():
+                        try:
+                            result = worker.conn.recv()
+                        except (EOFError, OSError):
+                            self._check_started(worker)
+                            fail(worker, f"worker exited with code {worker.process.exitcode}")
+                            continue
+                        if not worker.ready:
+                            worker.ready = True
+                            continue
+                        task, worker.task = worker.task, None
+                        if self.quarantine is not None:
+                            self.quarantine.remove(task.key)
+                        on_done(holes.pop(task.key), result, None)
+                    elif not worker.process.is_alive():
+                        self._check_started(worker)
+                        fail(worker, f"worker exited with code {worker.process.exitcode}")
+                    elif worker.task is not None:
+                        elapsed = time.monotonic() - worker.started
+                        rss_mb = process_rss_mb(worker.process.pid)
+                        if elapsed > self.limits.timeout:
+                            fail(worker, f"timed out after {elapsed:.0f} s")
+                        elif rss_mb is not None and rss_mb > self.limits.max_rss_mb:
+                            fail(worker, f"resident memory {rss_mb:.0f} MB over {self.limits.max_rss_mb:g} MB")
+        finally:
+            for worker in workers:
+                if worker.task is None and worker.process.is_alive():
+                    worker.stop()
+                else:
+                    worker.kill()
+            if self.restarted:
+                logger.info(f"Render supervisor restarted {self.restarted} workers")
+
+    # 进程在初始化时就退出说明资源等有问题，重启也无济于事
+    def _check_started(self, worker):
+        if not worker.ready:
+            worker.process.join()
+            raise RuntimeError(f"Render worker failed to start, exit code {worker.process.exitcode}")
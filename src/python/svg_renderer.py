@@ -0,0 +1,166 @@
+import base64
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+import raster_renderer
+import texture_cache
+import utils
+from utils import logger
+
+# 矢量输出：与 numpy 渲染器相同的图层顺序、纹理平铺和尺寸规则，写成 SVG。
+# 每种纹理只内嵌一次，作为 1x1 的 <pattern>，各多边形的 pattern 通过 xlink:href 引用它，只带自己的平铺大小和起点；
+# 每种标记图标是一个 <symbol>，每个标记一个 <use>。坐标以最精细输出的 coordinate_pixels 个像素为单位取整，
+# 路径用整数相对坐标，量化后重合的顶点去掉
+coordinate_pixels = 0.25
+
+
+def _number(value):
+    text = f"{value:.3f}".rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+
+_embedded_cache = {}
+
+
+# rgba: float 的非预乘 RGBA；按 (文件, 像素高, 像素宽) 缓存编码好的 data URI
+def _data_uri(cache_key, rgba):
+    if cache_key not in _embedded_cache:
+        image = Image.fromarray((np.clip(rgba, 0.0, 1.0) * 255 + 0.5).astype(np.uint8), "RGBA")
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG", optimize=True)
+        _embedded_cache[cache_key] = "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+    return _embedded_cache[cache_key]
+
+
+class SvgDocument:
+    # scale 为要输出的最大倍数，决定坐标精度和内嵌纹理、图标的像素大小；各尺寸共用同一份文档，只有宽高不同
+    def __init__(self, hole_boundary, items, markers, resources, scale=1):
+        _, _, self.dpi, _, self.marker_pixels = utils.calculate_pixel_resolution(*hole_boundary.bounds)
+        self.grid = raster_renderer.PixelGrid(hole_boundary.bounds, *raster_renderer.canvas_size(hole_boundary))
+        self.resources = resources
+        self.scale = scale
+        # 标准分辨率下一个坐标单位的像素数
+        self.unit = coordinate_pixels / scale
+        self.layers = raster_renderer.hole_layers(hole_boundary, items, markers, resources)
+        self._body = None
+
+    def to_units(self, coords):
+        return np.rint(self.grid.to_pixels(coords) / self.unit).astype(np.int64)
+
+    def path_data(self, coords, closed):
+        points = self.to_units(coords)
+        if closed and len(points) > 1 and (points[-1] == points[0]).all():
+            points = points[:-1]
+        deltas = np.diff(points, axis=0)
+        deltas = deltas[(deltas != 0).any(axis=1)]
+        if closed and len(deltas) < 2:
+            return None
+        data = f"M{points[0, 0]} {points[0, 1]}"
+        if len(deltas):
+            data += "l" + " ".join(f"{dx} {dy}" for dx, dy in deltas.tolist())
+        return data + "z" if closed else data
+
+    def _texture_pattern(self, item, polygons):
+        # 内嵌的纹理按这张图中最大的平铺尺寸重采样，不超过原图
+        tile_sizes = [raster_renderer.texture_tile_size(polygon, self.grid)[1:] for polygon in polygons]
+        source = self.resources.get_image(item.texture)
+        height = min(max(round(size[0] * self.scale) for size in tile_sizes), source.shape[0])
+        width = min(max(round(size[1] * self.scale) for size in tile_sizes), source.shape[1])
+        tile = texture_cache.get_tile(item.texture, max(height, 1), max(width, 1))
+        uri = _data_uri((item.texture, tile.shape[0], tile.shape[1]), tile)
+        return (f'<pattern id="t-{item.type.value}" patternUnits="userSpaceOnUse" width="1" height="1">'
+                f'<image width="1" height="1" preserveAspectRatio="none" xlink:href="{uri}"/></pattern>')
+
+    def _marker_symbol(self, marker):
+        sprite = raster_renderer.marker_sprite(self.resources, marker, self.marker_pixels, self.dpi * self.scale)
+        icon = self.resources.get_image(marker.img_icon)
+        zoom = self.marker_pixels / utils.marker_icon_pixels * self.dpi / raster_renderer.points_per_inch
+        width, height = icon.shape[1] * zoom / self.unit, icon.shape[0] * zoom / self.unit
+        uri = _data_uri((marker.img_icon, sprite.shape[0], sprite.shape[1]), sprite)
+        return (width, height), (f'<symbol id="m-{marker.type.value}"><image width="{_number(width)}" '
+                                 f'height="{_number(height)}" preserveAspectRatio="none" xlink:href="{uri}"/>'
+                                 f'</symbol>')
+
+    def _polygon(self, polygon, item, index):
+        data = self.path_data(polygon.exterior.coords, True)
+        if data is None:
+            return None, None
+        base_size = raster_renderer.texture_tile_size(polygon, self.grid)[0]
+        west, south, _, _ = polygon.bounds
+        tile_width = base_size * self.grid.x_scale / self.unit
+        tile_height = base_size * self.grid.y_scale / self.unit
+        # 与 draw_polygon 一致：纹理从多边形左下角开始平铺
+        origin_x, origin_y = self.grid.to_pixels([(west, south)])[0] / self.unit
+        pattern = (f'<pattern id="p{index}" xlink:href="#t-{item.type.value}" patternTransform="matrix('
+                   f'{_number(tile_width)} 0 0 {_number(tile_height)} {_number(origin_x)} '
+                   f'{_number(origin_y - tile_height)})"/>')
+        return pattern, f'<path d="{data}" fill="url(#p{index})" fill-opacity="{raster_renderer.texture_alpha}"/>'
+
+    def _line(self, line, item):
+        width = item.line_width * self.dpi / raster_renderer.points_per_inch / self.unit
+        alpha = raster_renderer.color_rgba(item.color)[3]
+        opacity = f' stroke-opacity="{_number(alpha)}"' if alpha < 1 else ""
+        return (f'<path d="{self.path_data(line.coords, False)}" fill="none" stroke="{raster_renderer.color_hex(item.color)}"'
+                f'{opacity} stroke-width="{_number(width)}" stroke-linecap="round" stroke-linejoin="round"/>')
+
+    # <defs> 和各图层的元素，各尺寸共用
+    def body(self):
+        if self._body is not None:
+            return self._body
+        textures = {}
+        for kind, geometry, item in self.layers:
+            if kind == "polygon":
+                textures.setdefault(item.texture, (item, []))[1].append(geometry)
+        defs = [self._texture_pattern(item, polygons) for item, polygons in textures.values()]
+        symbols = {}
+        elements = []
+        for kind, geometry, item in self.layers:
+            if kind == "polygon":
+                pattern, element = self._polygon(geometry, item, len(elements))
+                if element is None:
+                    continue
+                defs.append(pattern)
+            elif kind == "line":
+                element = self._line(geometry, item)
+            else:
+                if item.img_icon not in symbols:
+                    symbols[item.img_icon] = self._marker_symbol(item)
+                    defs.append(symbols[item.img_icon][1])
+                width, height = symbols[item.img_icon][0]
+                # 图标中心对准标记点
+                corners = self.grid.to_pixels(geometry) / self.unit - [width / 2, height / 2]
+                element = "".join(f'<use xlink:href="#m-{item.type.value}" x="{x}" y="{y}"/>'
+                                  for x, y in np.rint(corners).astype(np.int64).tolist())
+            elements.append(element)
+        self._body = f"<defs>{''.join(defs)}</defs>{''.join(elements)}"
+        return self._body
+
+    def svg(self, width, height):
+        view_width, view_height = self.grid.width / self.unit, self.grid.height / self.unit
+        return (f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+                f'width="{width}" height="{height}" viewBox="0 0 {_number(view_width)} {_number(view_height)}">'
+                f'{self.body()}</svg>\n')
+
+
+class SvgImage:
+    # 一个输出尺寸的 SVG；shape 与同尺寸的 RGBA 相同，供计时事件记录尺寸
+    def __init__(self, document, hole_boundary, scale=1):
+        self.document = document
+        width, height = raster_renderer.canvas_size(hole_boundary, scale)
+        self.shape = (max(height, 1), max(width, 1), 4)
+
+    # 返回写出的字节数
+    def write(self, output_file_path, output_format, metrics):
+        with metrics.stage("draw"):
+            self.document.body()
+        with metrics.stage("encode"):
+            data = self.document.svg(self.shape[1], self.shape[0]).encode("utf-8")
+        with metrics.stage("write"):
+            os.makedirs(os.path.dirname(output_file_path) or ".", exist_ok=True)
+            with open(output_file_path, "wb") as file:
+                file.write(data)
+        logger.info(f"SVG {self.shape[1]}x{self.shape[0]}: {len(data)} bytes, {output_file_path}")
+        return len(data)
@@ -0,0 +1,157 @@
+import hashlib
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from utils import logger
+
+# 默认内存上限
+default_max_bytes = 256 * 1024 * 1024
+# 磁盘缓存目录，位于资源目录下
+disk_cache_dir_name = ".texture_cache"
+
+
+class TextureCache:
+    # 按 (纹理, 像素高, 像素宽) 缓存已经缩放到画布比例的纹理：float32 RGBA，非预乘。
+    # 像素尺寸由纹理的地面大小和目标米/像素决定，同一比例下的多边形、瓦片和多尺寸输出都复用同一份。
+    # 超过 max_bytes 时淘汰最久未用的；disk_dir 不为空时同时写成 .npy，新进程直接 mmap，跳过 PNG 解码和重采样。
+    # 磁盘目录用同一个字节上限，按修改时间淘汰最旧的文件，命中时更新修改时间
+    def __init__(self, max_bytes=default_max_bytes, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        # 磁盘目录的总字节数，第一次写入时扫描一次，之后累加；多个进程共用目录时只是估计，淘汰时重新扫描
+        self.disk_bytes = None
+        self._tiles = OrderedDict()
+        self._sources = {}
+        self._stamps = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def tile(self, image_path, height, width):
+        key = (image_path, height, width)
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+            self.hits += 1
+            return tile
+        self.misses += 1
+        disk_path = self._disk_path(image_path, height, width) if self.disk_dir else None
+        tile = self._load(disk_path) if disk_path else None
+        if tile is None:
+            tile = self._resample(image_path, height, width)
+            if disk_path:
+                self._save(disk_path, tile)
+        self._tiles[key] = tile
+        self.total_bytes += tile.nbytes
+        while self.total_bytes > self.max_bytes and len(self._tiles) > 1:
+            _, evicted = self._tiles.popitem(last=False)
+            self.total_bytes -= evicted.nbytes
+        return tile
+
+    def _resample(self, image_path, height, width):
+        # raster_renderer 也导入本模块，这里延迟导入避免循环
+        import raster_renderer
+        tile = raster_renderer.resample_image(self._source(image_path), height, width)
+        if tile.shape[-1] == 3:
+            tile = np.concatenate([tile, np.ones(tile.shape[:2] + (1,), dtype=tile.dtype)], axis=-1)
+        # 浮点误差可能略超出 [0, 1]，imshow 会为此告警
+        return np.clip(tile, 0.0, 1.0, out=tile)
+
+    def _source(self, image_path):
+        if image_path not in self._sources:
+            from matplotlib.image import imread
+            self._sources[image_path] = imread(image_path)
+        return self._sources[image_path]
+
+    # 文件名带上纹理文件的大小和修改时间，纹理被替换后旧的缓存不再命中
+    def _disk_path(self, image_path, height, width):
+        if image_path not in self._stamps:
+            stat = os.stat(image_path)
+            self._stamps[image_path] = hashlib.sha1(
+                f"{os.path.abspath(image_path)}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8")).hexdigest()[:16]
+        name = os.path.splitext(os.path.basename(image_path))[0]
+        return os.path.join(self.disk_dir, name, f"{self._stamps[image_path]}_{height}x{width}.npy")
+
+    def _load(self, disk_path):
+        if not os.path.exists(disk_path):
+            return None
+        try:
+            tile = np.load(disk_path, mmap_mode="r")
+            os.utime(disk_path)
+            return tile
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable texture cache file {disk_path}: {e}")
+            return None
+
+    def _save(self, disk_path, tile):
+        try:
+            os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+            tmp_path = f"{disk_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as file:
+                np.save(file, tile)
+            os.replace(tmp_path, disk_path)
+        except OSError as e:
+            logger.warning(f"Error writing texture cache file {disk_path}: {e}")
+            return
+        if self.disk_bytes is None:
+            self.disk_bytes = sum(size for _, size, _ in self._disk_files())
+        else:
+            self.disk_bytes += os.path.getsize(disk_path)
+        if self.disk_bytes > self.max_bytes:
+            self._trim_disk()
+
+    # [(修改时间, 字节数, 路径)]
+    def _disk_files(self):
+        files = []
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                if not name.endswith(".npy"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime_ns, stat.st_size, path))
+        return files
+
+    # 删除最旧的文件直到不超过 max_bytes，最新的一个总是保留
+    def _trim_disk(self):
+        files = sorted(self._disk_files())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files[:-1]:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError as e:
+                # 例如 Windows 上其他进程正 mmap 着这个文件
+                logger.warning(f"Error evicting texture cache file {path}: {e}")
+                continue
+            total -= size
+        self.disk_bytes = total
+
+
+_cache = TextureCache()
+
+
+# 设置不变时保留已缓存的纹理，常驻的渲染服务在多次任务之间复用
+def configure(max_bytes=default_max_bytes, disk_dir=None):
+    global _cache
+    if (max_bytes, disk_dir) != settings():
+        _cache = TextureCache(max_bytes, disk_dir)
+
+
+def settings():
+    return _cache.max_bytes, _cache.disk_dir
+
+
+def get_tile(image_path, height, width):
+    return _cache.tile(image_path, height, width)
+
+
+def stats():
+    return {"hits": _cache.hits, "misses": _cache.misses, "tiles": len(_cache._tiles), "bytes": _cache.total_bytes,
+            "disk_bytes": _cache.disk_bytes}
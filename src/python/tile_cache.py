@@ -0,0 +1,93 @@
+import json
+import os
+from collections import OrderedDict
+
+from utils import logger
+
+manifest_file_name = ".tile_manifest.json"
+cache_version = 1
+# 默认缓存上限
+default_max_bytes = 512 * 1024 * 1024
+save_interval = 200
+
+
+class TileCache:
+    # 磁盘瓦片缓存：{cache_dir}/{z}/{x}/{y}.png，清单按最近使用顺序保存，超出容量时先删最久未用的瓦片
+    def __init__(self, cache_dir, max_bytes=default_max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.manifest_path = os.path.join(cache_dir, manifest_file_name)
+        self.tiles = self._load()
+        self.total_bytes = sum(entry["size"] for entry in self.tiles.values())
+        self._unsaved = 0
+        self.hits = 0
+        self.evicted = 0
+
+    def _load(self):
+        if not os.path.exists(self.manifest_path):
+            return OrderedDict()
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as file:
+                manifest = json.load(file)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable tile manifest: {e}")
+            return OrderedDict()
+        if manifest.get("version") != cache_version:
+            return OrderedDict()
+        return OrderedDict(manifest.get("tiles", {}))
+
+    def save(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"version": cache_version, "tiles": self.tiles}, file)
+        os.replace(tmp_path, self.manifest_path)
+        self._unsaved = 0
+
+    def tile_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    # 瓦片存在且摘要一致时返回路径
+    def get(self, key, digest):
+        entry = self.tiles.get(key)
+        if entry is None or entry["digest"] != digest:
+            return None
+        path = self.tile_path(key)
+        if not os.path.exists(path):
+            self._forget(key)
+            return None
+        self.tiles.move_to_end(key)
+        self.hits += 1
+        return path
+
+    def put(self, key, digest, data):
+        path = self.tile_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+        self._forget(key)
+        self.tiles[key] = {"digest": digest, "size": len(data)}
+        self.total_bytes += len(data)
+        self._evict()
+        self._unsaved += 1
+        if self._unsaved >= save_interval:
+            self.save()
+        return path
+
+    def _forget(self, key):
+        entry = self.tiles.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry["size"]
+
+    def _evict(self):
+        # 刚写入的瓦片在末尾，至少保留它
+        while self.total_bytes > self.max_bytes and len(self.tiles) > 1:
+            key, _ = next(iter(self.tiles.items()))
+            self._forget(key)
+            try:
+                os.remove(self.tile_path(key))
+            except FileNotFoundError:
+                pass
+            self.evicted += 1
@@ -0,0 +1,166 @@
+import hashlib
+import math
+import numpy as np
+import shapely
+from shapely.geometry import LineString, Polygon as ShapelyPolygon
+
+import output_writer
+import raster_renderer
+import utils
+
+# Web Mercator (EPSG:3857) 的 z/x/y 瓦片，与常见在线地图的切片方式一致
+tile_size = 256
+earth_radius = 6378137.0
+origin_shift = math.pi * earth_radius
+max_latitude = 85.0511287798
+# 默认生成的层级数：从最大层级往下
+default_zoom_levels = 4
+# 与单洞输出共用 output_writer 的 PNG 编码
+tile_format = output_writer.OutputFormat()
+
+
+def lonlat_to_mercator(coords):
+    coords = np.asarray(coords, dtype=np.float64)
+    longitudes = coords[:, 0]
+    latitudes = np.clip(coords[:, 1], -max_latitude, max_latitude)
+    x = np.radians(longitudes) * earth_radius
+    y = np.log(np.tan(np.pi / 4 + np.radians(latitudes) / 2)) * earth_radius
+    return np.column_stack([x, y])
+
+
+def tile_span(zoom):
+    return 2 * origin_shift / 2 ** zoom
+
+
+def tile_bounds(zoom, x, y):
+    span = tile_span(zoom)
+    west = -origin_shift + x * span
+    north = origin_shift - y * span
+    return west, north - span, west + span, north
+
+
+def tiles_in_bounds(bounds, zoom):
+    west, south, east, north = bounds
+    span = tile_span(zoom)
+    last = 2 ** zoom - 1
+    x0 = min(max(int((west + origin_shift) // span), 0), last)
+    x1 = min(max(int((east + origin_shift) // span), 0), last)
+    y0 = min(max(int((origin_shift - north) // span), 0), last)
+    y1 = min(max(int((origin_shift - south) // span), 0), last)
+    for x in range(x0, x1 + 1):
+        for y in range(y0, y1 + 1):
+            yield x, y
+
+
+# 地面分辨率，米/像素
+def ground_meters_per_pixel(zoom, latitude):
+    return tile_span(zoom) / tile_size * math.cos(math.radians(latitude))
+
+
+# 地面分辨率不低于 utils.meters_per_pixel 的最小层级，与整洞 PNG 的清晰度相当
+def default_max_zoom(latitude):
+    return math.ceil(math.log2(2 * origin_shift * math.cos(math.radians(latitude))
+                               / (tile_size * utils.meters_per_pixel)))
+
+
+def tile_key(zoom, x, y):
+    return f"{zoom}/{x}/{y}"
+
+
+class CourseTiles:
+    # holes: [(hole_key, digest, hole_boundary, [(geometry, item)], [(marker, coords)])]，坐标为经纬度
+    def __init__(self, holes, resources):
+        self.resources = resources
+        self.hole_digests = []
+        boundaries = []
+        layers = []
+        for _, digest, hole_boundary, features, markers in holes:
+            self.hole_digests.append(digest)
+            boundary = shapely.transform(hole_boundary, lonlat_to_mercator)
+            boundaries.append(boundary)
+            # 与 rasterize_hole 相同的顺序：先画球洞边界，再画其余要素，最后画标记
+            layers.append((resources.holeBoundary.zorder, "polygon", boundary, resources.holeBoundary))
+            for geometry, item in features:
+                if isinstance(geometry, (LineString, ShapelyPolygon)):
+                    kind = "line" if isinstance(geometry, LineString) else "polygon"
+                    layers.append((item.zorder, kind, shapely.transform(geometry, lonlat_to_mercator), item))
+            for marker, coords in markers:
+                layers.append((marker.zorder, "marker", lonlat_to_mercator(coords), marker))
+        # sorted 是稳定排序，相同 zorder 保持添加顺序
+        self.layers = sorted(layers, key=lambda layer: layer[0])
+        envelopes = [
+            shapely.box(*layer[2].min(axis=0), *layer[2].max(axis=0)) if layer[1] == "marker" else layer[2]
+            for layer in self.layers
+        ]
+        self.layer_tree = shapely.STRtree(envelopes)
+        self.hole_tree = shapely.STRtree(boundaries)
+        self.bounds = tuple(shapely.total_bounds(boundaries)) if boundaries else None
+        center_latitude = np.mean([hole[2].centroid.y for hole in holes]) if holes else 0.0
+        self.max_zoom = default_max_zoom(center_latitude)
+        self.center_latitude = center_latitude
+        self._margins = {}
+
+    def __len__(self):
+        return len(self.hole_digests)
+
+    def _scale(self, zoom):
+        # 线宽和标记按照与整洞 PNG 相同的物理尺寸换算到这一层级
+        return utils.dpi * utils.meters_per_pixel / ground_meters_per_pixel(zoom, self.center_latitude)
+
+    def _margin(self, zoom):
+        if zoom not in self._margins:
+            self._margins[zoom] = self._marker_margin(zoom)
+        return self._margins[zoom]
+
+    def _marker_margin(self, zoom):
+        # 标记图标会超出其坐标点，查询时把瓦片范围放大半个图标
+        scaled_dpi = self._scale(zoom)
+        marker_pixels = utils.marker_in_meters / utils.meters_per_pixel
+        half_size = max(
+            (max(raster_renderer.marker_sprite(self.resources, layer[3], marker_pixels, scaled_dpi).shape[:2])
+             for layer in self.layers if layer[1] == "marker"),
+            default=0,
+        ) / 2
+        return (half_size + 2) * tile_span(zoom) / tile_size
+
+    def _query_box(self, zoom, x, y):
+        west, south, east, north = tile_bounds(zoom, x, y)
+        margin = self._margin(zoom)
+        return shapely.box(west - margin, south - margin, east + margin, north + margin)
+
+    def tiles(self, zoom):
+        if self.bounds is None:
+            return
+        for x, y in tiles_in_bounds(self.bounds, zoom):
+            if len(self.hole_tree.query(self._query_box(zoom, x, y))):
+                yield x, y
+
+    # 瓦片内容只取决于与它相交的洞，用这些洞的摘要判断缓存是否过期
+    def digest(self, zoom, x, y):
+        hole_indices = sorted(self.hole_tree.query(self._query_box(zoom, x, y)))
+        digest = hashlib.sha256(tile_key(zoom, x, y).encode("utf-8"))
+        for index in hole_indices:
+            digest.update(self.hole_digests[index].encode("utf-8"))
+        return digest.hexdigest()
+
+    def render(self, zoom, x, y):
+        canvas = raster_renderer.RasterCanvas(tile_bounds(zoom, x, y), tile_size, tile_size)
+        scaled_dpi = self._scale(zoom)
+        marker_pixels = utils.marker_in_meters / utils.meters_per_pixel
+        query_box = self._query_box(zoom, x, y)
+        for index in sorted(self.layer_tree.query(query_box)):
+            _, kind, geometry, item = self.layers[index]
+            if kind == "polygon":
+                raster_renderer.draw_polygon(canvas, geometry, item)
+            elif kind == "line":
+                raster_renderer.draw_line(canvas, geometry, item, scaled_dpi)
+            else:
+                coords = geometry[shapely.contains_xy(query_box, geometry[:, 0], geometry[:, 1])]
+                if len(coords) == 0:
+                    continue
+                sprite = raster_renderer.marker_sprite(self.resources, item, marker_pixels, scaled_dpi)
+                raster_renderer.stamp_sprites(canvas.rgba, raster_renderer.sprite_stamps(canvas, sprite, coords))
+            canvas.layers += 1
+        if canvas.layers == 0:
+            return None
+        return tile_format.encode(canvas.rgba)
@@ -0,0 +1,133 @@
+import argparse
+import logging
+import os
+import re
+import signal
+import sys
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+# 添加当前目录到 Python 路径
+if getattr(sys, 'frozen', False):
+    # 如果是打包环境
+    module_dir = sys._MEIPASS
+else:
+    # 如果是开发环境
+    module_dir = os.path.dirname(os.path.abspath(__file__))
+
+sys.path.append(module_dir)
+
+import plot_courses
+import hole_reader
+import tile_cache
+import tile_renderer
+from utils import logger
+
+# 本地瓦片服务：GET /tiles/{clubId}_{courseId}/{z}/{x}/{y}.png，缓存里没有或已过期的瓦片在第一次请求时渲染
+tile_path_pattern = re.compile(r"^/tiles/([^/]+)_([^/_]+)/(\d+)/(\d+)/(\d+)\.png$")
+# 内存中保留的球场索引数量
+max_loaded_courses = 8
+
+
+class TileSource:
+    def __init__(self, root_data_dir, cache_bytes=tile_cache.default_max_bytes, input_store=False):
+        self.input_path, self.output_path, resources_dir = plot_courses.data_paths(root_data_dir)
+        self.input_store = input_store
+        self.resources = plot_courses.Resources(resources_dir)
+        self.resources.preload_images()
+        self.cache = tile_cache.TileCache(os.path.join(self.output_path, "tiles"), cache_bytes)
+        self._courses = OrderedDict()
+
+    def course_tiles(self, club_id, course_id):
+        key = plot_courses.course_key(club_id, course_id)
+        if key in self._courses:
+            self._courses.move_to_end(key)
+            return self._courses[key]
+        if self.input_store:
+            # 每次都检查源文件是否变化，存储是最新的时只读索引、按偏移取这一个球场
+            data = plot_courses.open_input_store(self.input_path, self.output_path).find_course(club_id, course_id)
+        else:
+            data = hole_reader.find_course(self.input_path, club_id, course_id)
+        course_tiles = plot_courses.build_course_tiles(data, self.resources) if data else None
+        self._courses[key] = course_tiles
+        while len(self._courses) > max_loaded_courses:
+            self._courses.popitem(last=False)
+        return course_tiles
+
+    # 返回瓦片文件路径，球场不存在或瓦片为空时返回 None
+    def tile(self, club_id, course_id, zoom, x, y):
+        course_tiles = self.course_tiles(club_id, course_id)
+        if course_tiles is None or not 0 <= x < 2 ** zoom or not 0 <= y < 2 ** zoom:
+            return None
+        key = f"{plot_courses.course_key(club_id, course_id)}/{tile_renderer.tile_key(zoom, x, y)}"
+        digest = course_tiles.digest(zoom, x, y)
+        path = self.cache.get(key, digest)
+        if path:
+            return path
+        data = course_tiles.render(zoom, x, y)
+        if data is None:
+            return None
+        logger.info(f"Rendered tile {key}")
+        return self.cache.put(key, digest, data)
+
+
+class TileRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        match = tile_path_pattern.match(self.path.split("?", 1)[0])
+        if not match:
+            self.send_error(404)
+            return
+        club_id, course_id = match.group(1), match.group(2)
+        zoom, x, y = (int(value) for value in match.group(3, 4, 5))
+        try:
+            path = self.server.tile_source.tile(club_id, course_id, zoom, x, y)
+        except Exception as e:
+            logger.error(f"Error rendering tile {self.path}: {e}")
+            self.send_error(500)
+            return
+        if path is None:
+            self.send_error(404)
+            return
+        with open(path, "rb") as file:
+            data = file.read()
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.info(format % args)
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(description="Serve course tiles, rendering missing ones on first request")
+    parser.add_argument("--root-data-dir", required=True, help="Root data directory")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--tile-cache-mb", type=int, default=tile_cache.default_max_bytes // (1024 * 1024),
+                        help="Evict least recently used tiles when the tile cache grows beyond this size")
+    parser.add_argument("--input-store", action="store_true",
+                        help="Read courses from the binary columnar copy under output_data/.hole_store")
+    parser.add_argument("--verbose", action="store_true", help="Log every request and rendered tile")
+    return parser
+
+
+if __name__ == "__main__":
+    args = create_parser().parse_args()
+    if args.verbose:
+        logger.setLevel(logging.INFO)
+    server = HTTPServer((args.host, args.port), TileRequestHandler)
+    server.tile_source = TileSource(args.root_data_dir, args.tile_cache_mb * 1024 * 1024, args.input_store)
+    print(f"Serving tiles on http://{args.host}:{server.server_port}/tiles/{{clubId}}_{{courseId}}/{{z}}/{{x}}/{{y}}.png",
+          flush=True)
+    # 被 Electron 或 kill 结束时也保存缓存清单
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.tile_source.cache.save()
+        server.server_close()
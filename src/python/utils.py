@@ -1,8 +1,7 @@
 import os
 import logging
-from scipy.ndimage import gaussian_filter1d
 import numpy as np
-from shapely.geometry import Polygon, Point
+from shapely.geometry import Polygon
 
 root_dir = os.path.dirname(os.path.abspath(os.path.join(os.path.dirname(__file__))))
 logger = logging.getLogger(__name__)
@@ -22,10 +21,31 @@ lat_to_meter_ratio = 111000
 base_area = 10 * 10  # 假设10x10英寸为基准尺寸
 marker_in_meters = 3
 marker_icon_pixels = 200
+# 平滑之后、裁剪之前按这个容差（最精细输出的像素数）简化几何，去掉落在同一像素内的顶点；0 表示不简化
+simplify_pixels = 0.25
+
+
+# 影响渲染结果的常量，增量渲染时参与哈希
+def render_settings():
+    return {
+        "smooth_sigma": smooth_sigma,
+        "dpi": dpi,
+        "meters_per_pixel": meters_per_pixel,
+        "lat_to_meter_ratio": lat_to_meter_ratio,
+        "marker_in_meters": marker_in_meters,
+        "marker_icon_pixels": marker_icon_pixels,
+        "simplify_pixels": simplify_pixels,
+    }
+
+
+# 简化容差（经纬度），scale 为最精细输出相对 meters_per_pixel 的倍数。按纬度方向换算，经度方向一度更短，容差偏保守
+def simplify_tolerance(scale=1):
+    return simplify_pixels * meters_per_pixel / scale / lat_to_meter_ratio
 
 
 def smooth_coordinates(coords):
     longitudes, latitudes = zip(*coords)
+    from scipy.ndimage import gaussian_filter1d
     smooth_longs = gaussian_filter1d(longitudes, smooth_sigma)
     smooth_lats = gaussian_filter1d(latitudes, smooth_sigma)
     return list(zip(smooth_longs, smooth_lats))
@@ -47,25 +67,6 @@ def get_smooth_polygon(coords):
         return None
 
 
-def inside_polygon(coord, polygon):
-    point = Point(coord)
-    return polygon and polygon.contains(point)
-
-
-def intersection_of_polygons(polygon1, polygon2):
-    try:
-        if not polygon1 or not polygon2:
-            return None
-        if not polygon1.is_valid:
-            return None
-        if not polygon2.is_valid:
-            return None
-        return polygon1.intersection(polygon2)
-    except Exception as e:
-        logger.warning(f"计算多边形相交时出错: {e}")
-        return None
-
-
 def calculate_pixel_resolution(west, south, east, north):
     center_lat = (south + north) / 2
     center_lat_rad = np.pi * center_lat / 180
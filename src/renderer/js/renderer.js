@@ -6,6 +6,8 @@ const previewGrid = document.getElementById("previewGrid");
 
 let root_data_dir = null;
 let previewCount = 0;
+// hole -> img，完整分辨率的图替换同一个洞的预览
+const previewImages = new Map();
 
 document.querySelectorAll(".drop-zone").forEach((dropZone, index) => {
   dropZone.addEventListener("click", async () => {
@@ -31,7 +33,11 @@ document.querySelectorAll(".drop-zone").forEach((dropZone, index) => {
 });
 
 // 修改IPC监听器来更新预览图
-ipcRenderer.on("update-preview", (event, imagePath) => {
+ipcRenderer.on("update-preview", (event, imagePath, hole) => {
+  if (hole && previewImages.has(hole)) {
+    previewImages.get(hole).src = `${imagePath}?t=${Date.now()}`;
+    return;
+  }
   if (previewCount >= 5) return; // 最多显示5张图片
 
   const previewItem = document.createElement("div");
@@ -43,6 +49,7 @@ ipcRenderer.on("update-preview", (event, imagePath) => {
 
   previewItem.appendChild(img);
   previewGrid.appendChild(previewItem);
+  if (hole) previewImages.set(hole, img);
   previewCount++;
 });
 
@@ -55,6 +62,7 @@ processButton.addEventListener("click", async () => {
   // 清空预览区域
   previewGrid.innerHTML = "";
   previewCount = 0;
+  previewImages.clear();
 
   console.log("Processing with folders:", root_data_dir);
 
@@ -117,8 +125,13 @@ processButton.addEventListener("click", async () => {
 abortButton.addEventListener("click", async () => {
   console.log("Abort button clicked");
   try {
-    await ipcRenderer.invoke("abort-process");
-    console.log("Abort process completed");
+    // true：当前任务已中止；false：没有正在运行的任务
+    const aborted = await ipcRenderer.invoke("abort-process");
+    console.log("Abort process completed:", aborted);
+    if (!aborted) {
+      abortButton.disabled = true;
+      return;
+    }
 
     // 只显示简单的中止信息
     const messageDiv = document.createElement("div");
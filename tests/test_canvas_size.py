@@ -0,0 +1,56 @@
+import os
+import sys
+
+import matplotlib
+import pytest
+from shapely.geometry import box
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "python"))
+matplotlib.use("Agg")
+
+import hole_metrics
+import output_variants
+import plot_courses
+import raster_renderer
+
+resources_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "resources")
+
+
+@pytest.fixture(scope="module")
+def resources():
+    return plot_courses.Resources(resources_dir)
+
+
+# 宽、高、方形和细长的洞，在赤道、中纬度、高纬度和南半球
+@pytest.mark.parametrize("latitude", [0, 22.5, 40, 51.5, 65, -33.9])
+@pytest.mark.parametrize("size", [(0.004, 0.0016), (0.0015, 0.006), (0.003, 0.003), (0.0061, 0.00117)])
+@pytest.mark.parametrize("scale", [1, 0.25])
+def test_renderers_give_identical_dimensions(resources, latitude, size, scale):
+    hole_boundary = box(116, latitude, 116 + size[0], latitude + size[1])
+    shapes = []
+    for renderer in plot_courses.renderers:
+        rgba, _ = plot_courses.render_rgba(hole_boundary, [], [], resources, renderer,
+                                           hole_metrics.HoleMetrics("test"), scale)
+        shapes.append(rgba.shape[:2])
+    width, height = raster_renderer.canvas_size(hole_boundary, scale)
+    assert shapes == [(height, width)] * len(plot_courses.renderers)
+
+
+def test_canvas_follows_degree_aspect():
+    # 经纬度等比例：高宽比等于纬度范围与经度范围之比，与纬度无关
+    for latitude in [0, 45, 60]:
+        width, height = raster_renderer.canvas_size(box(10, latitude, 10.004, latitude + 0.002))
+        assert height == pytest.approx(width / 2, abs=1)
+
+
+# NAME=Npx 的最长边按实际输出计算：横向和竖向的洞、每种渲染器都应正好是 N 像素
+@pytest.mark.parametrize("renderer", plot_courses.renderers)
+@pytest.mark.parametrize("size", [(0.004, 0.0016), (0.0015, 0.006)])
+def test_pixel_variants_match_output_size(resources, renderer, size):
+    hole_boundary = box(116, 40, 116 + size[0], 40 + size[1])
+    outputs = output_variants.OutputVariants(["full=2x", "thumb=256px", "icon=64px"])
+    width, height = raster_renderer.canvas_size(hole_boundary)
+    scales = [variant.scale_for(width, height) for variant in outputs]
+    images, _ = plot_courses.render_variants(hole_boundary, [], [], resources, renderer,
+                                             hole_metrics.HoleMetrics("test"), scales, ["full", "thumb", "icon"])
+    assert [max(rgba.shape[:2]) for _, rgba in images[1:]] == [256, 64]
@@ -0,0 +1,46 @@
+import json
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "python"))
+
+import hole_reader
+
+boundary = {"itemType": "HoleBoundary", "shape": [{"longitude": 116.0, "latitude": 40.0},
+                                                   {"longitude": 116.001, "latitude": 40.0},
+                                                   {"longitude": 116.001, "latitude": 40.001}]}
+
+
+def write_courses(path, courses):
+    with open(path, "w", encoding="utf-8") as file:
+        for course in courses:
+            file.write(json.dumps(course) + "\n")
+
+
+def test_index_scans_ids_and_hole_counts(tmp_path):
+    path = tmp_path / "courses.jsonl"
+    write_courses(path, [
+        {"clubId": "a", "courseId": "b", "holes": [{"gpsItems": [boundary]}, {"gpsItems": []}]},
+        {"clubId": "c", "courseId": "d", "holes": []},
+        {"clubId": "e\"f", "courseId": "g", "holes": [{"gpsItems": [boundary]}]},
+    ])
+    index = hole_reader.CourseIndex(str(path))
+    assert index.courses == [("a", "b"), ("c", "d"), ("e\"f", "g")]
+    assert index.hole_counts() == [2, 0, 1]
+    assert index.course(1)["holes"] == []
+
+
+# 没有 gpsItems 的洞扫描时数不到，解析这个球场时以解析结果为准并记录警告
+def test_index_corrects_hole_count_when_course_is_parsed(tmp_path, caplog):
+    path = tmp_path / "courses.jsonl"
+    write_courses(path, [
+        {"clubId": "a", "courseId": "b", "holes": [{"gpsItems": [boundary]}, {}, {"gpsItems": []}]},
+    ])
+    index = hole_reader.CourseIndex(str(path))
+    assert index.hole_counts() == [2]
+    with caplog.at_level(logging.WARNING):
+        data = index.course(0)
+    assert len(data["holes"]) == 3
+    assert index.hole_counts() == [3]
+    assert "index scan counted 2" in caplog.text
@@ -0,0 +1,58 @@
+import os
+import sys
+
+import matplotlib
+import numpy as np
+import pytest
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(tests_dir, "..", "src", "python"))
+sys.path.insert(0, os.path.join(tests_dir, "..", "benchmarks"))
+matplotlib.use("Agg")
+
+import hole_metrics
+import plot_courses
+import raster_renderer
+import synthetic_course
+
+resources_dir = os.path.join(tests_dir, "..", "resources")
+# 预乘 RGBA 的平均绝对差（0-255）上限。实测 matplotlib 与 matplotlib-batched 约 0.4-0.9，
+# numpy 与 matplotlib 约 1.5-4（抗锯齿和纹理采样不同），真实球场最多约 7
+batched_tolerance = 2
+numpy_tolerance = 8
+
+
+@pytest.fixture(scope="module")
+def resources():
+    return plot_courses.Resources(resources_dir)
+
+
+@pytest.fixture(scope="module", params=[0, 1])
+def renders(request, resources):
+    course = next(synthetic_course.iter_courses(1, seed=request.param, holes=3))
+    collected = plot_courses.collect_course_features(course["holes"], resources, hole_metrics.HoleMetrics("test"))
+    renders = []
+    for hole_boundary, features, markers, _, _ in collected:
+        renders.append({
+            renderer: raster_renderer.to_premultiplied(plot_courses.render_rgba(
+                hole_boundary, features, markers, resources, renderer, hole_metrics.HoleMetrics("test"), 0.5)[0])
+            for renderer in plot_courses.renderers
+        })
+    return renders
+
+
+def mean_difference(rgba1, rgba2):
+    assert rgba1.shape == rgba2.shape
+    return float(np.abs(rgba1 - rgba2).mean()) * 255
+
+
+def test_batched_matches_per_artist(renders):
+    for images in renders:
+        assert mean_difference(images["matplotlib"], images["matplotlib-batched"]) <= batched_tolerance
+
+
+def test_numpy_matches_matplotlib(renders):
+    for images in renders:
+        # 不是空白图，差异才有意义
+        assert images["matplotlib"][..., 3].mean() > 0.2
+        assert mean_difference(images["matplotlib"], images["numpy"]) <= numpy_tolerance